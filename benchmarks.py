@@ -0,0 +1,812 @@
+import json
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from itertools import accumulate
+from pathlib import Path
+
+from parser import BACKENDS, parse_collection, parse_html_file
+from tokeniser import process_text, clear_cache
+from indexer import (
+    build_compact_index_bm25,
+    build_inverted_index_bm25,
+    build_multifield_index,
+    build_positional_index,
+    compress_index
+)
+from ranker import (
+    compute_avg_doc_length,
+    compute_idf,
+    rank_documents,
+    rank_documents_bm25,
+    rank_documents_tfidf_field_weighted,
+    rank_documents_bm25_field_weighted,
+    rank_documents_bm25f,
+    build_maxscore_index
+)
+from loadgen import latency_summary
+from positional import rank_documents_bm25_positional
+from boolean_query import rank_documents_boolean
+import vector_engine
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DATA_DIR = BASE_DIR / "data" / "Videogames"
+RESULTS_DIR = BASE_DIR / "results" / "benchmarks"
+
+BENCHMARKS = ("parser", "memory", "compression", "scoring", "bm25f", "positional", "boolean", "pipeline")
+
+
+# Peak traced allocation (bytes) while fn runs, relative to what was live before it
+def _peak_memory(fn, *args, **kwargs):
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    fn(*args, **kwargs)
+    return tracemalloc.get_traced_memory()[1] - before
+
+
+# Bytes held by an index structure, counting every shared object (doc id strings, small ints) once
+def deep_sizeof(obj, seen=None):
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, "__slots__"):
+        size += sum(deep_sizeof(getattr(obj, name), seen) for name in obj.__slots__)
+    return size
+
+
+# Tokenised documents with a Zipfian vocabulary ("t0" most frequent), for scaling tests
+def synthetic_token_documents(num_docs, mean_length=200, vocab_size=50_000, zipf_s=1.07, seed=0):
+    rng = random.Random(seed)
+    vocab = [f"t{rank}" for rank in range(vocab_size)]
+    cum_weights = list(accumulate(1 / (rank + 1) ** zipf_s for rank in range(vocab_size)))
+
+    for i in range(num_docs):
+        length = max(1, int(rng.expovariate(1 / mean_length)))
+        yield {"doc_id": f"synthetic-{i:08d}.html", "tokens": rng.choices(vocab, cum_weights=cum_weights, k=length)}
+
+
+# -------------------------------
+# PARSING
+# -------------------------------
+
+# Pages/second and peak memory per page for each HTML extraction backend
+def bench_parser_backends(directory=DATA_DIR, repeat=3):
+    files = sorted(Path(directory).glob("*.html"))
+    if not files:
+        print(f"[ERROR] No .html files in: {directory}")
+        return {}
+
+    results = {}
+    for backend in BACKENDS:
+
+        # Best of several untraced runs for throughput
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for file in files:
+                parse_html_file(file, backend=backend)
+            best = min(best, time.perf_counter() - start)
+
+        # A separate traced run for memory, since tracemalloc slows everything down
+        tracemalloc.start()
+        peaks = [_peak_memory(parse_html_file, file, backend=backend) for file in files]
+        tracemalloc.stop()
+
+        results[backend] = {
+            "pages": len(files),
+            "pages_per_sec": len(files) / best,
+            "mean_peak_kib_per_page": sum(peaks) / len(peaks) / 1024,
+            "max_peak_kib_per_page": max(peaks) / 1024
+        }
+
+    return results
+
+
+def print_parser_results(results):
+    print(f"{'backend':<8} {'pages':>6} {'pages/s':>10} {'mean KiB/page':>14} {'max KiB/page':>13}")
+    for backend, r in results.items():
+        print(f"{backend:<8} {r['pages']:>6} {r['pages_per_sec']:>10.1f} "
+              f"{r['mean_peak_kib_per_page']:>14.1f} {r['max_peak_kib_per_page']:>13.1f}")
+
+
+# -------------------------------
+# INDEX MEMORY
+# -------------------------------
+
+# Memory of the dict index (build_inverted_index_bm25) vs the compact index on the same documents
+def bench_index_memory(documents):
+    documents = list(documents)
+
+    index, doc_lengths = build_inverted_index_bm25(documents)
+    postings = sum(len(p) for p in index.values())
+    dict_bytes = deep_sizeof(index) + deep_sizeof(doc_lengths)
+    del index, doc_lengths
+
+    compact, lengths, doc_names = build_compact_index_bm25(documents)
+    compact_bytes = deep_sizeof(compact) + deep_sizeof(lengths)
+
+    return {
+        "docs": len(documents),
+        "terms": len(compact),
+        "postings": postings,
+        "dict_mib": dict_bytes / 2**20,
+        "compact_mib": compact_bytes / 2**20,
+        "dict_bytes_per_posting": dict_bytes / postings if postings else 0.0,
+        "compact_bytes_per_posting": compact_bytes / postings if postings else 0.0,
+        "ratio": dict_bytes / compact_bytes if compact_bytes else 0.0
+    }
+
+
+# Synthetic collections `scale` times the size of the real one (727 documents by default)
+def bench_index_memory_scaling(scales=(1, 10, 100), base_docs=727, mean_length=200):
+    return {scale: bench_index_memory(synthetic_token_documents(base_docs * scale, mean_length))
+            for scale in scales}
+
+
+def print_memory_results(results):
+    print(f"{'corpus':<12} {'docs':>9} {'postings':>11} {'dict MiB':>10} {'compact MiB':>12} "
+          f"{'B/posting dict':>15} {'B/posting compact':>18} {'ratio':>6}")
+    for label, r in results.items():
+        print(f"{label:<12} {r['docs']:>9} {r['postings']:>11} {r['dict_mib']:>10.1f} {r['compact_mib']:>12.1f} "
+              f"{r['dict_bytes_per_posting']:>15.1f} {r['compact_bytes_per_posting']:>18.1f} {r['ratio']:>6.1f}")
+
+
+# -------------------------------
+# POSTINGS COMPRESSION
+# -------------------------------
+
+# Size, full-decode throughput and point-lookup rate of array vs block-compressed postings
+def bench_postings_compression(documents, block_size=128, repeat=3, lookups=20_000, seed=0):
+    compact, doc_lengths, _ = build_compact_index_bm25(documents)
+    storages = {"arrays": compact, "compressed": compress_index(compact, block_size)}
+    postings = sum(len(p) for p in compact.values())
+
+    # Lookups of (term, doc) pairs that exist, as a ranker probing a non-essential list would
+    rng = random.Random(seed)
+    terms = [t for t in compact if len(compact[t]) > 1]
+    probes = []
+    for _ in range(lookups if terms else 0):
+        p = compact[rng.choice(terms)]
+        probes.append((p, rng.choice(p.doc_ids)))
+
+    results = {}
+    for name, index in storages.items():
+        best_scan = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for p in index.values():
+                for _ in p.items():
+                    pass
+            best_scan = min(best_scan, time.perf_counter() - start)
+
+        lists = {id(compact[t]): index[t] for t in compact}
+        start = time.perf_counter()
+        for p, doc_id in probes:
+            lists[id(p)][doc_id]
+        lookup_time = time.perf_counter() - start
+
+        size = deep_sizeof(index)
+        results[name] = {
+            "postings": postings,
+            "mib": size / 2**20,
+            "bytes_per_posting": size / postings if postings else 0.0,
+            "decode_postings_per_sec": postings / best_scan if best_scan else 0.0,
+            "lookups_per_sec": len(probes) / lookup_time if lookup_time else 0.0
+        }
+
+    return results
+
+
+def print_compression_results(results):
+    print(f"{'storage':<11} {'postings':>10} {'MiB':>8} {'B/posting':>10} {'decode postings/s':>18} {'lookups/s':>10}")
+    for name, r in results.items():
+        print(f"{name:<11} {r['postings']:>10} {r['mib']:>8.1f} {r['bytes_per_posting']:>10.2f} "
+              f"{r['decode_postings_per_sec']:>18,.0f} {r['lookups_per_sec']:>10,.0f}")
+
+
+# -------------------------------
+# BATCH SCORING
+# -------------------------------
+
+# Queries of 1-5 terms drawn from the index vocabulary, weighted towards frequent terms
+def synthetic_queries(index, num_queries=1000, seed=0):
+    rng = random.Random(seed)
+    terms = sorted(index, key=lambda t: -len(index[t]))
+    cum_weights = list(accumulate(1 / (rank + 1) for rank in range(len(terms))))
+    return [rng.choices(terms, cum_weights=cum_weights, k=rng.randint(1, 5)) for _ in range(num_queries)]
+
+
+# Queries/second of per-query rank_documents_bm25 vs one vector_engine.rank_batch call
+def bench_batch_scoring(documents, num_queries=1000, k=10):
+    index, doc_lengths = build_inverted_index_bm25(documents)
+    idf = compute_idf(index, len(doc_lengths), smooth=True)
+    avg_dl = compute_avg_doc_length(doc_lengths)
+    queries = synthetic_queries(index, num_queries)
+
+    start = time.perf_counter()
+    expected = [rank_documents_bm25(q, index, idf, doc_lengths, avg_dl, k=k) for q in queries]
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    engine = vector_engine.build_engine(index, idf, doc_lengths, avg_dl)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = vector_engine.rank_batch(engine, queries, k=k)
+    batch_time = time.perf_counter() - start
+
+    return {
+        "docs": len(doc_lengths),
+        "queries": len(queries),
+        "loop_qps": len(queries) / loop_time,
+        "batch_qps": len(queries) / batch_time,
+        "engine_build_sec": build_time,
+        "identical": actual == expected
+    }
+
+
+# -------------------------------
+# FIELD-WEIGHTED BM25
+# -------------------------------
+
+# Synthetic documents with a short title field taken from the start of each body
+def synthetic_field_documents(num_docs, title_length=6):
+    for doc in synthetic_token_documents(num_docs):
+        doc["title_tokens"] = doc["tokens"][:title_length]
+        doc["body_tokens"] = doc["tokens"]
+        yield doc
+
+
+# Per-query latency of the two-ranking merge (three sorts) vs single-pass BM25F, top 10
+def bench_field_weighted(documents, num_queries=1000, k=10, w_title=2.0, w_body=1.0):
+    documents = list(documents)
+    n = len(documents)
+
+    title_index, title_lengths = build_inverted_index_bm25(
+        [{"doc_id": d["doc_id"], "tokens": d["title_tokens"]} for d in documents])
+    body_index, body_lengths = build_inverted_index_bm25(
+        [{"doc_id": d["doc_id"], "tokens": d["body_tokens"]} for d in documents])
+    title_idf, body_idf = compute_idf(title_index, n, smooth=True), compute_idf(body_index, n, smooth=True)
+    title_avg_dl, body_avg_dl = compute_avg_doc_length(title_lengths), compute_avg_doc_length(body_lengths)
+
+    multi_index, field_lengths = build_multifield_index(documents)
+    multi_idf = compute_idf(multi_index, n, smooth=True)
+    field_avg_dl = {field: compute_avg_doc_length(lengths) for field, lengths in field_lengths.items()}
+
+    queries = synthetic_queries(body_index, num_queries)
+
+    start = time.perf_counter()
+    for q in queries:
+        rank_documents_bm25_field_weighted(q, title_index, title_idf, title_lengths, title_avg_dl,
+                                           body_index, body_idf, body_lengths, body_avg_dl,
+                                           w_title=w_title, w_body=w_body, k=k)
+    merge_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for q in queries:
+        rank_documents_bm25f(q, multi_index, multi_idf, field_lengths, field_avg_dl,
+                             {"title": w_title, "body": w_body}, k=k)
+    bm25f_time = time.perf_counter() - start
+
+    return {
+        "docs": n,
+        "queries": len(queries),
+        "merge_ms_per_query": merge_time / len(queries) * 1000,
+        "bm25f_ms_per_query": bm25f_time / len(queries) * 1000
+    }
+
+
+
+# -------------------------------
+# POSITIONAL INDEX
+# -------------------------------
+
+# Phrases of 2-3 consecutive tokens taken from random documents, so every one matches somewhere
+def synthetic_phrases(documents, num_queries=1000, seed=0):
+    rng = random.Random(seed)
+    candidates = [d["tokens"] for d in documents if len(d["tokens"]) >= 3]
+    phrases = []
+    for _ in range(num_queries):
+        tokens = rng.choice(candidates)
+        length = rng.randint(2, 3)
+        start = rng.randrange(len(tokens) - length + 1)
+        phrases.append(tokens[start:start + length])
+    return phrases
+
+
+# Size of the positional index next to the dict and compact indexes, and per-query latency
+# of plain BM25 vs the same terms as a phrase and as NEAR/5
+def bench_positional(documents, num_queries=1000, k=10, window=5):
+    documents = list(documents)
+
+    index, doc_lengths = build_inverted_index_bm25(documents)
+    compact, lengths, _ = build_compact_index_bm25(documents)
+    idf = compute_idf(index, len(doc_lengths), smooth=True)
+    avg_dl = compute_avg_doc_length(doc_lengths)
+
+    start = time.perf_counter()
+    positional, doc_names = build_positional_index(documents)
+    build_time = time.perf_counter() - start
+
+    positions = sum(len(d["tokens"]) for d in documents)
+    positional_bytes = deep_sizeof(positional) + deep_sizeof(doc_names)
+    results = {
+        "docs": len(documents),
+        "positions": positions,
+        "build_sec": build_time,
+        "dict_mib": (deep_sizeof(index) + deep_sizeof(doc_lengths)) / 2**20,
+        "compact_mib": (deep_sizeof(compact) + deep_sizeof(lengths)) / 2**20,
+        "positional_mib": positional_bytes / 2**20,
+        "position_bytes_per_position": sum(len(p.data) for p in positional.values()) / positions
+    }
+
+    phrases = synthetic_phrases(documents, num_queries)
+    queries = {
+        "bm25": [{"terms": p, "phrases": [], "near": []} for p in phrases],
+        "phrase": [{"terms": p, "phrases": [p], "near": []} for p in phrases],
+        f"near/{window}": [{"terms": p, "phrases": [], "near": [(window, p)]} for p in phrases]
+    }
+    for name, batch in queries.items():
+        latencies = []
+        for query in batch:
+            start = time.perf_counter()
+            rank_documents_bm25_positional(query, index, idf, doc_lengths, avg_dl, positional, doc_names, k=k)
+            latencies.append(time.perf_counter() - start)
+        results[name] = latency_summary(latencies)
+
+    return results
+
+
+def print_positional_results(r):
+    print(f"{r['docs']:,} docs, {r['positions']:,} positions, positional build {r['build_sec']:.2f}s")
+    print(f"dict index {r['dict_mib']:.1f} MiB, compact {r['compact_mib']:.1f} MiB, "
+          f"positional {r['positional_mib']:.1f} MiB ({r['position_bytes_per_position']:.2f} bytes/position)\n")
+    print(f"{'query':<10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name in [key for key in r if isinstance(r[key], dict)]:
+        s = r[name]
+        print(f"{name:<10} {s['p50_ms']:>8.3f} {s['p95_ms']:>8.3f} {s['p99_ms']:>8.3f}")
+
+
+# -------------------------------
+# BOOLEAN QUERIES
+# -------------------------------
+
+# Per-query latency of disjunctive BM25 vs the same 2-5 terms ANDed, with the intersection cost
+def bench_boolean(documents, num_queries=1000, k=10):
+    index, doc_lengths = build_inverted_index_bm25(documents)
+    idf = compute_idf(index, len(doc_lengths), smooth=True)
+    avg_dl = compute_avg_doc_length(doc_lengths)
+    maxscore_index = build_maxscore_index(index, idf, doc_lengths, avg_dl)
+    queries = [q for q in synthetic_queries(index, num_queries * 2) if len(set(q)) > 1][:num_queries]
+
+    disjunctive = []
+    for q in queries:
+        start = time.perf_counter()
+        rank_documents_bm25(q, index, idf, doc_lengths, avg_dl, k=k)
+        disjunctive.append(time.perf_counter() - start)
+
+    conjunctive = []
+    totals = {"postings": 0, "comparisons": 0, "candidates": 0}
+    for q in queries:
+        stats = {}
+        start = time.perf_counter()
+        rank_documents_boolean(("and", [("term", t) for t in q]), maxscore_index, k=k, stats=stats)
+        conjunctive.append(time.perf_counter() - start)
+        for key in totals:
+            totals[key] += stats[key]
+
+    return {
+        "docs": len(doc_lengths),
+        "queries": len(queries),
+        "bm25": latency_summary(disjunctive),
+        "and": latency_summary(conjunctive),
+        **{f"mean_{key}": value / len(queries) for key, value in totals.items()}
+    }
+
+
+def print_boolean_results(r):
+    print(f"{r['queries']} queries over {r['docs']:,} docs: on average {r['mean_postings']:,.0f} postings, "
+          f"{r['mean_comparisons']:,.0f} comparisons, {r['mean_candidates']:,.1f} matching documents\n")
+    print(f"{'query':<10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name in ("bm25", "and"):
+        s = r[name]
+        print(f"{name:<10} {s['p50_ms']:>8.3f} {s['p95_ms']:>8.3f} {s['p99_ms']:>8.3f}")
+
+
+# -------------------------------
+# PIPELINE SUITE
+# -------------------------------
+#
+# Every stage of the search pipeline on one synthetic HTML collection: parse, tokenise
+# (per option set), index build and query latency. Results are written as JSON, one run per
+# corpus scale, so two revisions can be compared with compare_results.
+
+# Option sets timed by the tokenisation stage; the first one that runs feeds the index.
+# Sets whose NLTK data is missing (punkt, WordNet) are reported as skipped
+TOKENISE_OPTIONS = {
+    "regex": {"use_stopwords": True, "use_stemming": True, "use_lemmatization": False, "tokenizer": "regex"},
+    "regex-raw": {"use_stopwords": False, "use_stemming": False, "use_lemmatization": False, "tokenizer": "regex"},
+    "nltk": {"use_stopwords": True, "use_stemming": True, "use_lemmatization": False, "tokenizer": "nltk"},
+    "nltk-lemma": {"use_stopwords": True, "use_stemming": True, "use_lemmatization": True, "tokenizer": "nltk"}
+}
+
+QUERY_MODELS = ("tfidf", "bm25", "tfidf_fw", "bm25_fw")
+
+# Metric -> +1 if higher is better, -1 if lower is better; anything else is informational
+REGRESSION_METRICS = {
+    "pages_per_sec": 1, "mib_per_sec": 1, "tokens_per_sec": 1, "queries_per_sec": 1,
+    "build_sec": -1, "peak_mib": -1, "index_mib": -1, "p50_ms": -1, "p95_ms": -1, "p99_ms": -1
+}
+
+_SYLLABLES = ("ba", "ko", "ri", "tan", "mel", "zo", "qua", "er", "sta", "lo", "ve", "dra", "pi", "nu",
+              "gon", "shi", "ar", "te", "mi", "ron", "ca", "de", "fu", "gra", "hel", "ja", "ki", "mor")
+_SUFFIXES = ("s", "ing", "ed", "er")
+
+
+# Distinct pronounceable words, so tokenisers and stemmers do real work
+def synthetic_vocabulary(size, seed=0):
+    rng = random.Random(seed)
+    words, seen = [], set()
+    while len(words) < size:
+        word = "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(1, 5)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+# HTML pages `scale` times the real collection (727 pages). Word frequencies follow Zipf's law
+# and the vocabulary grows with the collection (Heaps' law), some words take an inflection,
+# and every page carries the boilerplate the parser strips
+def synthetic_html_pages(scale, base_docs=727, mean_length=200, zipf_s=1.07, seed=0):
+    num_docs = base_docs * scale
+    vocab_size = int(40 * (num_docs * mean_length) ** 0.5)
+    vocab = synthetic_vocabulary(vocab_size, seed)
+    cum_weights = list(accumulate(1 / (rank + 1) ** zipf_s for rank in range(vocab_size)))
+    rng = random.Random(seed)
+
+    def words(k):
+        drawn = rng.choices(vocab, cum_weights=cum_weights, k=k)
+        return [w + rng.choice(_SUFFIXES) if rng.random() < 0.1 else w for w in drawn]
+
+    for i in range(num_docs):
+        title = " ".join(words(rng.randint(2, 6))).title()
+        body = words(max(1, int(rng.expovariate(1 / mean_length))))
+        paragraphs = "".join(f"<p>{' '.join(body[j:j + 50])}.</p>\n" for j in range(0, len(body), 50))
+        yield f"synthetic-{i:08d}.html", (
+            f"<html><head><title>{title}</title><style>p {{ margin: 0 }}</style></head>\n"
+            f"<body><header>Synthetic Games</header><nav><a href=\"/\">Home</a> | <a href=\"/games\">Games</a></nav>\n"
+            f"<h1>{title}</h1>\n{paragraphs}"
+            f"<footer>Copyright</footer><script>var page = {i};</script></body></html>\n")
+
+
+def write_synthetic_corpus(directory, scale, seed=0):
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    count = 0
+    for name, html in synthetic_html_pages(scale, seed=seed):
+        (directory / name).write_text(html, encoding="utf-8")
+        count += 1
+    return count
+
+
+def bench_parse(directory, workers=1, backend="bs4"):
+    files = list(Path(directory).glob("*.html"))
+    size = sum(f.stat().st_size for f in files)
+
+    start = time.perf_counter()
+    documents = parse_collection(directory, workers=workers, backend=backend)
+    elapsed = time.perf_counter() - start
+
+    return documents, {
+        "pages": len(documents),
+        "mib": size / 2**20,
+        "seconds": elapsed,
+        "pages_per_sec": len(documents) / elapsed if elapsed else 0.0,
+        "mib_per_sec": size / 2**20 / elapsed if elapsed else 0.0
+    }
+
+
+# Title and body of every document, best of repeat runs each starting with a cold term cache;
+# returns the token streams of each set
+def bench_tokenise(documents, option_sets=TOKENISE_OPTIONS, repeat=3):
+    streams, results = {}, {}
+    for name, options in option_sets.items():
+        try:
+            elapsed = float("inf")
+            for _ in range(repeat):
+                clear_cache()
+                start = time.perf_counter()
+                tokenised = [{"doc_id": d["doc_id"],
+                              "title_tokens": process_text(d["title"], **options),
+                              "body_tokens": process_text(d["body"], **options)} for d in documents]
+                elapsed = min(elapsed, time.perf_counter() - start)
+        except LookupError as e:
+            resource = re.search(r"Resource (\S+) not found", str(e))
+            print(f"[WARN] Skipping tokeniser option set {name!r}: missing NLTK data "
+                  f"({resource.group(1) if resource else 'see nltk.download'})")
+            results[name] = {"skipped": True}
+            continue
+
+        tokens = sum(len(d["title_tokens"]) + len(d["body_tokens"]) for d in tokenised)
+        streams[name] = tokenised
+        results[name] = {
+            "tokens": tokens,
+            "seconds": elapsed,
+            "tokens_per_sec": tokens / elapsed if elapsed else 0.0,
+            "docs_per_sec": len(documents) / elapsed if elapsed else 0.0
+        }
+    return streams, results
+
+
+# Build time (best of repeat), traced peak allocation and resident size of the body index
+def bench_index_build(streams, repeat=3):
+    body = [{"doc_id": d["doc_id"], "tokens": d["body_tokens"]} for d in streams]
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        index, doc_lengths = build_inverted_index_bm25(body)
+        best = min(best, time.perf_counter() - start)
+
+    del index, doc_lengths
+    tracemalloc.start()
+    peak = _peak_memory(build_inverted_index_bm25, body)
+    tracemalloc.stop()
+
+    index, doc_lengths = build_inverted_index_bm25(body)
+    return {
+        "docs": len(doc_lengths),
+        "terms": len(index),
+        "postings": sum(len(p) for p in index.values()),
+        "build_sec": best,
+        "peak_mib": peak / 2**20,
+        "index_mib": (deep_sizeof(index) + deep_sizeof(doc_lengths)) / 2**20
+    }
+
+
+# Per-query latency distribution of each ranker, top k, over synthetic 1-5 term queries
+def bench_query_latency(streams, num_queries=1000, k=10, models=QUERY_MODELS, seed=0):
+    n = len(streams)
+    fields = {}
+    for field in ("title", "body"):
+        index, doc_lengths = build_inverted_index_bm25(
+            [{"doc_id": d["doc_id"], "tokens": d[f"{field}_tokens"]} for d in streams])
+        fields[field] = (index, compute_idf(index, n, smooth=True), doc_lengths, compute_avg_doc_length(doc_lengths))
+    (t_index, t_idf, t_lengths, t_avg), (b_index, b_idf, b_lengths, b_avg) = fields["title"], fields["body"]
+
+    rankers = {
+        "tfidf": lambda q: rank_documents(q, b_index, b_idf, k=k),
+        "bm25": lambda q: rank_documents_bm25(q, b_index, b_idf, b_lengths, b_avg, k=k),
+        "tfidf_fw": lambda q: rank_documents_tfidf_field_weighted(q, t_index, t_idf, b_index, b_idf, k=k),
+        "bm25_fw": lambda q: rank_documents_bm25_field_weighted(q, t_index, t_idf, t_lengths, t_avg,
+                                                                b_index, b_idf, b_lengths, b_avg, k=k)
+    }
+
+    queries = synthetic_queries(b_index, num_queries, seed)
+    results = {}
+    for model in models:
+        rank = rankers[model]
+        latencies = []
+        for q in queries:
+            start = time.perf_counter()
+            rank(q)
+            latencies.append(time.perf_counter() - start)
+        summary = latency_summary(latencies)
+        summary["queries_per_sec"] = len(latencies) / sum(latencies) if sum(latencies) else 0.0
+        results[model] = summary
+    return results
+
+
+def _revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).resolve().parent,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_pipeline(scale, corpus_dir=None, workers=1, num_queries=1000, seed=0):
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(corpus_dir) / f"x{scale}" if corpus_dir else Path(tmp)
+        if not any(directory.glob("*.html")):
+            start = time.perf_counter()
+            write_synthetic_corpus(directory, scale, seed)
+            print(f"[INFO] Generated x{scale} corpus in {time.perf_counter() - start:.1f}s: {directory}")
+
+        documents, parse = bench_parse(directory, workers)
+
+    streams, tokenise = bench_tokenise(documents)
+    if not streams:
+        print("[ERROR] No tokeniser option set could run")
+        return {"docs": len(documents), "stages": {"parse": parse, "tokenise": tokenise}}
+    index_streams = next(iter(streams.values()))
+
+    return {
+        "docs": len(documents),
+        "index_options": next(iter(streams)),
+        "stages": {
+            "parse": parse,
+            "tokenise": tokenise,
+            "index": bench_index_build(index_streams),
+            "query": bench_query_latency(index_streams, num_queries, seed=seed)
+        }
+    }
+
+
+def run_pipeline_suite(scales=(10,), corpus_dir=None, workers=1, num_queries=1000, seed=0):
+    return {
+        "meta": {
+            "revision": _revision(),
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "workers": workers,
+            "num_queries": num_queries,
+            "seed": seed
+        },
+        "runs": {f"x{scale}": run_pipeline(scale, corpus_dir, workers, num_queries, seed) for scale in scales}
+    }
+
+
+def write_results(results, path=None):
+    if path is None:
+        path = RESULTS_DIR / f"pipeline-{results['meta']['revision']}.json"
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    return path
+
+
+# "x10.query.bm25.p95_ms" -> value, for every number in the runs
+def flatten_results(results):
+    flat = {}
+
+    def walk(prefix, value):
+        if isinstance(value, dict):
+            for key, child in value.items():
+                walk(f"{prefix}.{key}" if prefix else key, child)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix] = value
+
+    for run, r in results["runs"].items():
+        walk(run, r.get("stages", {}))
+    return flat
+
+
+# Metrics that got worse than the baseline by more than `tolerance` (a fraction)
+def compare_results(baseline, current, tolerance=0.10):
+    base = flatten_results(baseline)
+    regressions = []
+    for name, value in flatten_results(current).items():
+        direction = REGRESSION_METRICS.get(name.rsplit(".", 1)[-1])
+        if direction is None or not base.get(name):
+            continue
+        change = (value - base[name]) / base[name]
+        if direction * change < -tolerance:
+            regressions.append({"metric": name, "baseline": base[name], "current": value, "change": change})
+    return regressions
+
+
+def print_pipeline_results(results):
+    for run, r in results["runs"].items():
+        stages = r["stages"]
+        parse = stages["parse"]
+        print(f"{run}: {r['docs']} pages, {parse['mib']:.1f} MiB")
+        print(f"  parse        {parse['pages_per_sec']:>10,.0f} pages/s {parse['mib_per_sec']:>8.2f} MiB/s")
+        for name, t in stages["tokenise"].items():
+            if t.get("skipped"):
+                print(f"  tokenise     {name:<12} skipped")
+            else:
+                print(f"  tokenise     {name:<12} {t['tokens_per_sec']:>12,.0f} tokens/s")
+        if "index" in stages:
+            i = stages["index"]
+            print(f"  index        {i['build_sec']:.2f}s build, {i['peak_mib']:.1f} MiB peak, "
+                  f"{i['index_mib']:.1f} MiB resident ({i['postings']:,} postings, {i['terms']:,} terms)")
+            for model, q in stages["query"].items():
+                print(f"  query        {model:<9} p50 {q['p50_ms']:.3f} ms  p95 {q['p95_ms']:.3f} ms  "
+                      f"p99 {q['p99_ms']:.3f} ms  ({q['queries_per_sec']:,.0f} queries/s)")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Search engine benchmarks")
+    arg_parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS),
+                            help="benchmarks to run (default: all)")
+    arg_parser.add_argument("--data", default=DATA_DIR, help="directory of .html documents")
+    arg_parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100],
+                            help="synthetic corpus sizes, as multiples of 727 documents (e.g. 1000)")
+    arg_parser.add_argument("--pipeline-scales", type=int, nargs="+", default=[10],
+                            help="synthetic HTML corpus sizes for the pipeline suite (10 to 10000)")
+    arg_parser.add_argument("--corpus-dir", help="keep generated HTML corpora here and reuse them")
+    arg_parser.add_argument("--workers", type=int, default=1, help="parser processes for the pipeline suite")
+    arg_parser.add_argument("--queries", type=int, default=1000, help="queries per model for the pipeline suite")
+    arg_parser.add_argument("--output", help="pipeline results JSON (default: results/benchmarks/pipeline-<rev>.json)")
+    arg_parser.add_argument("--baseline", help="earlier pipeline results JSON to check for regressions")
+    arg_parser.add_argument("--tolerance", type=float, default=0.10,
+                            help="relative slowdown that counts as a regression (default 0.10)")
+    args = arg_parser.parse_args()
+
+    if "parser" in args.only:
+        print("\nParser backends:\n")
+        print_parser_results(bench_parser_backends(args.data))
+
+    if "memory" in args.only:
+        memory = {}
+        if Path(args.data).exists():
+            docs = parse_collection(args.data)
+            for doc in docs:
+                doc["tokens"] = process_text(doc["body"])
+            memory["collection"] = bench_index_memory(docs)
+
+        for scale, r in bench_index_memory_scaling(args.scales).items():
+            memory[f"synthetic x{scale}"] = r
+
+        # Postings dominate both indexes, so bytes/posting projects to larger collections
+        largest = memory[f"synthetic x{max(args.scales)}"]
+        if max(args.scales) < 1000:
+            factor = 1000 / max(args.scales)
+            print(f"\nProjected at x1000 (~{largest['postings'] * factor:,.0f} postings): "
+                  f"dict {largest['dict_mib'] * factor / 1024:.1f} GiB, "
+                  f"compact {largest['compact_mib'] * factor / 1024:.1f} GiB")
+
+        print("\nIndex memory (dict vs compact postings):\n")
+        print_memory_results(memory)
+
+    if "compression" in args.only:
+        scale = max(args.scales)
+        print(f"\nPostings compression (synthetic x{scale}):\n")
+        print_compression_results(bench_postings_compression(synthetic_token_documents(727 * scale)))
+
+    if "scoring" in args.only:
+        r = bench_batch_scoring(list(synthetic_token_documents(727 * 10)))
+        print(f"\nBM25 scoring, {r['queries']} queries over {r['docs']} synthetic documents:\n")
+        print(f"per-query loop: {r['loop_qps']:,.0f} queries/s")
+        print(f"vector batch:   {r['batch_qps']:,.0f} queries/s (engine build {r['engine_build_sec']:.2f}s, "
+              f"identical top 10: {r['identical']})")
+
+    if "bm25f" in args.only:
+        r = bench_field_weighted(synthetic_field_documents(727 * 10))
+        print(f"\nField-weighted BM25, {r['queries']} queries over {r['docs']} synthetic documents:\n")
+        print(f"two rankings + merge: {r['merge_ms_per_query']:.2f} ms/query")
+        print(f"single-pass BM25F:    {r['bm25f_ms_per_query']:.2f} ms/query")
+
+    if "positional" in args.only:
+        print("\nPositional index and phrase queries (synthetic x10):\n")
+        print_positional_results(bench_positional(synthetic_token_documents(727 * 10)))
+
+    if "boolean" in args.only:
+        print("\nBoolean AND vs disjunctive BM25 (synthetic x10):\n")
+        print_boolean_results(bench_boolean(list(synthetic_token_documents(727 * 10))))
+
+    if "pipeline" in args.only:
+        print("\nPipeline stages (synthetic HTML):\n")
+        results = run_pipeline_suite(args.pipeline_scales, args.corpus_dir, args.workers, args.queries)
+        print_pipeline_results(results)
+        print(f"\nSaved results to: {write_results(results, args.output)}")
+
+        if args.baseline:
+            with open(args.baseline, encoding="utf-8") as f:
+                regressions = compare_results(json.load(f), results, args.tolerance)
+            for r in regressions:
+                print(f"[WARN] Regression in {r['metric']}: {r['baseline']:.4g} -> {r['current']:.4g} "
+                      f"({r['change']:+.0%})")
+            if regressions:
+                sys.exit(1)
+            print(f"[INFO] No regressions beyond {args.tolerance:.0%} against {args.baseline}")
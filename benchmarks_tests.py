@@ -0,0 +1,53 @@
+import tempfile
+from collections import Counter
+
+from benchmarks import synthetic_html_pages, write_synthetic_corpus, bench_parse, compare_results
+from tokeniser import process_text
+
+# Runs without NLTK data: regex tokenizer, no stopword list, no WordNet
+PREPROCESSING = {"use_stopwords": False, "use_stemming": False, "use_lemmatization": False, "tokenizer": "regex"}
+
+
+def test_synthetic_corpus_is_reproducible_and_zipfian():
+    first = list(synthetic_html_pages(1))
+    assert len(first) == 727
+    assert first == list(synthetic_html_pages(1))
+    assert first != list(synthetic_html_pages(1, seed=1))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        assert write_synthetic_corpus(tmp, 1) == 727
+        documents, stats = bench_parse(tmp)
+    assert stats["pages"] == 727 and stats["pages_per_sec"] > 0
+
+    # boilerplate is stripped by the parser, the title survives
+    page = documents[0]
+    assert page["title"] and "Copyright" not in page["body"] and "var page" not in page["body"]
+
+    # frequency falls off roughly as 1/rank
+    counts = Counter(t for d in documents for t in process_text(d["body"], **PREPROCESSING))
+    ranked = [c for _, c in counts.most_common()]
+    assert ranked[0] > 5 * ranked[9] > 0
+
+
+def test_regressions_respect_direction_and_tolerance():
+    def results(p50_ms, pages_per_sec, postings):
+        return {"meta": {}, "runs": {"x10": {"docs": 7270, "stages": {
+            "parse": {"pages_per_sec": pages_per_sec},
+            "index": {"postings": postings},
+            "query": {"bm25": {"p50_ms": p50_ms}}
+        }}}}
+
+    baseline = results(p50_ms=1.0, pages_per_sec=1000.0, postings=100)
+    assert compare_results(baseline, results(1.05, 960.0, 50)) == []
+
+    regressions = compare_results(baseline, results(1.5, 800.0, 100))
+    assert [r["metric"] for r in regressions] == ["x10.parse.pages_per_sec", "x10.query.bm25.p50_ms"]
+
+    # faster is never a regression
+    assert compare_results(baseline, results(0.5, 2000.0, 100)) == []
+
+
+if __name__ == "__main__":
+    test_synthetic_corpus_is_reproducible_and_zipfian()
+    test_regressions_respect_direction_and_tolerance()
+    print("Benchmark tests passed")
@@ -0,0 +1,290 @@
+import re
+import time
+from bisect import bisect_left
+
+from tokeniser import process_text
+from ranker import top_k
+
+# -------------------------------
+# BOOLEAN QUERIES
+# -------------------------------
+#
+# AND, OR and NOT (upper case) with parentheses; words next to each other are ANDed:
+#
+#     game AND (atari OR activision) NOT racing
+#
+# Each word is preprocessed like a free-text query. A word that processes to nothing (a
+# stopword) is dropped, and one that yields several tokens matches all of them.
+# The query runs over the postings layout of ranker.build_maxscore_index (and of the
+# mapped index from index_store.open_index): term -> (sorted doc numbers, tfs).
+# Candidates come from intersecting postings, shortest list first, with galloping search;
+# only they are scored with BM25.
+
+OPERATORS = ("AND", "OR", "NOT")
+
+_TOKEN = re.compile(r"\(|\)|[^\s()]+")
+_BOOLEAN = re.compile(r"\b(?:AND|OR|NOT)\b")
+
+
+# Whether a query uses boolean syntax: an upper-case operator. Lower-case and/or/not are
+# plain words, and parentheses alone are part of the text ("Downhill Jam (2006)")
+def is_boolean_query(text):
+    return _BOOLEAN.search(text) is not None
+
+
+# Query tree as nested tuples: ("term", token), ("and", [nodes]), ("or", [nodes]), ("not", node).
+# Returns None when every word was dropped; raises ValueError on malformed queries.
+def parse_query(text, preprocessing=None):
+    preprocessing = preprocessing or {}
+    tokens = _TOKEN.findall(text)
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def take():
+        nonlocal position
+        position += 1
+        return tokens[position - 1]
+
+    def combine(op, nodes):
+        nodes = [node for node in nodes if node is not None]
+        if not nodes:
+            return None
+        return nodes[0] if len(nodes) == 1 else (op, nodes)
+
+    def parse_or():
+        nodes = [parse_and()]
+        while peek() == "OR":
+            take()
+            nodes.append(parse_and())
+        return combine("or", nodes)
+
+    def parse_and():
+        nodes = [parse_not()]
+        while peek() not in (None, "OR", ")"):
+            if peek() == "AND":
+                take()
+            nodes.append(parse_not())
+        return combine("and", nodes)
+
+    def parse_not():
+        if peek() == "NOT":
+            take()
+            node = parse_not()
+            return None if node is None else ("not", node)
+        return parse_primary()
+
+    def parse_primary():
+        token = peek()
+        if token is None:
+            raise ValueError(f"Query ends where a word or '(' was expected: {text!r}")
+        if token in OPERATORS or token == ")":
+            raise ValueError(f"Unexpected {token!r} in query: {text!r}")
+        take()
+        if token == "(":
+            node = parse_or()
+            if peek() != ")":
+                raise ValueError(f"Missing ')' in query: {text!r}")
+            take()
+            return node
+        return combine("and", [("term", t) for t in process_text(token, **preprocessing)])
+
+    if not tokens:
+        return None
+    tree = parse_or()
+    if position < len(tokens):
+        raise ValueError(f"Unexpected {tokens[position]!r} in query: {text!r}")
+    return tree
+
+
+# Tokens that can contribute to a score: every term not under a NOT, in query order
+def scoring_terms(tree, negated=False):
+    if tree is None:
+        return []
+    op = tree[0]
+    if op == "term":
+        return [] if negated else [tree[1]]
+    if op == "not":
+        return scoring_terms(tree[1], not negated)
+    return [t for node in tree[1] for t in scoring_terms(node, negated)]
+
+
+# -------------------------------
+# POSTINGS INTERSECTION
+# -------------------------------
+
+# Index of the first docs[i] >= target with i >= lo: doubling steps from lo, then binary
+# search inside the last step. Cheap when successive targets are close together.
+def gallop(docs, target, lo=0, stats=None):
+    n = len(docs)
+    step = 1
+    probes = 0
+    while lo + step < n and docs[lo + step] < target:
+        probes += 1
+        step *= 2
+    hi = min(n, lo + step + 1)
+    lo = lo + step // 2 if step > 1 else lo
+    if stats is not None:
+        stats["comparisons"] += probes + (hi - lo).bit_length()
+    return bisect_left(docs, target, lo, hi)
+
+
+# Sorted doc numbers present in every list, walking the shortest and galloping through the rest
+def intersect(lists, stats=None):
+    if not lists:
+        return []
+    lists = sorted(lists, key=len)
+    result = list(lists[0])
+
+    for docs in lists[1:]:
+        matched = []
+        lo = 0
+        for d in result:
+            lo = gallop(docs, d, lo, stats)
+            if lo == len(docs):
+                break
+            if docs[lo] == d:
+                matched.append(d)
+        result = matched
+        if not result:
+            break
+
+    return result
+
+
+def union(lists, stats=None):
+    if stats is not None:
+        stats["comparisons"] += sum(len(docs) for docs in lists)
+    return sorted(set().union(*lists))
+
+
+# Doc numbers of docs not in excluded, both sorted
+def difference(docs, excluded, stats=None):
+    result = []
+    lo = 0
+    for d in docs:
+        lo = gallop(excluded, d, lo, stats)
+        if lo == len(excluded) or excluded[lo] != d:
+            result.append(d)
+    return result
+
+
+# Sorted doc numbers matching the tree; num_docs is the universe that NOT complements against
+def evaluate(tree, postings, num_docs, stats=None):
+    op = tree[0]
+    if op == "term":
+        if tree[1] not in postings:
+            return []
+        docs = postings[tree[1]][0]
+        if stats is not None:
+            stats["postings"] += len(docs)
+        return docs
+    if op == "not":
+        return difference(range(num_docs), evaluate(tree[1], postings, num_docs, stats), stats)
+    if op == "or":
+        return union([evaluate(node, postings, num_docs, stats) for node in tree[1]], stats)
+
+    # AND: intersect the positive parts first, then remove each negated part from that
+    positive = [node for node in tree[1] if node[0] != "not"]
+    negative = [node[1] for node in tree[1] if node[0] == "not"]
+    if positive:
+        result = intersect([evaluate(node, postings, num_docs, stats) for node in positive], stats)
+    else:
+        result = range(num_docs)
+    for node in negative:
+        if not result:
+            break
+        result = difference(result, evaluate(node, postings, num_docs, stats), stats)
+    return list(result)
+
+
+# -------------------------------
+# RANKING
+# -------------------------------
+
+# Documents matching the boolean query, ranked by BM25 over its scoring terms with the
+# same scores and order as filtering rank_documents_bm25's full ranking to those documents.
+# Documents matched only through a NOT (e.g. "atari OR NOT game") follow with score 0.0.
+# Pass a dict as stats to receive postings / comparisons / candidates and the
+# intersection and scoring times in milliseconds. allowed (doc numbers supporting `in`,
+# e.g. a facets.Bitset) drops candidates before they are scored.
+def rank_documents_boolean(tree, maxscore_index, k=None, stats=None, allowed=None):
+    postings = maxscore_index["postings"]
+    doc_ids = maxscore_index["doc_ids"]
+    idf = maxscore_index["idf"]
+    lengths = maxscore_index["doc_lengths"]
+    avg_doc_length = maxscore_index["avg_dl"]
+    k1, b = maxscore_index["k1"], maxscore_index["b"]
+
+    cost = {"postings": 0, "comparisons": 0, "candidates": 0, "intersect_ms": 0.0, "score_ms": 0.0}
+    if stats is not None:
+        stats.update(cost)
+        cost = stats
+    if tree is None:
+        return []
+
+    start = time.perf_counter()
+    candidates = evaluate(tree, postings, len(doc_ids), cost)
+    if allowed is not None:
+        candidates = [d for d in candidates if d in allowed]
+    cost["candidates"] = len(candidates)
+    cost["intersect_ms"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    scores = {}
+    for term in scoring_terms(tree):
+        if term not in postings:
+            continue
+        docs, tfs = postings[term]
+        lo = 0
+        for d in candidates:
+            lo = bisect_left(docs, d, lo)
+            if lo == len(docs):
+                break
+            if docs[lo] != d:
+                continue
+            tf = tfs[lo]
+            numerator = tf * (k1 + 1)
+            denominator = tf + k1 * (1 - b + b * (lengths[d] / avg_doc_length))
+            doc_id = doc_ids[d]
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf[term] * (numerator / denominator)
+
+    for d in candidates:
+        scores.setdefault(doc_ids[d], 0.0)
+    cost["score_ms"] = (time.perf_counter() - start) * 1000
+
+    return top_k(scores, k)
+
+
+if __name__ == "__main__":
+    import argparse
+    from index_store import INDEX_PATH, DATA_DIR, DEFAULT_PREPROCESSING, open_or_build_index
+
+    arg_parser = argparse.ArgumentParser(description="Boolean (AND / OR / NOT) search ranked by BM25")
+    arg_parser.add_argument("--index", default=INDEX_PATH, help="index file (built if missing or stale)")
+    arg_parser.add_argument("--data", default=DATA_DIR, help="directory of .html documents")
+    arg_parser.add_argument("--k", type=int, default=10)
+    args = arg_parser.parse_args()
+
+    store = open_or_build_index(args.index, args.data, DEFAULT_PREPROCESSING)
+    maxscore_index = store["fields"]["body"]["maxscore_index"]
+    print(f"Number of documents: {store['num_docs']}")
+
+    while True:
+        text = input("\nEnter query, e.g. game AND (atari OR activision) NOT racing (or type 'exit'): ").strip()
+        if text.lower() == "exit":
+            break
+        try:
+            tree = parse_query(text, DEFAULT_PREPROCESSING)
+        except ValueError as e:
+            print(f"[ERROR] {e}")
+            continue
+
+        stats = {}
+        results = rank_documents_boolean(tree, maxscore_index, k=args.k, stats=stats)
+        print(f"[INFO] {stats['candidates']} matching documents from {stats['postings']} postings, "
+              f"{stats['comparisons']} comparisons, intersection {stats['intersect_ms']:.2f} ms, "
+              f"scoring {stats['score_ms']:.2f} ms")
+        for rank, (doc_id, score) in enumerate(results, start=1):
+            print(f"{rank:>2}. {score:.4f}  {store['doc_titles'].get(doc_id, doc_id)}")
@@ -0,0 +1,152 @@
+import os
+import random
+import tempfile
+
+from indexer import build_inverted_index_bm25
+from tokeniser import process_text
+from ranker import compute_idf, compute_avg_doc_length, rank_documents_bm25, build_maxscore_index
+from index_store import write_index, open_index
+from boolean_query import (
+    is_boolean_query,
+    parse_query,
+    scoring_terms,
+    gallop,
+    intersect,
+    rank_documents_boolean
+)
+
+PREPROCESSING = {"use_stopwords": False, "use_stemming": True, "use_lemmatization": False, "tokenizer": "regex"}
+WORDS = [f"w{i}" for i in range(10)]
+
+
+def _documents(num_docs=200, seed=5):
+    rng = random.Random(seed)
+    return [
+        {"doc_id": f"doc{i}.html", "tokens": rng.choices(WORDS, weights=range(10, 0, -1), k=rng.randint(0, 12))}
+        for i in range(num_docs)
+    ]
+
+
+def _random_query(rng, depth=0):
+    if depth > 2 or rng.random() < 0.4:
+        return rng.choice(WORDS + ["w99"])
+    op = rng.choice([" AND ", " OR ", " ", " AND NOT ", " OR NOT "])
+    return f"({_random_query(rng, depth + 1)}{op}{_random_query(rng, depth + 1)})"
+
+
+def _brute_force(tree, documents):
+    op = tree[0]
+    if op == "term":
+        return {d["doc_id"] for d in documents if tree[1] in d["tokens"]}
+    if op == "not":
+        return {d["doc_id"] for d in documents} - _brute_force(tree[1], documents)
+    sets = [_brute_force(node, documents) for node in tree[1]]
+    return set.intersection(*sets) if op == "and" else set.union(*sets)
+
+
+def test_parse_query():
+    tree = parse_query("Games AND (atari OR activision) NOT racing", PREPROCESSING)
+    assert tree == ("and", [("term", "game"), ("or", [("term", "atari"), ("term", "activis")]),
+                            ("not", ("term", "race"))])
+    assert parse_query("tony hawk", PREPROCESSING) == ("and", [("term", "toni"), ("term", "hawk")])
+    assert scoring_terms(tree) == ["game", "atari", "activis"]
+    assert scoring_terms(parse_query("NOT (a OR NOT b)", PREPROCESSING)) == ["b"]
+
+    stopwords = dict(PREPROCESSING, use_stopwords=True)
+    assert parse_query("game AND the", stopwords) == ("term", "game")
+    assert parse_query("NOT the", stopwords) is None
+
+    assert is_boolean_query("atari OR activision") and is_boolean_query("(arcade OR puzzle) game")
+    assert not is_boolean_query("tony and the hawk") and not is_boolean_query("(arcade)")
+    for bad in ("atari OR", "(atari", "atari)", "AND atari", "NOT"):
+        try:
+            parse_query(bad, PREPROCESSING)
+            assert False, bad
+        except ValueError:
+            pass
+
+
+def test_parenthesised_title_stays_free_text():
+    # main.py ranks queries that are not boolean with plain (disjunctive) BM25
+    text = "Tony Hawk's Downhill Jam (2006)"
+    assert not is_boolean_query(text)
+
+    documents = [{"doc_id": "jam.html", "tokens": ["toni", "hawk", "downhil", "jam"]},
+                 {"doc_id": "jam2006.html", "tokens": ["toni", "hawk", "downhil", "jam", "2006"]},
+                 {"doc_id": "taxi.html", "tokens": ["london", "taxi"]}]
+    index, doc_lengths = build_inverted_index_bm25(documents)
+    idf = compute_idf(index, len(documents), smooth=True)
+    results = rank_documents_bm25(process_text(text, **PREPROCESSING), index, idf, doc_lengths,
+                                  compute_avg_doc_length(doc_lengths))
+    assert [doc_id for doc_id, _ in results] == ["jam2006.html", "jam.html"]
+
+
+def test_gallop_and_intersect():
+    rng = random.Random(1)
+    docs = sorted(rng.sample(range(1000), 300))
+    stats = {"comparisons": 0}
+    for target in range(-1, 1002):
+        for lo in (0, 10, 150):
+            expected = max(lo, next((i for i, d in enumerate(docs) if d >= target), len(docs)))
+            assert gallop(docs, target, lo, stats) == expected
+    assert stats["comparisons"] > 0
+
+    lists = [sorted(rng.sample(range(500), n)) for n in (20, 400, 250)]
+    assert intersect(lists) == sorted(set(lists[0]) & set(lists[1]) & set(lists[2]))
+    assert intersect([]) == []
+
+
+def test_matches_brute_force_and_bm25():
+    documents = _documents()
+    index, doc_lengths = build_inverted_index_bm25(documents)
+    idf = compute_idf(index, len(documents), smooth=True)
+    avg_dl = compute_avg_doc_length(doc_lengths)
+    maxscore_index = build_maxscore_index(index, idf, doc_lengths, avg_dl)
+    rng = random.Random(2)
+
+    for _ in range(300):
+        text = _random_query(rng)
+        tree = parse_query(text, PREPROCESSING)
+        stats = {}
+        results = rank_documents_boolean(tree, maxscore_index, stats=stats)
+
+        expected = _brute_force(tree, documents)
+        assert {d for d, _ in results} == expected, text
+        assert stats["candidates"] == len(expected)
+
+        full = rank_documents_bm25(scoring_terms(tree), index, idf, doc_lengths, avg_dl)
+        scored = [(d, s) for d, s in full if d in expected]
+        assert results[:len(scored)] == scored, text
+        assert all(s == 0.0 for _, s in results[len(scored):])
+        assert rank_documents_boolean(tree, maxscore_index, k=5) == results[:5]
+
+    stats = {}
+    assert rank_documents_boolean(None, maxscore_index, stats=stats) == [] and stats["candidates"] == 0
+
+
+def test_mapped_index():
+    documents = [dict(d, title=d["doc_id"], title_tokens=d["tokens"][:2], body_tokens=d["tokens"])
+                 for d in _documents(50)]
+    in_memory = [{"doc_id": d["doc_id"], "tokens": d["tokens"]} for d in documents]
+    index, doc_lengths = build_inverted_index_bm25(in_memory)
+    idf = compute_idf(index, len(in_memory), smooth=True)
+    maxscore_index = build_maxscore_index(index, idf, doc_lengths, compute_avg_doc_length(doc_lengths))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "test.idx")
+        write_index(path, documents, PREPROCESSING)
+        store = open_index(path, PREPROCESSING)
+        mapped = store["fields"]["body"]["maxscore_index"]
+
+        for text in ("w0 AND w3", "(w1 OR w7) NOT w0", "NOT w2", "w4 w5 OR w9"):
+            tree = parse_query(text, PREPROCESSING)
+            assert rank_documents_boolean(tree, mapped) == rank_documents_boolean(tree, maxscore_index)
+
+
+if __name__ == "__main__":
+    test_parse_query()
+    test_parenthesised_title_stays_free_text()
+    test_gallop_and_intersect()
+    test_matches_brute_force_and_bm25()
+    test_mapped_index()
+    print("Boolean query tests passed")
@@ -0,0 +1,228 @@
+import math
+from pathlib import Path
+
+# -------------------------------
+# RUN EVALUATION
+# -------------------------------
+#
+# A run is every query's ranked list: {query_id: [(doc_id, score), ...]} in rank order.
+# Qrels are the relevance judgements: {query_id: {relevant doc_ids}} (binary relevance).
+#
+# evaluate_query walks a ranked list once and fills in P@k, R@k and nDCG@k for every
+# cutoff, plus average precision and reciprocal rank over the whole list. P@k and R@k
+# agree with ranker.precision_at_k / recall_at_k (P@k divides by k even when fewer than
+# k documents were returned).
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+QRELS_PATH = BASE_DIR / "data" / "videogame.qrels"
+
+CUTOFFS = (1, 5, 10, 20, 100)
+
+
+# TREC ids cannot contain whitespace: "London Taxi: Rush Hour" -> "London_Taxi:_Rush_Hour"
+def topic_id(query):
+    return "_".join(query.split())
+
+
+def _ideal_dcg(num_relevant, k):
+    return sum(1.0 / math.log2(rank + 1) for rank in range(1, min(k, num_relevant) + 1))
+
+
+def evaluate_query(results, relevant_docs, cutoffs=CUTOFFS):
+    cutoffs = sorted(set(cutoffs))
+    num_relevant = len(relevant_docs)
+    metrics = {}
+
+    hits = 0
+    dcg = 0.0
+    precision_sum = 0.0
+    reciprocal_rank = 0.0
+    pending = 0
+
+    def record(k):
+        metrics[f"P@{k}"] = hits / k if k else 0.0
+        metrics[f"R@{k}"] = hits / num_relevant if num_relevant else 0.0
+        ideal = _ideal_dcg(num_relevant, k)
+        metrics[f"nDCG@{k}"] = dcg / ideal if ideal else 0.0
+
+    for rank, (doc_id, _) in enumerate(results, start=1):
+        # Every cutoff below this rank is complete
+        while pending < len(cutoffs) and cutoffs[pending] < rank:
+            record(cutoffs[pending])
+            pending += 1
+
+        if doc_id in relevant_docs:
+            hits += 1
+            precision_sum += hits / rank
+            dcg += 1.0 / math.log2(rank + 1)
+            if not reciprocal_rank:
+                reciprocal_rank = 1.0 / rank
+
+    # Cutoffs at or beyond the end of the list
+    for k in cutoffs[pending:]:
+        record(k)
+
+    metrics["AP"] = precision_sum / num_relevant if num_relevant else 0.0
+    metrics["RR"] = reciprocal_rank
+    return metrics
+
+
+# Per-query metrics and their means (MAP, MRR) over every query in the run;
+# a query without judgements has no relevant documents
+def evaluate_run(run, qrels, cutoffs=CUTOFFS):
+    per_query = {query_id: evaluate_query(results, qrels.get(query_id, set()), cutoffs)
+                 for query_id, results in run.items()}
+
+    mean = {}
+    for metrics in per_query.values():
+        for name, value in metrics.items():
+            mean[name] = mean.get(name, 0.0) + value
+    mean = {name: value / len(per_query) for name, value in mean.items()}
+    mean["MAP"] = mean.pop("AP", 0.0)
+    mean["MRR"] = mean.pop("RR", 0.0)
+
+    return {"num_queries": len(per_query), "per_query": per_query, "mean": mean}
+
+
+# -------------------------------
+# TREC FILES
+# -------------------------------
+
+def _check_id(value, kind):
+    if not value or any(c.isspace() for c in value):
+        raise ValueError(f"TREC {kind} cannot be empty or contain whitespace: {value!r}")
+
+
+# Run file lines: "query_id Q0 doc_id rank score tag"
+def write_run(run, path, tag="run"):
+    _check_id(tag, "run tag")
+    with open(path, "w", encoding="utf-8") as f:
+        for query_id, results in run.items():
+            _check_id(query_id, "query id")
+            for rank, (doc_id, score) in enumerate(results, start=1):
+                _check_id(doc_id, "doc id")
+                f.write(f"{query_id} Q0 {doc_id} {rank} {score!r} {tag}\n")
+
+
+# Ranked lists in the file's rank order
+def read_run(path):
+    ranked = {}
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            parts = line.split()
+            if not parts:
+                continue
+            if len(parts) != 6:
+                raise ValueError(f"{path}:{line_number}: expected 6 columns, got {len(parts)}")
+            query_id, _, doc_id, rank, score, _ = parts
+            ranked.setdefault(query_id, []).append((int(rank), doc_id, float(score)))
+    return {query_id: [(doc_id, score) for _, doc_id, score in sorted(rows, key=lambda r: r[0])]
+            for query_id, rows in ranked.items()}
+
+
+# Qrels lines: "query_id 0 doc_id relevance"; sorted so the file is stable across runs
+def write_qrels(qrels, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for query_id, relevant_docs in qrels.items():
+            _check_id(query_id, "query id")
+            for doc_id in sorted(relevant_docs):
+                _check_id(doc_id, "doc id")
+                f.write(f"{query_id} 0 {doc_id} 1\n")
+
+
+# Relevant (relevance > 0) documents per query; judged-irrelevant rows keep the query present
+def read_qrels(path):
+    qrels = {}
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            parts = line.split()
+            if not parts:
+                continue
+            if len(parts) != 4:
+                raise ValueError(f"{path}:{line_number}: expected 4 columns, got {len(parts)}")
+            query_id, _, doc_id, relevance = parts
+            relevant_docs = qrels.setdefault(query_id, set())
+            if int(relevance) > 0:
+                relevant_docs.add(doc_id)
+    return qrels
+
+
+# Relevance sets keyed by query text (as build_relevance_sets returns them) <-> qrels file
+def freeze_relevance(relevance, path=QRELS_PATH):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    write_qrels({topic_id(query): docs for query, docs in relevance.items()}, path)
+    return path
+
+
+def load_relevance(queries, path=QRELS_PATH):
+    qrels = read_qrels(path)
+    return {query: qrels.get(topic_id(query), set()) for query in queries}
+
+
+def print_summary(evaluation, per_query=False):
+    if per_query:
+        for query_id, metrics in evaluation["per_query"].items():
+            print(query_id + "  " + "  ".join(f"{name}={value:.3f}" for name, value in metrics.items()))
+        print()
+    print(f"Queries: {evaluation['num_queries']}")
+    for name, value in evaluation["mean"].items():
+        print(f"{name:>10}  {value:.4f}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Evaluate TREC run files, or freeze the relevance sets as qrels")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+
+    freeze_parser = commands.add_parser("freeze", help="write build_relevance_sets to a qrels file")
+    freeze_parser.add_argument("--qrels", default=QRELS_PATH)
+
+    run_parser = commands.add_parser("run", help="rank experiments.QUERIES with the index and write a run file")
+    run_parser.add_argument("output")
+    run_parser.add_argument("--model", choices=("tfidf", "bm25", "field-weighted", "bm25f"), default="bm25")
+    run_parser.add_argument("--depth", type=int, default=100)
+
+    eval_parser = commands.add_parser("eval", help="score a run file against a qrels file")
+    eval_parser.add_argument("run")
+    eval_parser.add_argument("--qrels", default=QRELS_PATH)
+    eval_parser.add_argument("--cutoffs", type=int, nargs="+", default=list(CUTOFFS))
+    eval_parser.add_argument("--per-query", action="store_true")
+    args = arg_parser.parse_args()
+
+    if args.command == "eval":
+        print_summary(evaluate_run(read_run(args.run), read_qrels(args.qrels), args.cutoffs), args.per_query)
+
+    else:
+        from index_store import INDEX_PATH, open_or_build_index
+        from experiments import QUERIES, DATA_DIR, DOC_PREPROCESSING, load_metadata, build_relevance_sets
+        store = open_or_build_index(INDEX_PATH, DATA_DIR, DOC_PREPROCESSING)
+
+        if args.command == "freeze":
+            documents = [{"doc_id": doc_id, "title": t} for doc_id, t in store["doc_titles"].items()]
+            written = freeze_relevance(build_relevance_sets(documents, load_metadata()), args.qrels)
+            print(f"Wrote qrels to: {written}")
+
+        else:
+            from tokeniser import process_text
+            from ranker import rank_documents, rank_documents_bm25, rank_documents_bm25_field_weighted, rank_documents_bm25f
+            title, body, multifield = store["fields"]["title"], store["fields"]["body"], store["multifield"]
+            run = {}
+            for query in QUERIES:
+                tokens = process_text(query, **DOC_PREPROCESSING)
+                if args.model == "tfidf":
+                    results = rank_documents(tokens, body["index"], body["idf"], k=args.depth)
+                elif args.model == "bm25":
+                    results = rank_documents_bm25(tokens, body["index"], body["idf"], body["doc_lengths"],
+                                                  body["avg_dl"], k=args.depth)
+                elif args.model == "bm25f":
+                    results = rank_documents_bm25f(tokens, multifield["index"], multifield["idf"],
+                                                   multifield["field_lengths"], multifield["field_avg_dl"],
+                                                   {"title": 2.0, "body": 1.0}, k=args.depth)
+                else:
+                    results = rank_documents_bm25_field_weighted(
+                        tokens, title["index"], title["idf"], title["doc_lengths"], title["avg_dl"],
+                        body["index"], body["idf"], body["doc_lengths"], body["avg_dl"], k=args.depth)
+                run[topic_id(query)] = results
+            write_run(run, args.output, tag=args.model)
+            print(f"Wrote run to: {args.output}")
@@ -1,45 +1,114 @@
-from collections import defaultdict
+import math
+import os
+import tempfile
+
 from ranker import precision_at_k
 from ranker import recall_at_k
+from evaluation import (
+    evaluate_query,
+    evaluate_run,
+    write_run,
+    read_run,
+    write_qrels,
+    read_qrels,
+    freeze_relevance,
+    load_relevance,
+    topic_id
+)
 
-def test_precision_at_k():
-    print ("\nPrecision@k Tests\n")
+RESULTS = [
+    ("doc1", 3.0),
+    ("doc2", 2.0),
+    ("doc3", 1.0),
+    ("doc4", 0.5)
+]
 
-    results = [
-        ("doc1", 3.0),
-        ("doc2", 2.0),
-        ("doc3", 1.0),
-        ("doc4", 0.5)
-    ]
 
+def test_precision_at_k():
     relevant_docs = {"doc1", "doc3"}
 
-    print("Test 1: Precision@2 (expect 0.5)", precision_at_k(results, relevant_docs, 2))
+    assert precision_at_k(RESULTS, relevant_docs, 2) == 0.5
+    assert math.isclose(precision_at_k(RESULTS, relevant_docs, 3), 2 / 3)
+    assert precision_at_k(RESULTS, relevant_docs, 4) == 0.5
+    assert precision_at_k(RESULTS, relevant_docs, 0) == 0.0
 
-    print("Test 2: Precision@3 (expect 0.666...)", precision_at_k(results, relevant_docs, 3))
+    # fewer results than k still divides by k
+    assert precision_at_k(RESULTS, relevant_docs, 10) == 0.2
 
-    print("Test 3: Precision@4 (expect 0.5)", precision_at_k(results, relevant_docs, 4))
-
-    print("Test 4: Precision@0 (expect 0.0)", precision_at_k(results, relevant_docs, 0))
 
 def test_recall_at_k():
-    print("\nRecall@k Tests\n")
+    relevant_docs = {"doc1", "doc3", "doc5", "doc6"}
 
-    results = [
-        ("doc1", 3.0),
-        ("doc2", 2.0),
-        ("doc3", 1.0),
-        ("doc4", 0.5),
-    ]
+    assert recall_at_k(RESULTS, relevant_docs, 2) == 0.25
+    assert recall_at_k(RESULTS, relevant_docs, 3) == 0.5
+    assert recall_at_k(RESULTS, relevant_docs, 4) == 0.5
+    assert recall_at_k(RESULTS, set(), 4) == 0.0
 
+
+def test_evaluate_query():
     relevant_docs = {"doc1", "doc3", "doc5", "doc6"}
+    metrics = evaluate_query(RESULTS, relevant_docs, cutoffs=(0, 2, 3, 10))
+
+    for k in (0, 2, 3, 10):
+        assert metrics[f"P@{k}"] == precision_at_k(RESULTS, relevant_docs, k)
+        assert metrics[f"R@{k}"] == recall_at_k(RESULTS, relevant_docs, k)
+
+    # relevant at ranks 1 and 3
+    assert math.isclose(metrics["AP"], (1 / 1 + 2 / 3) / 4)
+    assert metrics["RR"] == 1.0
+    assert metrics["nDCG@2"] == 1.0 / (1.0 + 1 / math.log2(3))
+    assert math.isclose(metrics["nDCG@3"], (1 + 1 / math.log2(4)) / (1 + 1 / math.log2(3) + 1 / math.log2(4)))
+
+    late = evaluate_query([("x", 2.0), ("doc3", 1.0)], {"doc3"}, cutoffs=(1,))
+    assert late["RR"] == 0.5 and late["P@1"] == 0.0 and late["AP"] == 0.5
+
+    empty = evaluate_query([], set(), cutoffs=(5,))
+    assert empty == {"P@5": 0.0, "R@5": 0.0, "nDCG@5": 0.0, "AP": 0.0, "RR": 0.0}
+
+
+def test_evaluate_run():
+    run = {"q1": RESULTS, "q2": [("doc9", 1.0), ("doc1", 0.5)], "q3": []}
+    qrels = {"q1": {"doc1", "doc3"}, "q2": {"doc1"}}
+
+    evaluation = evaluate_run(run, qrels, cutoffs=(1, 2))
+    assert evaluation["num_queries"] == 3
+    assert evaluation["per_query"]["q3"]["AP"] == 0.0
+    assert math.isclose(evaluation["mean"]["MAP"], ((1 + 2 / 3) / 2 + 1 / 2 + 0) / 3)
+    assert math.isclose(evaluation["mean"]["MRR"], (1 + 1 / 2 + 0) / 3)
+    assert math.isclose(evaluation["mean"]["P@1"], 1 / 3)
+    assert math.isclose(evaluation["mean"]["R@2"], (1 / 2 + 1) / 3)
+
+
+def test_trec_files_round_trip():
+    run = {"q1": [("doc1", 3.25), ("doc2", 1 / 3)], "q2": [("doc3", 0.1)]}
+    relevance = {"Tony Hawk’s Downhill Jam": {"b.html", "a.html"}, "London Taxi: Rush Hour": set()}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        run_path = os.path.join(tmp, "bm25.run")
+        write_run(run, run_path, tag="bm25")
+        assert read_run(run_path) == run
+        with open(run_path, encoding="utf-8") as f:
+            assert f.readline() == "q1 Q0 doc1 1 3.25 bm25\n"
+
+        qrels_path = os.path.join(tmp, "test.qrels")
+        write_qrels({"q1": {"doc3", "doc1"}}, qrels_path)
+        assert read_qrels(qrels_path) == {"q1": {"doc1", "doc3"}}
 
-    print("Test 1: Recall@2 (expect 0.25):", recall_at_k(results, relevant_docs, 2))
+        freeze_relevance(relevance, qrels_path)
+        assert load_relevance(list(relevance), qrels_path) == relevance
+        assert topic_id("London Taxi: Rush Hour") == "London_Taxi:_Rush_Hour"
 
-    print("Test 2: Recall@3 (expect 0.5):", recall_at_k(results, relevant_docs, 3))
+        try:
+            write_run({"two words": []}, run_path)
+            assert False
+        except ValueError:
+            pass
 
-    print("Test 3: Recall@4 (expect 0.5):", recall_at_k(results, relevant_docs, 4))
 
 if __name__ == "__main__":
     test_precision_at_k()
-    test_recall_at_k()
\ No newline at end of file
+    test_recall_at_k()
+    test_evaluate_query()
+    test_evaluate_run()
+    test_trec_files_round_trip()
+    print("Evaluation tests passed")
@@ -1,8 +1,13 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 from pathlib import Path
 from parser import parse_collection
 from tokeniser import process_text
-from indexer import build_inverted_index_bm25
+from indexer import build_inverted_index_bm25, build_multifield_index
 from ranker import (
     compute_idf,
     rank_documents,
@@ -11,12 +16,18 @@ from ranker import (
     recall_at_k,
     compute_avg_doc_length,
     rank_documents_tfidf_field_weighted,
-    rank_documents_bm25_field_weighted
+    rank_documents_bm25_field_weighted,
+    rank_documents_bm25f
 )
+from index_store import INDEX_PATH, open_or_build_index, preprocessing_config, collection_fingerprint
+from evaluation import QRELS_PATH, load_relevance
+import profiling
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR / "data" / "Videogames"
 CSV_PATH = BASE_DIR / "data" / "videogame.csv"
+TOKEN_CACHE_DIR = BASE_DIR / "data" / "token_cache"
+GRID_RESULTS_PATH = BASE_DIR / "results" / "experiment_grid.csv"
 
 PREPROCESSING = {
     "use_stopwords": True,
@@ -24,6 +35,12 @@ PREPROCESSING = {
     "use_lemmatization": False
 }
 
+# Options load_documents actually passes to process_text (the rest are process_text defaults)
+DOC_PREPROCESSING = {
+    "use_stopwords": PREPROCESSING["use_stopwords"],
+    "use_stemming": PREPROCESSING["use_stemming"]
+}
+
 # Loads and preprocesses documents
 def load_documents():
     docs = parse_collection(DATA_DIR)
@@ -46,19 +63,19 @@ def load_documents():
 
 
 # Loads CSV metadata and maps it to doc_ids
-def load_metadata():
-    df = pd.read_csv(CSV_PATH)
+def load_metadata(path=CSV_PATH):
+    df = pd.read_csv(path)
 
     # Extract filename from url
-    df["doc_id"] = df["url"].astype(str).str.split("/").str[-1]
+    doc_ids = df["url"].astype(str).str.split("/").str[-1]
+
+    # Whole columns at a time; a missing column gives "" for every document
+    columns = [df[f"STRING : {field}"].map(str) if f"STRING : {field}" in df else [""] * len(df)
+               for field in ("publisher", "genre", "esrb")]
 
     meta = {}
-    for _, row in df.iterrows():
-        meta[row["doc_id"]] = {
-            "publisher": str(row.get("STRING : publisher", "")),
-            "genre": str(row.get("STRING : genre", "")),
-            "esrb": str(row.get("STRING : esrb", "")),
-        }
+    for doc_id, publisher, genre, esrb in zip(doc_ids, *columns):
+        meta[doc_id] = {"publisher": publisher, "genre": genre, "esrb": esrb}
     return meta
 
 
@@ -84,8 +101,8 @@ def model_and_eval(query, relevant_docs, index, idf, doc_lengths, avg_dl,
         use_lemmatization=use_lemmatization
     )
 
-    tfidf_results = rank_documents(query_tokens, index, idf)
-    bm25_results  = rank_documents_bm25(query_tokens, index, idf, doc_lengths, avg_dl)
+    tfidf_results = rank_documents(query_tokens, index, idf, k=10)
+    bm25_results  = rank_documents_bm25(query_tokens, index, idf, doc_lengths, avg_dl, k=10)
 
     tfidf_p10 = precision_at_k(tfidf_results, relevant_docs, 10)
     tfidf_r10 = recall_at_k(tfidf_results, relevant_docs, 10)
@@ -121,6 +138,14 @@ def build_relevance_sets(documents, meta):
     return rel
 
 
+# Relevance sets from the qrels file frozen by `python evaluation.py freeze`, otherwise
+# built from the CSV metadata and the document titles
+def load_relevance_sets(documents, queries=QUERIES, qrels_path=QRELS_PATH):
+    if Path(qrels_path).exists():
+        return load_relevance(queries, qrels_path)
+    return build_relevance_sets(documents, load_metadata())
+
+
 def print_top10(label, results, relevant_docs, doc_titles):
     print(f"\n{label} Top 10 Results:\n")
 
@@ -132,9 +157,10 @@ def print_top10(label, results, relevant_docs, doc_titles):
         print(f"    {title}")
         print(f"    score = {score:.4f}\n")
 
-# Experiment - Stopwords & Stemming
-def config_stopword_stem(use_stopwords, use_stemming):
-    documents = parse_collection(DATA_DIR)
+# Experiment - Stopwords & Stemming (pass already parsed documents to skip re-parsing)
+def config_stopword_stem(use_stopwords, use_stemming, documents=None):
+    if documents is None:
+        documents = parse_collection(DATA_DIR)
 
     for doc in documents:
         doc["tokens"] = process_text(
@@ -145,7 +171,7 @@ def config_stopword_stem(use_stopwords, use_stemming):
 
     index, doc_lengths = build_inverted_index_bm25(documents)
     avg_dl = compute_avg_doc_length(doc_lengths)
-    idf = compute_idf(index, num_docs, smooth=True)
+    idf = compute_idf(index, len(documents), smooth=True)
 
     return documents, index, doc_lengths, avg_dl, idf
 
@@ -153,35 +179,217 @@ def config_stopword_stem(use_stopwords, use_stemming):
 def make_field_docs(documents, tokens_key):
     return [{"doc_id": d["doc_id"], "tokens": d.get(tokens_key, [])} for d in documents]
 
+
+# -------------------------------
+# EXPERIMENT GRID
+# -------------------------------
+#
+# Parses the collection once, tokenises each distinct preprocessing variant once (token
+# streams are cached on disk per collection fingerprint), builds each variant's title and
+# body indexes once, and evaluates config x query x model in parallel, one process per
+# variant. Configs that resolve to the same process_text options share one variant.
+
+# Options each config passes to process_text (unset ones take process_text's defaults)
+EXPERIMENT_CONFIGS = {
+    "SW_ON_STEM_ON": {"use_stopwords": True, "use_stemming": True},
+    "SW_OFF_STEM_ON": {"use_stopwords": False, "use_stemming": True},
+    "SW_ON_STEM_OFF": {"use_stopwords": True, "use_stemming": False},
+    "SW_OFF_STEM_OFF": {"use_stopwords": False, "use_stemming": False},
+    "BASE_STEM": {"use_stopwords": True, "use_stemming": True, "use_lemmatization": False},
+    "LEMMA_ONLY": {"use_stopwords": True, "use_stemming": False, "use_lemmatization": True},
+    "NO_MORPH": {"use_stopwords": True, "use_stemming": False, "use_lemmatization": False},
+}
+
+GRID_MODELS = ("tfidf", "bm25", "tfidf_fw", "bm25_fw", "bm25f")
+
+# Parsed documents for the grid workers (set once per process)
+_GRID_DOCUMENTS = None
+
+
+def variant_key(options):
+    return json.dumps(preprocessing_config(options), sort_keys=True)
+
+
+def token_cache_path(fingerprint, options):
+    digest = hashlib.sha1(f"{fingerprint}\0{variant_key(options)}".encode("utf-8")).hexdigest()[:16]
+    return TOKEN_CACHE_DIR / f"tokens_{digest}.json"
+
+
+def tokenise_documents(documents, options):
+    return [
+        {
+            "doc_id": doc["doc_id"],
+            "title": doc["title"],
+            "title_tokens": process_text(doc["title"], **options),
+            "body_tokens": process_text(doc["body"], **options)
+        }
+        for doc in documents
+    ]
+
+
+# Title and body indexes with their BM25 statistics for one variant's token streams,
+# plus both fields in one multi-field index for BM25F
+def build_variant_index(streams):
+    variant = {}
+    for field in ("title", "body"):
+        index, doc_lengths = build_inverted_index_bm25(make_field_docs(streams, f"{field}_tokens"))
+        variant[field] = {
+            "index": index,
+            "doc_lengths": doc_lengths,
+            "avg_dl": compute_avg_doc_length(doc_lengths),
+            "idf": compute_idf(index, len(streams), smooth=True)
+        }
+
+    index, field_lengths = build_multifield_index(streams, ("title", "body"))
+    variant["multifield"] = {
+        "index": index,
+        "idf": compute_idf(index, len(streams), smooth=True),
+        "field_lengths": field_lengths,
+        "field_avg_dl": {field: compute_avg_doc_length(lengths) for field, lengths in field_lengths.items()}
+    }
+    return variant
+
+
+def rank_with_model(model, query_tokens, variant, k=10, w_title=2.0, w_body=1.0):
+    title, body = variant["title"], variant["body"]
+    if model == "tfidf":
+        return rank_documents(query_tokens, body["index"], body["idf"], k=k)
+    if model == "bm25":
+        return rank_documents_bm25(query_tokens, body["index"], body["idf"], body["doc_lengths"], body["avg_dl"], k=k)
+    if model == "tfidf_fw":
+        return rank_documents_tfidf_field_weighted(query_tokens, title["index"], title["idf"],
+                                                   body["index"], body["idf"], w_title=w_title, w_body=w_body, k=k)
+    if model == "bm25_fw":
+        return rank_documents_bm25_field_weighted(query_tokens, title["index"], title["idf"], title["doc_lengths"],
+                                                  title["avg_dl"], body["index"], body["idf"], body["doc_lengths"],
+                                                  body["avg_dl"], w_title=w_title, w_body=w_body, k=k)
+    if model == "bm25f":
+        multifield = variant["multifield"]
+        return rank_documents_bm25f(query_tokens, multifield["index"], multifield["idf"], multifield["field_lengths"],
+                                    multifield["field_avg_dl"], {"title": w_title, "body": w_body}, k=k)
+    raise ValueError(f"Unknown model: {model!r} (expected one of {GRID_MODELS})")
+
+
+def _init_grid_worker(documents):
+    global _GRID_DOCUMENTS
+    _GRID_DOCUMENTS = documents
+
+
+# One variant: token streams (from the cache or tokenised now), index, then every query x model
+def _evaluate_variant(task):
+    options, cache_path, queries, relevance, models, k = task
+    start = time.perf_counter()
+
+    if cache_path is not None and Path(cache_path).exists():
+        with open(cache_path, "r", encoding="utf-8") as f:
+            streams = json.load(f)
+    else:
+        streams = tokenise_documents(_GRID_DOCUMENTS, options)
+        if cache_path is not None:
+            Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+            with open(cache_path, "w", encoding="utf-8") as f:
+                json.dump(streams, f, ensure_ascii=False)
+
+    variant = build_variant_index(streams)
+    rows = []
+    for query in queries:
+        query_tokens = process_text(query, **options)
+        relevant_docs = relevance.get(query, set())
+        for model in models:
+            results = rank_with_model(model, query_tokens, variant, k=k)
+            rows.append({
+                "query": query,
+                "model": model,
+                f"P@{k}": precision_at_k(results, relevant_docs, k),
+                f"R@{k}": recall_at_k(results, relevant_docs, k),
+                "num_relevant": len(relevant_docs)
+            })
+    return rows, time.perf_counter() - start
+
+
+def run_experiment_grid(configs=EXPERIMENT_CONFIGS, directory=DATA_DIR, queries=QUERIES, relevance=None,
+                        models=GRID_MODELS, k=10, workers=None, use_cache=True):
+    directory = Path(directory)
+    fingerprint = collection_fingerprint(directory)
+
+    variants = {}
+    for name, options in configs.items():
+        variants.setdefault(variant_key(options), (options, []))[1].append(name)
+
+    cache_paths = {key: token_cache_path(fingerprint, options) if use_cache else None
+                   for key, (options, _) in variants.items()}
+
+    if relevance is None and Path(QRELS_PATH).exists():
+        relevance = load_relevance(queries)
+
+    # Parse only if some variant is not cached yet
+    documents = None
+    if not all(path is not None and path.exists() for path in cache_paths.values()):
+        documents = parse_collection(directory, workers=workers)
+
+    if relevance is None:
+        if documents is not None:
+            titles = [{"doc_id": d["doc_id"], "title": d["title"]} for d in documents]
+        else:
+            with open(next(iter(cache_paths.values())), "r", encoding="utf-8") as f:
+                titles = json.load(f)
+        relevance = build_relevance_sets(titles, load_metadata())
+
+    tasks = [(options, cache_paths[key], list(queries), relevance, tuple(models), k)
+             for key, (options, _) in variants.items()]
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(tasks))
+    if workers <= 1:
+        _init_grid_worker(documents)
+        outputs = [_evaluate_variant(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_grid_worker,
+                                 initargs=(documents,)) as executor:
+            outputs = list(executor.map(_evaluate_variant, tasks))
+
+    rows = []
+    for (key, (options, names)), (variant_rows, seconds) in zip(variants.items(), outputs):
+        config = preprocessing_config(options)
+        for name in names:
+            for row in variant_rows:
+                rows.append({
+                    "config": name,
+                    "use_stopwords": config["use_stopwords"],
+                    "use_stemming": config["use_stemming"],
+                    "use_lemmatization": config["use_lemmatization"],
+                    **row,
+                    "variant_seconds": seconds
+                })
+    return pd.DataFrame(rows)
+
+
 if __name__ == "__main__":
 
-    # -------------------------------
-    # Load & preprocess
-    # -------------------------------
-    documents = load_documents()
+    # SEARCH_PROFILE=summary (or a .json/.csv path) reports where the time went at exit
+    profiling.enable_from_env()
 
     # -------------------------------
-    # Build BM25-compatible index ONCE
+    # Open the prebuilt index (built once by `python index_store.py`)
     # -------------------------------
-    N = len(documents)
+    store = open_or_build_index(INDEX_PATH, DATA_DIR, DOC_PREPROCESSING)
+    N = store["num_docs"]
 
-    title_docs = make_field_docs(documents, "title_tokens")
-    body_docs = make_field_docs(documents, "body_tokens")
+    title = store["fields"]["title"]
+    body = store["fields"]["body"]
 
-    title_index, title_lengths = build_inverted_index_bm25(title_docs)
-    body_index, body_lengths = build_inverted_index_bm25(body_docs)
+    title_index, title_lengths = title["index"], title["doc_lengths"]
+    body_index, body_lengths = body["index"], body["doc_lengths"]
 
-    title_avg_dl = compute_avg_doc_length(title_lengths)
-    body_avg_dl = compute_avg_doc_length(body_lengths)
+    title_avg_dl = title["avg_dl"]
+    body_avg_dl = body["avg_dl"]
 
-    title_idf = compute_idf(title_index, N, smooth=True)
-    body_idf = compute_idf(body_index, N, smooth=True)
-
-    index, doc_lengths = build_inverted_index_bm25(documents)
-    avg_dl = compute_avg_doc_length(doc_lengths)
+    title_idf = title["idf"]
+    body_idf = body["idf"]
 
-    num_docs = len(documents)
-    idf = compute_idf(index, num_docs, smooth=True)
+    # doc["tokens"] is the body field, so the main index is the body index
+    index, doc_lengths, avg_dl, idf = body_index, body_lengths, body_avg_dl, body_idf
 
     # -------------------------------
     # Evaluation setup (example query)
@@ -195,18 +403,11 @@ if __name__ == "__main__":
         use_lemmatization=PREPROCESSING.get("use_lemmatization", False)
     )
 
-    documents = load_documents()
-    meta = load_metadata()
+    # Titles are all the relevance sets need from the documents
+    doc_titles = store["doc_titles"]
+    documents = [{"doc_id": doc_id, "title": t} for doc_id, t in doc_titles.items()]
 
-    # Build title lookup ONCE
-    doc_titles = {doc["doc_id"]: doc["title"] for doc in documents}
-
-    # Build one index for BOTH rankers
-    index, doc_lengths = build_inverted_index_bm25(documents)
-    avg_dl = compute_avg_doc_length(doc_lengths)
-    idf = compute_idf(index, len(documents), smooth=True)
-
-    relevance = build_relevance_sets(documents, meta)
+    relevance = load_relevance_sets(documents)
 
     print("Query,TFIDF_P10,TFIDF_R10,BM25_P10,BM25_R10,NumRelDocs")
 
@@ -228,113 +429,15 @@ if __name__ == "__main__":
 
 
     # -------------------------------
-    # Stopwords & Stemming - Configuration test
+    # Stopwords/stemming and lemmatisation configs x queries x models, in parallel
     # -------------------------------
+    start = time.perf_counter()
+    # Worker processes keep their own counters, so a profiled run evaluates the grid serially
+    grid = run_experiment_grid(relevance=relevance, workers=1 if profiling.is_enabled() else None)
+    print(f"\nExperiment grid: {len(grid)} rows in {time.perf_counter() - start:.1f}s")
 
-    CONFIGS = [
-        ("SW_ON_STEM_ON", True, True),
-        ("SW_OFF_STEM_ON", False, True),
-        ("SW_ON_STEM_OFF", True, False),
-        ("SW_OFF_STEM_OFF", False, False),
-    ]
-
-    for name, sw, stem in CONFIGS:
-        documents, index, doc_lengths, avg_dl, idf = config_stopword_stem(sw, stem)
-
-        print("\n==============================")
-        print("CONFIG:", name)
-        print("==============================")
-
-        for q in QUERIES:
-            query_tokens = process_text(q, use_stopwords=sw, use_stemming=stem)
-
-            tfidf_results = rank_documents(query_tokens, index, idf)
-            bm25_results = rank_documents_bm25(query_tokens, index, idf, doc_lengths, avg_dl)
-
-            # Use your existing relevance sets here
-            relevant_docs = relevance[q]
-
-            print(f"\nQuery: {q}")
-            print("TF-IDF P@10:", precision_at_k(tfidf_results, relevant_docs, 10))
-            print("BM25  P@10:", precision_at_k(bm25_results, relevant_docs, 10))
+    print(grid.pivot_table(index=["config", "query"], columns="model", values="P@10").round(3).to_string())
 
-            print("\nTF-IDF R@10:", recall_at_k(tfidf_results, relevant_docs, 10))
-            print("BM25  R@10:", recall_at_k(bm25_results, relevant_docs, 10))
-
-    # -------------------------------
-    # Lemmatization - Configuration test
-    # -------------------------------
-    LEMM_CONFIGS = [
-        ("BASE_STEM", True, True, False),  # stopwords on, stemming on
-        ("LEMMA_ONLY", True, False, True),  # stopwords on, lemmatization on
-        ("NO_MORPH", True, False, False),  # stopwords on, no stemming/lemm
-    ]
-
-    for name, sw, stem, lem in LEMM_CONFIGS:
-        documents = parse_collection(DATA_DIR)
-        for doc in documents:
-            doc["tokens"] = process_text(
-                doc["body"],
-                use_stopwords=sw,
-                use_stemming=stem,
-                use_lemmatization=lem
-            )
-
-        index, doc_lengths = build_inverted_index_bm25(documents)
-        avg_dl = compute_avg_doc_length(doc_lengths)
-        idf = compute_idf(index, len(documents), smooth=True)
-
-        print("\n==============================")
-        print("LEMMA CONFIG:", name)
-        print("==============================")
-
-        for q in QUERIES:
-            query_tokens = process_text(
-                q,
-                use_stopwords=sw,
-                use_stemming=stem,
-                use_lemmatization=lem
-            )
-
-            tfidf_results = rank_documents(query_tokens, index, idf)
-            bm25_results = rank_documents_bm25(query_tokens, index, idf, doc_lengths, avg_dl)
-
-            relevant_docs = relevance[q]
-
-            print(f"\nQuery: {q}")
-            print("TF-IDF P@10:", precision_at_k(tfidf_results, relevant_docs, 10))
-            print("BM25  P@10:", precision_at_k(bm25_results, relevant_docs, 10))
-            print("TF-IDF R@10:", recall_at_k(tfidf_results, relevant_docs, 10))
-            print("BM25  R@10:", recall_at_k(bm25_results, relevant_docs, 10))
-
-            # -------------------------------
-            # Field-weighted TF-IDF and BM25
-            # -------------------------------
-            w_title = 2.0
-            w_body = 1.0
-
-            query_tokens = process_text(
-                q,
-                use_stopwords=PREPROCESSING["use_stopwords"],
-                use_stemming=PREPROCESSING["use_stemming"],
-                use_lemmatization=PREPROCESSING.get("use_lemmatization", False)
-            )
-
-            tfidf_fw = rank_documents_tfidf_field_weighted(
-                query_tokens,
-                title_index, title_idf,
-                body_index, body_idf,
-                w_title=w_title, w_body=w_body
-            )
-
-            bm25_fw = rank_documents_bm25_field_weighted(
-                query_tokens,
-                title_index, title_idf, title_lengths, title_avg_dl,
-                body_index, body_idf, body_lengths, body_avg_dl,
-                w_title=w_title, w_body=w_body
-            )
-
-            print(f"TFIDF_FW_P10,{precision_at_k(tfidf_fw, relevant_docs, 10):.3f}")
-            print(f"BM25_FW_P10,{precision_at_k(bm25_fw, relevant_docs, 10):.3f}")
-            print(f"TFIDF_FW_R10,{recall_at_k(tfidf_fw, relevant_docs, 10):.3f}")
-            print(f"BM25_FW_R10,{recall_at_k(bm25_fw, relevant_docs, 10):.3f}")
\ No newline at end of file
+    GRID_RESULTS_PATH.parent.mkdir(exist_ok=True)
+    grid.to_csv(GRID_RESULTS_PATH, index=False)
+    print(f"\nSaved results to: {GRID_RESULTS_PATH}")
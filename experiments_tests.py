@@ -0,0 +1,50 @@
+import tempfile
+from pathlib import Path
+
+from experiments import GRID_MODELS, run_experiment_grid, variant_key
+
+# Runs without NLTK data: regex tokenizer, no stopword list, no WordNet
+CONFIGS = {
+    "STEM": {"use_stopwords": False, "use_stemming": True, "use_lemmatization": False, "tokenizer": "regex"},
+    "NO_STEM": {"use_stopwords": False, "use_stemming": False, "use_lemmatization": False, "tokenizer": "regex"},
+    # same options as STEM once defaults are filled in
+    "STEM_AGAIN": {"use_stemming": True, "use_stopwords": False, "use_lemmatization": False, "tokenizer": "regex",
+                   "lemmatize_with_pos": True},
+}
+
+PAGES = {
+    "a.html": "<title>Tony Hawk's Downhill Jam</title><body>downhill jam skating games</body>",
+    "b.html": "<title>London Taxi: Rush Hour</title><body>taxi rush hour driving game</body>",
+    "c.html": "<title>Arcade Classics</title><body>arcade games game atari</body>",
+}
+QUERIES = ["Downhill Jam", "arcade games", "taxi"]
+RELEVANCE = {"Downhill Jam": {"a.html"}, "arcade games": {"c.html"}, "taxi": {"b.html"}}
+
+
+def test_grid_is_the_same_serial_and_parallel():
+    assert variant_key(CONFIGS["STEM"]) == variant_key(CONFIGS["STEM_AGAIN"])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, html in PAGES.items():
+            (Path(tmp) / name).write_text(html, encoding="utf-8")
+
+        serial = run_experiment_grid(CONFIGS, tmp, QUERIES, RELEVANCE, workers=1, use_cache=False)
+        parallel = run_experiment_grid(CONFIGS, tmp, QUERIES, RELEVANCE, workers=2, use_cache=False)
+
+    columns = [c for c in serial.columns if c != "variant_seconds"]
+    assert serial[columns].equals(parallel[columns])
+    assert len(serial) == len(CONFIGS) * len(QUERIES) * len(GRID_MODELS)
+    assert set(serial["config"]) == set(CONFIGS)
+
+    # stemming is what lets "games" match "game"
+    stem = serial[(serial["config"] == "STEM") & (serial["model"] == "bm25")].set_index("query")
+    assert stem.loc["arcade games", "P@10"] > 0
+    bm25f = serial[(serial["config"] == "STEM") & (serial["model"] == "bm25f")].set_index("query")
+    assert bm25f.loc["Downhill Jam", "P@10"] > 0
+    assert (serial[serial["config"] == "STEM"][columns[1:]].values ==
+            serial[serial["config"] == "STEM_AGAIN"][columns[1:]].values).all()
+
+
+if __name__ == "__main__":
+    test_grid_is_the_same_serial_and_parallel()
+    print("Experiment tests passed")
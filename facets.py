@@ -0,0 +1,289 @@
+import re
+from array import array
+from bisect import bisect_left
+
+# -------------------------------
+# COMPRESSED BITSETS
+# -------------------------------
+#
+# Doc IDs are split by their high 16 bits into containers of up to 65536 documents.
+# A container holding few documents is a sorted array("H") of the low 16 bits (2 bytes
+# per document); once it holds more than ARRAY_LIMIT it becomes a plain 8 KiB bitmap,
+# which is smaller from that point on. Rare facet values (most publishers) therefore cost
+# a few bytes, and common ones (esrb:E) at most one bit per document.
+
+ARRAY_LIMIT = 4096
+BITMAP_BYTES = 8192
+
+
+def _pack(lows):
+    if len(lows) <= ARRAY_LIMIT:
+        return array("H", lows)
+    bitmap = bytearray(BITMAP_BYTES)
+    for low in lows:
+        bitmap[low >> 3] |= 1 << (low & 7)
+    return bytes(bitmap)
+
+
+def _lows(container):
+    if isinstance(container, array):
+        return list(container)
+    lows = []
+    for i, byte in enumerate(container):
+        if byte:
+            base = i << 3
+            lows.extend(base + bit for bit in range(8) if byte >> bit & 1)
+    return lows
+
+
+def _cardinality(container):
+    if isinstance(container, array):
+        return len(container)
+    return int.from_bytes(container, "little").bit_count()
+
+
+def _has(container, low):
+    if isinstance(container, array):
+        i = bisect_left(container, low)
+        return i < len(container) and container[i] == low
+    return container[low >> 3] >> (low & 7) & 1 == 1
+
+
+def _and(a, b):
+    if isinstance(a, bytes) and isinstance(b, bytes):
+        bits = int.from_bytes(a, "little") & int.from_bytes(b, "little")
+        container = bits.to_bytes(BITMAP_BYTES, "little")
+        return container if bits.bit_count() > ARRAY_LIMIT else array("H", _lows(container))
+    if isinstance(a, bytes):
+        a, b = b, a
+    if isinstance(b, bytes):
+        return array("H", [low for low in a if b[low >> 3] >> (low & 7) & 1])
+    return array("H", sorted(set(a).intersection(b)))
+
+
+def _or(a, b):
+    if isinstance(a, bytes) or isinstance(b, bytes):
+        bits = 0
+        for container in (a, b):
+            if isinstance(container, bytes):
+                bits |= int.from_bytes(container, "little")
+            else:
+                for low in container:
+                    bits |= 1 << low
+        return bits.to_bytes(BITMAP_BYTES, "little")
+    return _pack(sorted(set(a).union(b)))
+
+
+# A set of integer doc IDs supporting &, |, `in`, len and sorted iteration
+class Bitset:
+    __slots__ = ("containers",)
+
+    # doc_ids must be sorted
+    def __init__(self, doc_ids=()):
+        self.containers = {}
+        key = None
+        lows = []
+        for doc_id in doc_ids:
+            if doc_id >> 16 != key:
+                if lows:
+                    self.containers[key] = _pack(lows)
+                key, lows = doc_id >> 16, []
+            lows.append(doc_id & 0xFFFF)
+        if lows:
+            self.containers[key] = _pack(lows)
+
+    def _with(self, containers):
+        result = Bitset()
+        result.containers = {key: c for key, c in sorted(containers.items()) if _cardinality(c)}
+        return result
+
+    def __and__(self, other):
+        return self._with({key: _and(c, other.containers[key])
+                           for key, c in self.containers.items() if key in other.containers})
+
+    def __or__(self, other):
+        containers = dict(self.containers)
+        for key, c in other.containers.items():
+            containers[key] = _or(containers[key], c) if key in containers else c
+        return self._with(containers)
+
+    def __contains__(self, doc_id):
+        container = self.containers.get(doc_id >> 16)
+        return container is not None and _has(container, doc_id & 0xFFFF)
+
+    def __len__(self):
+        return sum(_cardinality(c) for c in self.containers.values())
+
+    def __bool__(self):
+        return bool(self.containers)
+
+    def __iter__(self):
+        for key, container in self.containers.items():
+            base = key << 16
+            for low in _lows(container):
+                yield base + low
+
+    # Bytes of container payload (arrays and bitmaps), for size reports
+    def nbytes(self):
+        return sum(len(c) * c.itemsize if isinstance(c, array) else len(c) for c in self.containers.values())
+
+    def __repr__(self):
+        return f"Bitset({list(self)!r})"
+
+
+# -------------------------------
+# FACET INDEX
+# -------------------------------
+
+FACETS = ("publisher", "genre", "esrb")
+
+# Fields holding comma-separated lists ("Sports, Action" is both Sports and Action)
+MULTI_VALUED = ("genre",)
+
+# publisher:Atari, genre:"Action, Adventure", esrb:"E 10+"
+_FILTER = re.compile(r'\b(' + "|".join(FACETS) + r'):(?:"([^"]*)"|(\S+))', re.IGNORECASE)
+
+
+def facet_values(field, raw):
+    if raw in ("", "nan"):
+        return []
+    parts = raw.split(",") if field in MULTI_VALUED else [raw]
+    return [part.strip() for part in parts if part.strip()]
+
+
+# Per-value bitsets over integer doc IDs, numbered in doc_ids order (pass the index's doc
+# order so the bitsets line up with compact / maxscore doc numbers). meta is the
+# doc_id -> {field: value} dict of experiments.load_metadata; documents without metadata
+# simply have no facet values. Values are matched case-insensitively.
+def build_facet_index(meta, doc_ids, fields=FACETS):
+    doc_ids = list(doc_ids)
+    values = {field: {} for field in fields}
+    labels = {field: {} for field in fields}
+
+    for doc_number, doc_id in enumerate(doc_ids):
+        m = meta.get(doc_id)
+        if m is None:
+            continue
+        for field in fields:
+            for value in facet_values(field, m.get(field, "")):
+                key = value.lower()
+                labels[field].setdefault(key, value)
+                numbers = values[field].setdefault(key, [])
+                # A value repeated within one document ("Action, Action") counts once
+                if not numbers or numbers[-1] != doc_number:
+                    numbers.append(doc_number)
+
+    return {
+        "doc_ids": doc_ids,
+        "doc_numbers": {doc_id: i for i, doc_id in enumerate(doc_ids)},
+        "fields": {field: {key: Bitset(numbers) for key, numbers in values[field].items()} for field in fields},
+        "labels": labels
+    }
+
+
+# Splits "arcade games publisher:Atari esrb:E" into ("arcade games", {"publisher": ["Atari"], "esrb": ["E"]})
+def parse_filters(text):
+    filters = {}
+    for match in _FILTER.finditer(text):
+        value = match.group(2) if match.group(2) is not None else match.group(3)
+        filters.setdefault(match.group(1).lower(), []).append(value)
+    return " ".join(_FILTER.sub(" ", text).split()), filters
+
+
+# Documents matching every field's filter, where several values of one field are
+# alternatives (genre:Arcade genre:Puzzles) and a comma list in one value of a
+# multi-valued field needs all of them (genre:"Action, Adventure"); None when there
+# are no filters
+def filter_bitset(facet_index, filters):
+    result = None
+    for field, values in filters.items():
+        field_values = facet_index["fields"][field]
+        matched = Bitset()
+        for value in values:
+            parts = [field_values.get(part.lower(), Bitset()) for part in facet_values(field, value)]
+            if parts:
+                required = parts[0]
+                for part in parts[1:]:
+                    required = required & part
+                matched = matched | required
+        result = matched if result is None else result & matched
+    return result
+
+
+# `doc_id in f` over filenames, for rankers keyed by doc_id (ranker.rank_documents(_bm25)'s allowed)
+class DocFilter:
+    __slots__ = ("bitset", "doc_numbers")
+
+    def __init__(self, facet_index, bitset):
+        self.bitset = bitset
+        self.doc_numbers = facet_index["doc_numbers"]
+
+    def __contains__(self, doc_id):
+        doc_number = self.doc_numbers.get(doc_id)
+        return doc_number is not None and doc_number in self.bitset
+
+    def __len__(self):
+        return len(self.bitset)
+
+
+# {field: [(value, count), ...]} over the given doc_ids (e.g. every ranked result),
+# most common first; top keeps only the first values of each field
+def facet_counts(facet_index, doc_ids, fields=FACETS, top=None):
+    doc_numbers = facet_index["doc_numbers"]
+    results = Bitset(sorted(doc_numbers[d] for d in set(doc_ids) if d in doc_numbers))
+    counts = {}
+
+    for field in fields:
+        labels = facet_index["labels"][field]
+        field_counts = [(labels[key], len(bitset & results)) for key, bitset in facet_index["fields"][field].items()]
+        field_counts = sorted((pair for pair in field_counts if pair[1]), key=lambda x: (-x[1], x[0]))
+        counts[field] = field_counts[:top] if top is not None else field_counts
+
+    return counts
+
+
+def print_facet_counts(counts):
+    for field, values in counts.items():
+        if values:
+            print(f"{field}: " + ", ".join(f"{value} ({count})" for value, count in values))
+
+
+if __name__ == "__main__":
+    import argparse
+    from experiments import CSV_PATH, load_metadata, print_top10
+    from index_store import INDEX_PATH, DATA_DIR, DEFAULT_PREPROCESSING, open_or_build_index
+    from tokeniser import process_text
+    from ranker import rank_documents_bm25
+
+    arg_parser = argparse.ArgumentParser(description="BM25 search with publisher / genre / esrb filters")
+    arg_parser.add_argument("--index", default=INDEX_PATH, help="index file (built if missing or stale)")
+    arg_parser.add_argument("--data", default=DATA_DIR, help="directory of .html documents")
+    arg_parser.add_argument("--csv", default=CSV_PATH, help="metadata CSV")
+    args = arg_parser.parse_args()
+
+    store = open_or_build_index(args.index, args.data, DEFAULT_PREPROCESSING)
+    body = store["fields"]["body"]
+    facet_index = build_facet_index(load_metadata(args.csv), store["doc_titles"])
+    for field in FACETS:
+        print(f"{field}: {len(facet_index['fields'][field])} values")
+
+    while True:
+        text = input("\nEnter query, e.g. arcade publisher:Atari esrb:E (or type 'exit'): ").strip()
+        if text.lower() == "exit":
+            break
+        query, filters = parse_filters(text)
+        allowed = filter_bitset(facet_index, filters)
+        query_tokens = process_text(query, **DEFAULT_PREPROCESSING)
+
+        if query_tokens:
+            results = rank_documents_bm25(query_tokens, body["index"], body["idf"], body["doc_lengths"],
+                                          body["avg_dl"], allowed=DocFilter(facet_index, allowed) if filters else None)
+        elif filters:
+            # Filters alone list the matching documents in collection order
+            results = [(facet_index["doc_ids"][d], 0.0) for d in allowed]
+        else:
+            results = []
+
+        print_top10("BM25", results, set(), store["doc_titles"])
+        print(f"[INFO] {len(results)} matching documents")
+        print_facet_counts(facet_counts(facet_index, [doc_id for doc_id, _ in results], top=5))
@@ -0,0 +1,179 @@
+import random
+from pathlib import Path
+
+from indexer import build_inverted_index_bm25
+from ranker import compute_idf, compute_avg_doc_length, rank_documents, rank_documents_bm25, build_maxscore_index
+from experiments import load_metadata
+from boolean_query import parse_query, rank_documents_boolean
+from facets import (
+    ARRAY_LIMIT,
+    Bitset,
+    build_facet_index,
+    parse_filters,
+    filter_bitset,
+    DocFilter,
+    facet_counts
+)
+
+PREPROCESSING = {"use_stopwords": False, "use_stemming": False, "use_lemmatization": False, "tokenizer": "regex"}
+CSV = Path(__file__).resolve().parent / "videogame.csv"
+PUBLISHERS = ["Atari", "Nintendo", "Ubisoft", "THQ"]
+GENRES = ["Arcade", "Action", "Puzzles", "Sports", "Racing"]
+
+
+def _collection(num_docs=300, seed=11):
+    rng = random.Random(seed)
+    documents, meta = [], {}
+    for i in range(num_docs):
+        doc_id = f"doc{i}.html"
+        documents.append({"doc_id": doc_id, "tokens": rng.choices([f"w{j}" for j in range(8)], k=rng.randint(1, 10))})
+        if i % 17 == 0:
+            continue
+        meta[doc_id] = {
+            "publisher": rng.choice(PUBLISHERS),
+            "genre": ", ".join(rng.sample(GENRES, rng.randint(1, 2))),
+            "esrb": rng.choice(["E", "E 10+", "nan"])
+        }
+    return documents, meta
+
+
+def _brute_filter(meta, doc_ids, filters):
+    def matches(doc_id):
+        m = meta.get(doc_id)
+        if m is None:
+            return False
+        for field, values in filters.items():
+            have = {v.strip().lower() for v in m[field].split(",")} if field == "genre" else {m[field].lower()}
+            if not have & {v.lower() for v in values}:
+                return False
+        return True
+    return {doc_id for doc_id in doc_ids if matches(doc_id)}
+
+
+def test_bitset_matches_sets():
+    rng = random.Random(4)
+    universe = 200_000
+    # Sparse, dense (bitmap containers) and spanning several 65536-doc chunks
+    samples = [rng.sample(range(universe), n) for n in (0, 10, 3000, 9000, 60_000)]
+    samples.append(list(range(1000, 1000 + 2 * ARRAY_LIMIT)))
+
+    bitsets = [Bitset(sorted(s)) for s in samples]
+    for s, bitset in zip(samples, bitsets):
+        assert list(bitset) == sorted(s) and len(bitset) == len(s)
+        for d in rng.sample(range(universe), 200) + s[:50]:
+            assert (d in bitset) == (d in set(s))
+
+    for a, sa in zip(bitsets, samples):
+        for b, sb in zip(bitsets, samples):
+            assert list(a & b) == sorted(set(sa) & set(sb))
+            assert list(a | b) == sorted(set(sa) | set(sb))
+
+    # A bitmap is used only where it is smaller than the array of low 16-bit halves
+    dense = Bitset(range(65536))
+    assert dense.nbytes() == 8192
+    assert Bitset(range(100)).nbytes() == 200
+    assert not (Bitset([1, 2]) & Bitset([3]))
+
+
+def test_parse_filters():
+    text, filters = parse_filters('arcade games publisher:Atari genre:Arcade Esrb:"E 10+" genre:puzzles')
+    assert text == "arcade games"
+    assert filters == {"publisher": ["Atari"], "genre": ["Arcade", "puzzles"], "esrb": ["E 10+"]}
+    assert parse_filters("no filters here") == ("no filters here", {})
+
+
+def test_filters_and_counts_match_brute_force():
+    documents, meta = _collection()
+    doc_ids = [d["doc_id"] for d in documents]
+    facet_index = build_facet_index(meta, doc_ids)
+    assert set(facet_index["fields"]["esrb"]) == {"e", "e 10+"}
+
+    rng = random.Random(6)
+    for _ in range(100):
+        filters = {}
+        if rng.random() < 0.7:
+            filters["publisher"] = rng.sample(PUBLISHERS + ["atari", "Nobody"], rng.randint(1, 2))
+        if rng.random() < 0.7:
+            filters["genre"] = rng.sample(GENRES, rng.randint(1, 2))
+        if rng.random() < 0.5:
+            filters["esrb"] = [rng.choice(["E", "e 10+"])]
+        if not filters:
+            continue
+
+        allowed = filter_bitset(facet_index, filters)
+        expected = _brute_filter(meta, doc_ids, filters)
+        assert {doc_ids[d] for d in allowed} == expected
+        assert {d for d in doc_ids if d in DocFilter(facet_index, allowed)} == expected
+
+        counts = facet_counts(facet_index, expected)
+        for field, values in counts.items():
+            for value, count in values:
+                assert count == len(_brute_filter(meta, expected, {field: [value]}))
+            assert [c for _, c in values] == sorted((c for _, c in values), reverse=True)
+
+    assert filter_bitset(facet_index, {}) is None
+
+
+def test_quoted_genre_list_needs_every_genre():
+    documents, meta = _collection()
+    doc_ids = [d["doc_id"] for d in documents]
+    facet_index = build_facet_index(meta, doc_ids)
+
+    _, filters = parse_filters('w1 genre:"Action, Arcade"')
+    both = filter_bitset(facet_index, filters)
+    expected = _brute_filter(meta, doc_ids, {"genre": ["Action"]}) & _brute_filter(meta, doc_ids, {"genre": ["Arcade"]})
+    assert expected and {doc_ids[d] for d in both} == expected
+    assert list(both) == list(filter_bitset(facet_index, {"genre": ["Action"]}) &
+                              filter_bitset(facet_index, {"genre": ["Arcade"]}))
+
+    # Still an alternative to the field's other values
+    either = filter_bitset(facet_index, {"genre": ["arcade, action", "Racing"]})
+    assert {doc_ids[d] for d in either} == expected | _brute_filter(meta, doc_ids, {"genre": ["Racing"]})
+    assert not filter_bitset(facet_index, {"genre": [", "]})
+    assert facet_counts(facet_index, ["doc1.html", "doc2.html"], top=1)["publisher"][0][1] >= 1
+
+
+def test_filtered_ranking_equals_post_filtering():
+    documents, meta = _collection()
+    index, doc_lengths = build_inverted_index_bm25(documents)
+    idf = compute_idf(index, len(documents), smooth=True)
+    avg_dl = compute_avg_doc_length(doc_lengths)
+    facet_index = build_facet_index(meta, doc_lengths)
+    maxscore_index = build_maxscore_index(index, idf, doc_lengths, avg_dl)
+
+    for filters in ({"publisher": ["Atari"]}, {"genre": ["Arcade", "Racing"], "esrb": ["E"]},
+                    {"publisher": ["Nobody"]}):
+        allowed = filter_bitset(facet_index, filters)
+        doc_filter = DocFilter(facet_index, allowed)
+        for query in (["w0", "w3"], ["w5", "w5", "w1"], ["missing"]):
+            full = rank_documents_bm25(query, index, idf, doc_lengths, avg_dl)
+            assert rank_documents_bm25(query, index, idf, doc_lengths, avg_dl, allowed=doc_filter) == \
+                [(d, s) for d, s in full if d in doc_filter]
+            full = rank_documents(query, index, idf)
+            assert rank_documents(query, index, idf, allowed=doc_filter) == [(d, s) for d, s in full if d in doc_filter]
+
+        tree = parse_query("w0 OR w3", PREPROCESSING)
+        full = rank_documents_boolean(tree, maxscore_index)
+        assert rank_documents_boolean(tree, maxscore_index, allowed=allowed) == \
+            [(d, s) for d, s in full if d in doc_filter]
+
+
+def test_collection_metadata():
+    meta = load_metadata(CSV)
+    facet_index = build_facet_index(meta, meta)
+    atari = filter_bitset(facet_index, {"publisher": ["atari"]})
+    assert {facet_index["doc_ids"][d] for d in atari} == {d for d, m in meta.items() if m["publisher"] == "Atari"}
+    assert len(atari) > 0
+
+    counts = facet_counts(facet_index, meta)
+    assert sum(c for _, c in counts["esrb"]) == sum(1 for m in meta.values() if m["esrb"] != "nan")
+
+
+if __name__ == "__main__":
+    test_bitset_matches_sets()
+    test_parse_filters()
+    test_filters_and_counts_match_brute_force()
+    test_quoted_genre_list_needs_every_genre()
+    test_filtered_ranking_equals_post_filtering()
+    test_collection_metadata()
+    print("Facet tests passed")
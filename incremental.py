@@ -0,0 +1,298 @@
+import hashlib
+import json
+from collections import Counter
+from pathlib import Path
+
+from parser import parse_html_file
+from tokeniser import process_text
+from ranker import compute_idf
+from index_store import BASE_DIR, DATA_DIR, INDEX_PATH, FIELDS, preprocessing_config, collection_fingerprint, \
+    write_index
+
+# -------------------------------
+# INCREMENTAL INDEXING
+# -------------------------------
+#
+# Keeps a manifest of every .html file (size, mtime, content hash) and each document's
+# per-field term counts. update() re-parses only new and changed files and patches the
+# postings, doc lengths, avg_dl and IDF in place; deleted files have their postings
+# removed. Postings and doc lengths are kept in parse_collection's file order, so the
+# result equals (ties included) the index a full rebuild would produce.
+#
+# Every term's IDF depends on the number of documents, so IDF is recomputed for the whole
+# vocabulary when that number changes - a pass over the term dictionary, not the postings.
+
+STATE_PATH = BASE_DIR / "data" / "videogames.state.json"
+
+
+def file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Compares a directory with a manifest (file name -> [size, mtime_ns, sha1]). use_hash also
+# re-hashes files whose size and mtime look unchanged (catches edits that preserve both)
+def scan_changes(directory, manifest, use_hash=False):
+    changes = {"added": [], "modified": [], "deleted": [], "touched": []}
+    current = {file.name: file for file in Path(directory).glob("*.html")}
+
+    for name, file in current.items():
+        stat = file.stat()
+        entry = manifest.get(name)
+        if entry is None:
+            changes["added"].append(name)
+        elif entry[:2] != [stat.st_size, stat.st_mtime_ns] or use_hash:
+            # Only a different hash means the content changed
+            if file_sha1(file) != entry[2]:
+                changes["modified"].append(name)
+            elif entry[:2] != [stat.st_size, stat.st_mtime_ns]:
+                changes["touched"].append(name)
+
+    changes["deleted"] = [name for name in manifest if name not in current]
+    return changes
+
+
+# Manifest entry for one file
+def file_entry(path):
+    stat = Path(path).stat()
+    return [stat.st_size, stat.st_mtime_ns, file_sha1(path)]
+
+
+class IncrementalIndex:
+    def __init__(self, directory=DATA_DIR, preprocessing=None, fields=FIELDS):
+        self.directory = Path(directory)
+        self.preprocessing = preprocessing_config(preprocessing)
+        self.fields = tuple(fields)
+
+        # file name (= doc_id) -> [size, mtime_ns, sha1]
+        self.manifest = {}
+        self.titles = {}
+        # field -> doc_id -> Counter of terms
+        self.term_counts = {field: {} for field in self.fields}
+        # field -> term -> {doc_id: tf}, doc_id -> length, and the running length total
+        self.index = {field: {} for field in self.fields}
+        self.doc_lengths = {field: {} for field in self.fields}
+        self.total_lengths = {field: 0 for field in self.fields}
+        self.idf = {field: {} for field in self.fields}
+        # Increases whenever update() changes the index (e.g. for query_cache.QueryCache)
+        self.version = 0
+
+    @property
+    def num_docs(self):
+        return len(self.manifest)
+
+    # Compares the directory with the manifest (see scan_changes)
+    def scan(self, use_hash=False):
+        return scan_changes(self.directory, self.manifest, use_hash)
+
+    # Applies the changes found by scan(); returns them
+    def update(self, use_hash=False):
+        if not self.directory.exists():
+            print(f"[ERROR] Directory not found: {self.directory}")
+            return {"added": [], "modified": [], "deleted": [], "touched": []}
+
+        changes = self.scan(use_hash)
+        num_docs = self.num_docs
+        touched_terms = {field: set() for field in self.fields}
+
+        for name in changes["deleted"] + changes["modified"]:
+            self._remove(name, touched_terms)
+
+        for name in changes["added"] + changes["modified"]:
+            self._add(name, touched_terms)
+
+        for name in changes["touched"]:
+            stat = (self.directory / name).stat()
+            self.manifest[name][:2] = [stat.st_size, stat.st_mtime_ns]
+
+        if changes["added"] or changes["modified"] or changes["deleted"]:
+            self._restore_order(touched_terms, set(changes["added"] + changes["modified"]))
+            for field in self.fields:
+                self._refresh_idf(field, touched_terms[field], self.num_docs != num_docs)
+            self.version += 1
+
+        return changes
+
+    def _add(self, name, touched_terms):
+        file = self.directory / name
+        doc = parse_html_file(file)
+        self.manifest[name] = file_entry(file)
+        self.titles[name] = doc["title"]
+
+        for field in self.fields:
+            counts = Counter(process_text(doc[field], **self.preprocessing))
+            self.term_counts[field][name] = counts
+            length = sum(counts.values())
+            self.doc_lengths[field][name] = length
+            self.total_lengths[field] += length
+
+            index = self.index[field]
+            for term, tf in counts.items():
+                index.setdefault(term, {})[name] = tf
+                touched_terms[field].add(term)
+
+    def _remove(self, name, touched_terms):
+        del self.manifest[name]
+        del self.titles[name]
+
+        for field in self.fields:
+            counts = self.term_counts[field].pop(name)
+            self.total_lengths[field] -= self.doc_lengths[field].pop(name)
+
+            index = self.index[field]
+            for term in counts:
+                postings = index[term]
+                del postings[name]
+                if not postings:
+                    del index[term]
+                touched_terms[field].add(term)
+
+    # Re-sorts doc lengths and the touched postings into collection (file) order, which is
+    # what build_inverted_index_bm25 over parse_collection produces and what ties break on
+    def _restore_order(self, touched_terms, changed):
+        order = {file.name: i for i, file in enumerate(self.directory.glob("*.html"))}
+        previous = list(self.titles)
+        reordered = sorted(previous, key=order.__getitem__)
+
+        # Untouched documents only move if the directory listing itself changed order
+        unchanged = [name for name in previous if name not in changed]
+        if [name for name in reordered if name not in changed] != unchanged:
+            for field in self.fields:
+                touched_terms[field].update(self.index[field])
+
+        self.manifest = {name: self.manifest[name] for name in reordered}
+        self.titles = {name: self.titles[name] for name in reordered}
+
+        for field in self.fields:
+            lengths = self.doc_lengths[field]
+            self.doc_lengths[field] = {name: lengths[name] for name in reordered}
+            self.term_counts[field] = {name: self.term_counts[field][name] for name in reordered}
+
+            index = self.index[field]
+            for term in touched_terms[field]:
+                postings = index.get(term)
+                if postings and len(postings) > 1:
+                    index[term] = dict(sorted(postings.items(), key=lambda item: order[item[0]]))
+
+    def _refresh_idf(self, field, touched_terms, num_docs_changed):
+        index, idf = self.index[field], self.idf[field]
+        if num_docs_changed:
+            self.idf[field] = compute_idf(index, self.num_docs, smooth=True)
+            return
+
+        for term in touched_terms:
+            if term in index:
+                idf.update(compute_idf({term: index[term]}, self.num_docs, smooth=True))
+            else:
+                idf.pop(term, None)
+
+    # The inputs rank_documents_bm25 and friends take for one field
+    def field_stats(self, field="body"):
+        num_docs = self.num_docs
+        return {
+            "index": self.index[field],
+            "doc_lengths": self.doc_lengths[field],
+            "avg_dl": self.total_lengths[field] / num_docs if num_docs else 0.0,
+            "idf": self.idf[field]
+        }
+
+    # Tokenised documents in collection order, as index_store.write_index expects.
+    # Counter.elements() keeps first-occurrence order, so terms are numbered as in a full build
+    def documents(self):
+        docs = []
+        for name, title in self.titles.items():
+            doc = {"doc_id": name, "title": title}
+            for field in self.fields:
+                doc[f"{field}_tokens"] = list(self.term_counts[field][name].elements())
+            docs.append(doc)
+        return docs
+
+    # Rewrites the on-disk index that main.py opens, without re-parsing anything
+    def write(self, path=INDEX_PATH):
+        return write_index(path, self.documents(), self.preprocessing, collection_fingerprint(self.directory))
+
+    def save(self, path=STATE_PATH):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        state = {
+            "directory": str(self.directory),
+            "preprocessing": self.preprocessing,
+            "fields": list(self.fields),
+            "manifest": self.manifest,
+            "titles": self.titles,
+            "term_counts": self.term_counts
+        }
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        tmp_path.replace(path)
+        return path
+
+    # Restores a saved state; postings are rebuilt from the term counts, nothing is re-parsed.
+    # Returns None when the state is missing or was built with other settings
+    @classmethod
+    def load(cls, path=STATE_PATH, directory=DATA_DIR, preprocessing=None):
+        path = Path(path)
+        if not path.exists():
+            return None
+
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+
+        self = cls(directory, preprocessing, state["fields"])
+        if state["preprocessing"] != self.preprocessing or Path(state["directory"]) != self.directory:
+            print(f"[WARN] {path} was built with other settings; ignoring it")
+            return None
+
+        self.manifest = state["manifest"]
+        self.titles = state["titles"]
+        for field in self.fields:
+            for name, counts in state["term_counts"][field].items():
+                counts = Counter(counts)
+                self.term_counts[field][name] = counts
+                length = sum(counts.values())
+                self.doc_lengths[field][name] = length
+                self.total_lengths[field] += length
+                for term, tf in counts.items():
+                    self.index[field].setdefault(term, {})[name] = tf
+            self.idf[field] = compute_idf(self.index[field], self.num_docs, smooth=True)
+
+        return self
+
+
+if __name__ == "__main__":
+    import argparse
+    from index_store import DEFAULT_PREPROCESSING
+    from tokeniser import TOKENIZERS
+
+    arg_parser = argparse.ArgumentParser(description="Update the index for new, changed and deleted pages")
+    arg_parser.add_argument("--data", default=DATA_DIR, help="directory of .html documents")
+    arg_parser.add_argument("--output", default=INDEX_PATH, help="index file to rewrite")
+    arg_parser.add_argument("--state", default=STATE_PATH, help="manifest and term counts from the last run")
+    arg_parser.add_argument("--hash", action="store_true", help="re-hash every file instead of trusting mtimes")
+    arg_parser.add_argument("--no-stopwords", action="store_true")
+    arg_parser.add_argument("--no-stemming", action="store_true")
+    arg_parser.add_argument("--no-lemmatization", action="store_true")
+    arg_parser.add_argument("--tokenizer", choices=TOKENIZERS, default=DEFAULT_PREPROCESSING["tokenizer"])
+    args = arg_parser.parse_args()
+
+    preprocessing = {
+        "use_stopwords": not args.no_stopwords,
+        "use_stemming": not args.no_stemming,
+        "use_lemmatization": not args.no_lemmatization,
+        "tokenizer": args.tokenizer
+    }
+    incremental = IncrementalIndex.load(args.state, args.data, preprocessing)
+    if incremental is None:
+        print(f"[INFO] No usable state at {args.state}, indexing every page")
+        incremental = IncrementalIndex(args.data, preprocessing)
+
+    changes = incremental.update(use_hash=args.hash)
+    print(f"Added: {len(changes['added'])}, modified: {len(changes['modified'])}, "
+          f"deleted: {len(changes['deleted'])}, documents: {incremental.num_docs}")
+
+    incremental.save(args.state)
+    print(f"Wrote index to: {incremental.write(args.output)}")
@@ -0,0 +1,116 @@
+import os
+import tempfile
+from pathlib import Path
+
+from incremental import IncrementalIndex
+from parser import parse_collection
+from tokeniser import process_text
+from indexer import build_inverted_index_bm25
+from ranker import compute_idf, compute_avg_doc_length, rank_documents_bm25
+
+# Runs without NLTK data: regex tokenizer, no stopword list, no WordNet
+PREPROCESSING = {"use_stopwords": False, "use_stemming": True, "use_lemmatization": False, "tokenizer": "regex"}
+
+PAGES = {
+    "a.html": "<html><head><title>Tony Hawk's Downhill Jam</title></head><body>downhill jam skate game</body></html>",
+    "b.html": "<html><head><title>London Taxi</title></head><body>taxi rush hour driving game</body></html>",
+    "c.html": "<html><head><title>Arcade Classics</title></head><body>arcade game game atari</body></html>",
+}
+
+QUERIES = [["jam", "game"], ["taxi"], ["arcad", "atari", "game"], ["puzzl"]]
+
+
+def _write(directory, name, html, mtime_offset=0):
+    path = Path(directory) / name
+    path.write_text(html, encoding="utf-8")
+    # Move the mtime on so rewrites within one clock tick are still noticed
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + mtime_offset))
+
+
+def _full_rebuild(directory, field="body"):
+    docs = parse_collection(directory)
+    streams = [{"doc_id": d["doc_id"], "tokens": process_text(d[field], **PREPROCESSING)} for d in docs]
+    index, doc_lengths = build_inverted_index_bm25(streams)
+    return {
+        "index": dict(index),
+        "doc_lengths": doc_lengths,
+        "avg_dl": compute_avg_doc_length(doc_lengths),
+        "idf": compute_idf(index, len(docs), smooth=True)
+    }
+
+
+def _assert_same_as_rebuild(incremental):
+    for field in ("title", "body"):
+        expected = _full_rebuild(incremental.directory, field)
+        actual = incremental.field_stats(field)
+
+        assert actual["index"] == expected["index"]
+        assert actual["idf"] == expected["idf"]
+        assert actual["avg_dl"] == expected["avg_dl"]
+        assert list(actual["doc_lengths"].items()) == list(expected["doc_lengths"].items())
+        # Postings order decides ties, so it has to match too
+        assert all(list(actual["index"][t]) == list(p) for t, p in expected["index"].items())
+
+        for query in QUERIES:
+            assert rank_documents_bm25(query, actual["index"], actual["idf"], actual["doc_lengths"],
+                                       actual["avg_dl"]) == \
+                rank_documents_bm25(query, expected["index"], expected["idf"], expected["doc_lengths"],
+                                    expected["avg_dl"])
+
+
+def test_updates_match_full_rebuild():
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, html in PAGES.items():
+            _write(tmp, name, html)
+
+        incremental = IncrementalIndex(tmp, PREPROCESSING)
+        changes = incremental.update()
+        assert sorted(changes["added"]) == sorted(PAGES)
+        _assert_same_as_rebuild(incremental)
+
+        # add, modify and delete in one round
+        _write(tmp, "d.html", "<title>Puzzle Quest</title><p>puzzle game with taxi jam</p>")
+        _write(tmp, "a.html", PAGES["a.html"].replace("skate", "puzzle skate"), mtime_offset=10 ** 9)
+        (Path(tmp) / "b.html").unlink()
+
+        changes = incremental.update()
+        assert (changes["added"], changes["modified"], changes["deleted"]) == (["d.html"], ["a.html"], ["b.html"])
+        _assert_same_as_rebuild(incremental)
+
+        assert incremental.update() == {"added": [], "modified": [], "deleted": [], "touched": []}
+
+
+def test_touched_file_is_not_reparsed():
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, html in PAGES.items():
+            _write(tmp, name, html)
+        incremental = IncrementalIndex(tmp, PREPROCESSING)
+        incremental.update()
+
+        _write(tmp, "c.html", PAGES["c.html"], mtime_offset=10 ** 9)
+        changes = incremental.update()
+        assert changes["touched"] == ["c.html"]
+        assert changes["modified"] == []
+
+
+def test_state_round_trips_through_disk():
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, html in PAGES.items():
+            _write(tmp, name, html)
+        incremental = IncrementalIndex(tmp, PREPROCESSING)
+        incremental.update()
+
+        state = incremental.save(Path(tmp) / "state.json")
+        restored = IncrementalIndex.load(state, tmp, PREPROCESSING)
+        for field in ("title", "body"):
+            assert restored.field_stats(field) == incremental.field_stats(field)
+        assert restored.documents() == incremental.documents()
+        assert IncrementalIndex.load(state, tmp, dict(PREPROCESSING, use_stemming=False)) is None
+
+
+if __name__ == "__main__":
+    test_updates_match_full_rebuild()
+    test_touched_file_is_not_reparsed()
+    test_state_round_trips_through_disk()
+    print("Incremental tests passed")
@@ -0,0 +1,460 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Mapping
+from datetime import datetime
+from pathlib import Path
+
+from parser import iter_collection
+from tokeniser import TOKENIZERS, process_text, load_cache, save_cache, cache_info
+from indexer import build_field_indexes_streaming
+from ranker import compute_idf_from_df, compute_avg_doc_length, compute_max_scores
+
+# -------------------------------
+# ON-DISK INDEX FORMAT
+# -------------------------------
+#
+# magic (8 bytes) | version (uint32) | header length (uint32) | JSON header | padding | data
+#
+# The JSON header holds the preprocessing config, the collection fingerprint, doc ids,
+# titles and each field's term dictionary. The data region holds fixed-width arrays
+# (doc lengths, postings offsets, idf, per-term maximum BM25 scores, postings doc
+# numbers and term frequencies) which are read straight out of a memory map.
+#
+# Version 2 added the maximum BM25 scores used by ranker.rank_documents_bm25_maxscore.
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DATA_DIR = BASE_DIR / "data" / "Videogames"
+INDEX_PATH = BASE_DIR / "data" / "videogames.idx"
+TERM_CACHE_PATH = BASE_DIR / "data" / "term_cache.json"
+
+FORMAT_MAGIC = b"VGSEIDX\x00"
+FORMAT_VERSION = 2
+FIELDS = ("title", "body")
+
+# Parameters the stored maximum scores are computed for (the rankers' defaults)
+BM25_PARAMS = {"k1": 1.5, "b": 0.75}
+
+# Mirrors the defaults of tokeniser.process_text
+DEFAULT_PREPROCESSING = {
+    "use_stopwords": True,
+    "use_stemming": True,
+    "use_lemmatization": True,
+    "lemmatize_with_pos": True,
+    "tokenizer": "nltk"
+}
+
+_PREAMBLE = struct.Struct("<8sII")
+_ALIGN = 8
+
+
+class IndexMismatchError(Exception):
+    # Raised when an index file is stale, corrupt or built with different settings
+    pass
+
+
+# Fills in the process_text defaults so two configs can be compared field by field
+def preprocessing_config(preprocessing=None):
+    config = dict(DEFAULT_PREPROCESSING)
+    config.update(preprocessing or {})
+    return config
+
+
+# Cheap fingerprint of the collection: names, sizes and modification times
+def collection_fingerprint(directory):
+    digest = hashlib.sha1()
+    for file in sorted(Path(directory).glob("*.html")):
+        stat = file.stat()
+        digest.update(f"{file.name}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _pad(size):
+    return (-size) % _ALIGN
+
+
+# Serialises one field (title or body), as built by build_field_indexes_streaming,
+# into its header entry and data arrays
+def _field_arrays(field, num_docs):
+    index, lengths = field["index"], field["doc_lengths"]
+    idf = compute_idf_from_df({term: len(postings) for term, postings in index.items()}, num_docs, smooth=True)
+
+    terms = list(index)
+    offsets = array("Q", [0])
+    docs = array("I")
+    tfs = array("I")
+    for term in terms:
+        docs.extend(index[term].doc_ids)
+        tfs.extend(index[term].tfs)
+        offsets.append(len(docs))
+
+    avg_dl = compute_avg_doc_length(lengths) if num_docs else 0.0
+    max_scores = compute_max_scores({term: index[term].decode() for term in terms}, idf, lengths, avg_dl,
+                                    **BM25_PARAMS)
+
+    header = {
+        "avg_dl": avg_dl,
+        "terms": terms
+    }
+    arrays = {
+        "lengths": lengths,
+        "offsets": offsets,
+        "idf": array("d", (idf[term] for term in terms)),
+        "max_scores": array("d", (max_scores[term] for term in terms)),
+        "docs": docs,
+        "tfs": tfs
+    }
+    return header, arrays
+
+
+# Writes a tokenised collection (documents with doc_id, title, title_tokens and body_tokens,
+# in any iterable, read once) to disk
+def write_index(path, documents, preprocessing=None, fingerprint=None):
+    return write_built_index(path, build_field_indexes_streaming(documents, FIELDS), preprocessing, fingerprint)
+
+
+# Writes the output of indexer.build_field_indexes_streaming to disk
+def write_built_index(path, built, preprocessing=None, fingerprint=None):
+    path = Path(path)
+    num_docs = len(built["doc_ids"])
+    header = {
+        "preprocessing": preprocessing_config(preprocessing),
+        "fingerprint": fingerprint,
+        "built_at": datetime.now().isoformat(timespec="seconds"),
+        "byteorder": sys.byteorder,
+        "bm25": BM25_PARAMS,
+        "num_docs": num_docs,
+        "doc_ids": list(built["doc_ids"]),
+        "titles": list(built["titles"]),
+        "fields": {}
+    }
+
+    # Lay the arrays out back to back, each aligned for zero-copy casts
+    sections = []
+    position = 0
+    for field in FIELDS:
+        field_header, arrays = _field_arrays(built["fields"][field], num_docs)
+        field_header["sections"] = {}
+        for name, values in arrays.items():
+            field_header["sections"][name] = [position, values.typecode, len(values)]
+            sections.append(values)
+            nbytes = len(values) * values.itemsize
+            position += nbytes + _pad(nbytes)
+        header["fields"][field] = field_header
+
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    data_start = _PREAMBLE.size + len(header_bytes)
+    data_start += _pad(data_start)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(_PREAMBLE.pack(FORMAT_MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b"\0" * (data_start - f.tell()))
+        for values in sections:
+            raw = values.tobytes()
+            f.write(raw)
+            f.write(b"\0" * _pad(len(raw)))
+
+    # Readers never see a half-written file
+    os.replace(tmp_path, path)
+    return path
+
+
+# -------------------------------
+# MEMORY-MAPPED READERS
+# -------------------------------
+
+# term -> {doc_id: tf}, decoded from the mapped arrays on lookup
+class MappedPostings(Mapping):
+    def __init__(self, terms, offsets, docs, tfs, doc_ids):
+        self._term_numbers = {term: i for i, term in enumerate(terms)}
+        self._offsets = offsets
+        self._docs = docs
+        self._tfs = tfs
+        self._doc_ids = doc_ids
+
+    def __getitem__(self, term):
+        docs, tfs = self.arrays(term)
+        doc_ids = self._doc_ids
+        return {doc_ids[d]: tf for d, tf in zip(docs, tfs)}
+
+    # Zero-copy (doc numbers, term frequencies) slices of the mapped postings
+    def arrays(self, term):
+        i = self._term_numbers[term]
+        start, end = self._offsets[i], self._offsets[i + 1]
+        return self._docs[start:end], self._tfs[start:end]
+
+    def __contains__(self, term):
+        return term in self._term_numbers
+
+    def __iter__(self):
+        return iter(self._term_numbers)
+
+    def __len__(self):
+        return len(self._term_numbers)
+
+
+# term -> (doc numbers, tfs), the postings layout the MaxScore ranker walks
+class MappedPostingArrays(Mapping):
+    def __init__(self, postings):
+        self._postings = postings
+
+    def __getitem__(self, term):
+        return self._postings.arrays(term)
+
+    def __contains__(self, term):
+        return term in self._postings
+
+    def __iter__(self):
+        return iter(self._postings)
+
+    def __len__(self):
+        return len(self._postings)
+
+
+# term -> {doc_id: [tf per field]}, the layout of indexer.build_multifield_index that
+# ranker.rank_documents_bm25f walks, merged from the fields' mapped postings on lookup
+class MappedMultiFieldPostings(Mapping):
+    def __init__(self, field_postings, doc_ids):
+        self._fields = field_postings
+        self._terms = dict.fromkeys(term for postings in field_postings for term in postings)
+        self._doc_ids = doc_ids
+
+    def __getitem__(self, term):
+        if term not in self._terms:
+            raise KeyError(term)
+        merged = {}
+        for f, postings in enumerate(self._fields):
+            if term not in postings:
+                continue
+            for d, tf in zip(*postings.arrays(term)):
+                tfs = merged.get(d)
+                if tfs is None:
+                    tfs = merged[d] = [0] * len(self._fields)
+                tfs[f] = tf
+        doc_ids = self._doc_ids
+        return {doc_ids[d]: merged[d] for d in sorted(merged)}
+
+    # Documents containing the term in any field
+    def doc_frequency(self, term):
+        if term not in self._terms:
+            raise KeyError(term)
+        return len(set().union(*(postings.arrays(term)[0] for postings in self._fields if term in postings)))
+
+    def __contains__(self, term):
+        return term in self._terms
+
+    def __iter__(self):
+        return iter(self._terms)
+
+    def __len__(self):
+        return len(self._terms)
+
+
+# Smoothed idf over the any-field document frequency (compute_idf of the multi-field
+# index), computed the first time each term is looked up
+class MultiFieldIdf(Mapping):
+    def __init__(self, postings, num_docs):
+        self._postings = postings
+        self._num_docs = num_docs
+        self._idf = {}
+
+    def __getitem__(self, term):
+        idf = self._idf.get(term)
+        if idf is None:
+            df = self._postings.doc_frequency(term)
+            idf = self._idf[term] = compute_idf_from_df({term: df}, self._num_docs, smooth=True)[term]
+        return idf
+
+    def __contains__(self, term):
+        return term in self._postings
+
+    def __iter__(self):
+        return iter(self._postings)
+
+    def __len__(self):
+        return len(self._postings)
+
+
+# key -> value over a mapped array (doc lengths by doc_id, idf by term)
+class MappedValues(Mapping):
+    def __init__(self, keys, values):
+        self._positions = {key: i for i, key in enumerate(keys)}
+        self._values = values
+
+    def __getitem__(self, key):
+        return self._values[self._positions[key]]
+
+    def __contains__(self, key):
+        return key in self._positions
+
+    def __iter__(self):
+        return iter(self._positions)
+
+    def __len__(self):
+        return len(self._positions)
+
+
+def _read_header(mm, path):
+    if len(mm) < _PREAMBLE.size:
+        raise IndexMismatchError(f"{path} is not an index file")
+
+    magic, version, header_len = _PREAMBLE.unpack_from(mm, 0)
+    if magic != FORMAT_MAGIC:
+        raise IndexMismatchError(f"{path} is not an index file")
+    if version != FORMAT_VERSION:
+        raise IndexMismatchError(f"{path} has format version {version}, expected {FORMAT_VERSION}")
+
+    header = json.loads(bytes(mm[_PREAMBLE.size:_PREAMBLE.size + header_len]).decode("utf-8"))
+    if header["byteorder"] != sys.byteorder:
+        raise IndexMismatchError(f"{path} was written on a {header['byteorder']}-endian machine")
+
+    data_start = _PREAMBLE.size + header_len
+    data_start += _pad(data_start)
+    return header, data_start
+
+
+# Opens an index file; raises IndexMismatchError instead of loading a stale or mismatched index
+def open_index(path=INDEX_PATH, preprocessing=None, directory=None):
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    header, data_start = _read_header(mm, path)
+
+    expected = preprocessing_config(preprocessing)
+    if header["preprocessing"] != expected:
+        raise IndexMismatchError(
+            f"{path} was built with preprocessing {header['preprocessing']}, expected {expected}"
+        )
+
+    # Only checked when the raw collection is available
+    if directory is not None and Path(directory).exists():
+        if header["fingerprint"] != collection_fingerprint(directory):
+            raise IndexMismatchError(f"{path} is stale: {directory} has changed since it was built")
+
+    view = memoryview(mm)
+
+    def section(spec):
+        offset, typecode, count = spec
+        start = data_start + offset
+        return view[start:start + count * array(typecode).itemsize].cast(typecode)
+
+    doc_ids = header["doc_ids"]
+    fields = {}
+    for field, field_header in header["fields"].items():
+        sections = field_header["sections"]
+        terms = field_header["terms"]
+        index = MappedPostings(terms, section(sections["offsets"]), section(sections["docs"]),
+                               section(sections["tfs"]), doc_ids)
+        lengths = section(sections["lengths"])
+        idf = MappedValues(terms, section(sections["idf"]))
+        fields[field] = {
+            "index": index,
+            "doc_lengths": MappedValues(doc_ids, lengths),
+            "avg_dl": field_header["avg_dl"],
+            "idf": idf,
+            # Same shape as ranker.build_maxscore_index, straight off the map
+            "maxscore_index": {
+                "doc_ids": doc_ids,
+                "doc_lengths": lengths,
+                "avg_dl": field_header["avg_dl"],
+                "postings": MappedPostingArrays(index),
+                "idf": idf,
+                "max_scores": MappedValues(terms, section(sections["max_scores"])),
+                "k1": header["bm25"]["k1"],
+                "b": header["bm25"]["b"]
+            }
+        }
+
+    multifield_index = MappedMultiFieldPostings([f["index"] for f in fields.values()], doc_ids)
+
+    return {
+        "num_docs": header["num_docs"],
+        "doc_titles": dict(zip(doc_ids, header["titles"])),
+        "preprocessing": header["preprocessing"],
+        "built_at": header["built_at"],
+        # Changes whenever the file is rebuilt (e.g. for query_cache.QueryCache)
+        "version": f"{header['built_at']}/{header['fingerprint']}",
+        "fields": fields,
+        # Every field in one postings map, for ranker.rank_documents_bm25f
+        "multifield": {
+            "index": multifield_index,
+            "idf": MultiFieldIdf(multifield_index, header["num_docs"]),
+            "field_lengths": {field: f["doc_lengths"] for field, f in fields.items()},
+            "field_avg_dl": {field: f["avg_dl"] for field, f in fields.items()}
+        }
+    }
+
+
+# -------------------------------
+# BUILD COMMAND
+# -------------------------------
+
+# Parses and tokenises the collection once and writes it as an index file
+def build_index(directory=DATA_DIR, path=INDEX_PATH, preprocessing=None, workers=1):
+    config = preprocessing_config(preprocessing)
+
+    # A saved stem/lemma cache lets a reindex start warm
+    load_cache(TERM_CACHE_PATH)
+    built = build_field_indexes_streaming(stream_documents(directory, config, workers), FIELDS)
+    save_cache(TERM_CACHE_PATH)
+
+    info = cache_info()
+    print(f"Term cache: {info['size']} entries, hit rate {info['hit_rate']:.1%}")
+
+    return write_built_index(path, built, config, collection_fingerprint(directory))
+
+
+# Parsed and tokenised pages one at a time; each page's text is released once it is tokenised,
+# so building from this stream keeps only the index and the titles in memory
+def stream_documents(directory=DATA_DIR, preprocessing=None, workers=1):
+    config = preprocessing_config(preprocessing)
+    for doc in iter_collection(directory, workers=workers):
+        yield {
+            "doc_id": doc["doc_id"],
+            "title": doc["title"],
+            "title_tokens": process_text(doc["title"], **config),
+            "body_tokens": process_text(doc["body"], **config)
+        }
+
+
+# Opens the index, rebuilding it first if it is missing, stale or mismatched
+def open_or_build_index(path=INDEX_PATH, directory=DATA_DIR, preprocessing=None):
+    try:
+        return open_index(path, preprocessing, directory)
+    except FileNotFoundError:
+        print(f"[INFO] No index at {path}, building it")
+    except IndexMismatchError as e:
+        print(f"[WARN] {e}; rebuilding")
+
+    build_index(directory, path, preprocessing)
+    return open_index(path, preprocessing, directory)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Build the on-disk search index")
+    arg_parser.add_argument("--data", default=DATA_DIR, help="directory of .html documents")
+    arg_parser.add_argument("--output", default=INDEX_PATH, help="index file to write")
+    arg_parser.add_argument("--no-stopwords", action="store_true")
+    arg_parser.add_argument("--no-stemming", action="store_true")
+    arg_parser.add_argument("--no-lemmatization", action="store_true")
+    arg_parser.add_argument("--tokenizer", choices=TOKENIZERS, default="nltk")
+    arg_parser.add_argument("--workers", type=int, default=None,
+                            help="parser processes (default: one per CPU, 1 = serial)")
+    args = arg_parser.parse_args()
+
+    written = build_index(args.data, args.output, {
+        "use_stopwords": not args.no_stopwords,
+        "use_stemming": not args.no_stemming,
+        "use_lemmatization": not args.no_lemmatization,
+        "tokenizer": args.tokenizer
+    }, workers=args.workers)
+    print(f"Wrote index to: {written}")
@@ -0,0 +1,169 @@
+import os
+import struct
+import tempfile
+from pathlib import Path
+
+from indexer import build_inverted_index_bm25, build_multifield_index
+from ranker import (
+    compute_idf,
+    compute_avg_doc_length,
+    rank_documents_bm25,
+    rank_documents_bm25_maxscore,
+    rank_documents_bm25f
+)
+from index_store import (
+    FORMAT_MAGIC,
+    FORMAT_VERSION,
+    IndexMismatchError,
+    write_index,
+    open_index,
+    build_index,
+    open_or_build_index,
+    collection_fingerprint
+)
+
+PREPROCESSING = {"use_stopwords": False, "use_stemming": True, "use_lemmatization": False, "tokenizer": "regex"}
+
+PAGES = {
+    "a.html": "<html><head><title>Tony Hawk's Downhill Jam</title></head><body>downhill jam skate game</body></html>",
+    "b.html": "<html><head><title>London Taxi</title></head><body>taxi rush hour driving game game</body></html>",
+    "c.html": "<html><head><title>Arcade Classics</title></head><body>arcade game atari arcade</body></html>"
+}
+
+DOCUMENTS = [
+    {"doc_id": "a.html", "title": "Jam", "title_tokens": ["jam"], "body_tokens": ["jam", "skate", "game", "jam"]},
+    {"doc_id": "b.html", "title": "Taxi", "title_tokens": ["taxi", "rush"], "body_tokens": ["taxi", "game"]},
+    {"doc_id": "c.html", "title": "Empty", "title_tokens": [], "body_tokens": []},
+    {"doc_id": "d.html", "title": "Arcade", "title_tokens": ["arcad"], "body_tokens": ["arcad", "game", "atari"]}
+]
+
+
+def _write_pages(directory, pages):
+    for name, html in pages.items():
+        (Path(directory) / name).write_text(html, encoding="utf-8")
+
+
+def test_round_trip_equals_dict_index():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "test.idx")
+        write_index(path, DOCUMENTS, PREPROCESSING, fingerprint="abc")
+        store = open_index(path, PREPROCESSING)
+
+        assert store["num_docs"] == len(DOCUMENTS)
+        assert store["doc_titles"] == {d["doc_id"]: d["title"] for d in DOCUMENTS}
+        for field in ("title", "body"):
+            index, doc_lengths = build_inverted_index_bm25(
+                [{"doc_id": d["doc_id"], "tokens": d[f"{field}_tokens"]} for d in DOCUMENTS])
+            idf = compute_idf(index, len(DOCUMENTS), smooth=True)
+            avg_dl = compute_avg_doc_length(doc_lengths)
+            stored = store["fields"][field]
+
+            assert sorted(stored["index"]) == sorted(index)
+            for term, postings in index.items():
+                assert stored["index"][term] == postings
+                assert stored["idf"][term] == idf[term]
+            assert dict(stored["doc_lengths"]) == doc_lengths
+            assert stored["avg_dl"] == avg_dl
+
+            for query in (["game"], ["jam", "game", "jam"], ["taxi", "arcad"], ["missing"]):
+                expected = rank_documents_bm25(query, index, idf, doc_lengths, avg_dl)
+                assert rank_documents_bm25(query, stored["index"], stored["idf"], stored["doc_lengths"],
+                                           stored["avg_dl"]) == expected
+                assert rank_documents_bm25_maxscore(query, stored["maxscore_index"], k=2) == expected[:2]
+
+
+def test_multifield_view_equals_multifield_index():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "test.idx")
+        write_index(path, DOCUMENTS, PREPROCESSING)
+        multifield = open_index(path, PREPROCESSING)["multifield"]
+
+        index, field_lengths = build_multifield_index(DOCUMENTS)
+        idf = compute_idf(index, len(DOCUMENTS), smooth=True)
+        avg_dl = {field: compute_avg_doc_length(lengths) for field, lengths in field_lengths.items()}
+
+        assert sorted(multifield["index"]) == sorted(index)
+        for term, postings in index.items():
+            assert list(multifield["index"][term].items()) == list(postings.items())
+            assert multifield["idf"][term] == idf[term]
+        assert {f: dict(lengths) for f, lengths in multifield["field_lengths"].items()} == field_lengths
+        assert multifield["field_avg_dl"] == avg_dl
+
+        for query in (["game"], ["jam", "game", "jam"], ["taxi", "arcad", "rush"], ["missing"]):
+            for weights in ({"title": 2.0, "body": 1.0}, {"title": 0.0, "body": 1.0}):
+                assert rank_documents_bm25f(query, multifield["index"], multifield["idf"], multifield["field_lengths"],
+                                            multifield["field_avg_dl"], weights) == \
+                    rank_documents_bm25f(query, index, idf, field_lengths, avg_dl, weights)
+
+
+def test_mismatched_files_are_rejected():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "test.idx")
+        write_index(path, DOCUMENTS, PREPROCESSING)
+
+        for preprocessing in (dict(PREPROCESSING, use_stemming=False), None):
+            try:
+                open_index(path, preprocessing)
+                assert False, preprocessing
+            except IndexMismatchError:
+                pass
+
+        # An older (or newer) format version is refused rather than misread
+        with open(path, "r+b") as f:
+            f.write(struct.pack("<8sI", FORMAT_MAGIC, FORMAT_VERSION + 1))
+        try:
+            open_index(path, PREPROCESSING)
+            assert False
+        except IndexMismatchError as e:
+            assert f"version {FORMAT_VERSION + 1}" in str(e)
+
+        Path(path).write_bytes(b"not an index")
+        try:
+            open_index(path, PREPROCESSING)
+            assert False
+        except IndexMismatchError:
+            pass
+
+
+def test_stale_or_mismatched_index_is_rebuilt():
+    with tempfile.TemporaryDirectory() as data, tempfile.TemporaryDirectory() as tmp:
+        _write_pages(data, PAGES)
+        path = Path(tmp) / "videogames.idx"
+
+        store = open_or_build_index(path, data, PREPROCESSING)
+        assert store["num_docs"] == 3
+        assert open_index(path, PREPROCESSING, data)["built_at"] == store["built_at"]
+
+        # A new page changes the fingerprint: open_index refuses, open_or_build_index rebuilds
+        _write_pages(data, {"d.html": "<title>Puzzle Quest</title><p>puzzle game</p>"})
+        try:
+            open_index(path, PREPROCESSING, data)
+            assert False
+        except IndexMismatchError:
+            pass
+        store = open_or_build_index(path, data, PREPROCESSING)
+        assert store["num_docs"] == 4
+        assert "puzzl" in store["fields"]["body"]["index"]
+        assert store["version"].endswith(collection_fingerprint(data))
+
+        # Other preprocessing settings: rebuilt with those settings
+        unstemmed = dict(PREPROCESSING, use_stemming=False)
+        store = open_or_build_index(path, data, unstemmed)
+        assert store["preprocessing"]["use_stemming"] is False
+        assert "puzzle" in store["fields"]["body"]["index"]
+        assert set(store["fields"]["body"]["index"]["game"]) == {"a.html", "b.html", "c.html", "d.html"}
+
+        # Same as a fresh build from the pages
+        fresh = Path(tmp) / "fresh.idx"
+        build_index(data, fresh, unstemmed, workers=1)
+        expected = open_index(fresh, unstemmed, data)
+        assert dict(store["fields"]["body"]["doc_lengths"]) == dict(expected["fields"]["body"]["doc_lengths"])
+        assert sorted(store["fields"]["title"]["index"]) == sorted(expected["fields"]["title"]["index"])
+
+
+if __name__ == "__main__":
+    test_round_trip_equals_dict_index()
+    test_multifield_view_equals_multifield_index()
+    test_mismatched_files_are_rejected()
+    test_stale_or_mismatched_index_is_rebuilt()
+    print("Index store tests passed")
@@ -1,4 +1,7 @@
+from array import array
+from bisect import bisect_left
 from collections import Counter, defaultdict
+from itertools import accumulate
 
 def build_inverted_index(documents):
     inverted_index = {}
@@ -30,3 +33,377 @@ def build_inverted_index_bm25(documents):
             index[token][doc_id] = index[token].get(doc_id, 0) + 1
 
     return index, doc_lengths
+
+# One index over several fields: term -> {doc_id: [tf in each field]}, plus each field's
+# doc lengths. Documents carry one token list per field, e.g. doc["title_tokens"].
+def build_multifield_index(documents, fields=("title", "body")):
+    index = defaultdict(dict)
+    field_lengths = {field: {} for field in fields}
+
+    for doc in documents:
+        doc_id = doc["doc_id"]
+
+        for f, field in enumerate(fields):
+            tokens = doc.get(f"{field}_tokens", [])
+            field_lengths[field][doc_id] = len(tokens)
+
+            for token in tokens:
+                tfs = index[token].get(doc_id)
+                if tfs is None:
+                    tfs = index[token][doc_id] = [0] * len(fields)
+                tfs[f] += 1
+
+    return index, field_lengths
+
+# -------------------------------
+# COMPACT INDEX (integer doc IDs, array-backed postings)
+# -------------------------------
+
+# Maps filenames to dense integer doc IDs in collection order, and back
+def build_doc_dictionary(documents):
+    doc_names = [doc["doc_id"] for doc in documents]
+    doc_numbers = {name: i for i, name in enumerate(doc_names)}
+    return doc_names, doc_numbers
+
+# A postings list as parallel typed arrays of sorted doc IDs and term frequencies.
+# Reads like the {doc_id: tf} dicts of the dict index, so the rankers accept it as is.
+class Postings:
+    __slots__ = ("doc_ids", "tfs")
+
+    def __init__(self, doc_ids=None, tfs=None):
+        self.doc_ids = array("I") if doc_ids is None else doc_ids
+        self.tfs = array("I") if tfs is None else tfs
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def __iter__(self):
+        return iter(self.doc_ids)
+
+    def __contains__(self, doc_id):
+        i = bisect_left(self.doc_ids, doc_id)
+        return i < len(self.doc_ids) and self.doc_ids[i] == doc_id
+
+    def __getitem__(self, doc_id):
+        i = bisect_left(self.doc_ids, doc_id)
+        if i < len(self.doc_ids) and self.doc_ids[i] == doc_id:
+            return self.tfs[i]
+        raise KeyError(doc_id)
+
+    def get(self, doc_id, default=None):
+        try:
+            return self[doc_id]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return self.doc_ids
+
+    def values(self):
+        return self.tfs
+
+    def items(self):
+        return zip(self.doc_ids, self.tfs)
+
+    def decode(self):
+        return self.doc_ids, self.tfs
+
+    def __eq__(self, other):
+        if isinstance(other, Postings):
+            return self.doc_ids == other.doc_ids and self.tfs == other.tfs
+        return NotImplemented
+
+    def __repr__(self):
+        return f"Postings({dict(self.items())!r})"
+
+# -------------------------------
+# COMPRESSED POSTINGS
+# -------------------------------
+
+# Variable-byte code: 7 bits per byte, least significant group first, high bit marks the last byte
+def encode_varbyte(numbers, out):
+    for n in numbers:
+        while n >= 128:
+            out.append(n & 127)
+            n >>= 7
+        out.append(n | 128)
+    return out
+
+# Decodes count numbers starting at data[pos]; returns (numbers, position after them)
+def decode_varbyte(data, pos, count):
+    numbers = []
+    n = shift = 0
+    while len(numbers) < count:
+        byte = data[pos]
+        pos += 1
+        if byte & 128:
+            numbers.append(n | ((byte & 127) << shift))
+            n = shift = 0
+        else:
+            n |= byte << shift
+            shift += 7
+    return numbers, pos
+
+# A postings list stored as fixed-size blocks of delta-encoded doc IDs followed by their
+# term frequencies, all variable-byte coded. Each block's header (last doc ID and byte
+# offset) lets lookups skip straight to the one block that can hold a doc ID.
+# Reads like Postings / the {doc_id: tf} dicts, so the rankers accept it as is.
+class CompressedPostings:
+    __slots__ = ("count", "block_size", "block_last", "block_offsets", "data")
+
+    def __init__(self, doc_ids, tfs, block_size=128):
+        self.count = len(doc_ids)
+        self.block_size = block_size
+        self.block_last = array("I")
+        self.block_offsets = array("I")
+        data = bytearray()
+
+        previous = 0
+        for start in range(0, self.count, block_size):
+            block_docs = doc_ids[start:start + block_size]
+            self.block_offsets.append(len(data))
+            self.block_last.append(block_docs[-1])
+
+            gaps = []
+            for doc_id in block_docs:
+                gaps.append(doc_id - previous)
+                previous = doc_id
+            encode_varbyte(gaps, data)
+            encode_varbyte(tfs[start:start + block_size], data)
+
+        self.data = bytes(data)
+
+    def __len__(self):
+        return self.count
+
+    def _block_length(self, block):
+        return min(self.block_size, self.count - block * self.block_size)
+
+    # Doc IDs and tfs of one block; gaps restart from the previous block's last doc ID
+    def decode_block(self, block):
+        n = self._block_length(block)
+        gaps, pos = decode_varbyte(self.data, self.block_offsets[block], n)
+        tfs, _ = decode_varbyte(self.data, pos, n)
+
+        doc_id = self.block_last[block - 1] if block else 0
+        doc_ids = []
+        for gap in gaps:
+            doc_id += gap
+            doc_ids.append(doc_id)
+        return doc_ids, tfs
+
+    def items(self):
+        for block in range(len(self.block_last)):
+            doc_ids, tfs = self.decode_block(block)
+            yield from zip(doc_ids, tfs)
+
+    def __iter__(self):
+        for doc_id, _ in self.items():
+            yield doc_id
+
+    def keys(self):
+        return iter(self)
+
+    def values(self):
+        for _, tf in self.items():
+            yield tf
+
+    # Fully decoded (doc IDs, tfs) arrays
+    def decode(self):
+        doc_ids, tfs = array("I"), array("I")
+        for block in range(len(self.block_last)):
+            block_docs, block_tfs = self.decode_block(block)
+            doc_ids.extend(block_docs)
+            tfs.extend(block_tfs)
+        return doc_ids, tfs
+
+    # First (doc_id, tf) with doc_id >= target, or None; only one block is decoded
+    def next_geq(self, target):
+        block = bisect_left(self.block_last, target)
+        if block == len(self.block_last):
+            return None
+        doc_ids, tfs = self.decode_block(block)
+        i = bisect_left(doc_ids, target)
+        return doc_ids[i], tfs[i]
+
+    def __getitem__(self, doc_id):
+        found = self.next_geq(doc_id)
+        if found is None or found[0] != doc_id:
+            raise KeyError(doc_id)
+        return found[1]
+
+    def __contains__(self, doc_id):
+        found = self.next_geq(doc_id)
+        return found is not None and found[0] == doc_id
+
+    def get(self, doc_id, default=None):
+        try:
+            return self[doc_id]
+        except KeyError:
+            return default
+
+    def __eq__(self, other):
+        if isinstance(other, (Postings, CompressedPostings)):
+            return list(self.items()) == list(other.items())
+        return NotImplemented
+
+    def __repr__(self):
+        return f"CompressedPostings({dict(self.items())!r})"
+
+# Re-encodes every postings list of a compact index as CompressedPostings
+def compress_index(index, block_size=128):
+    return {term: CompressedPostings(p.doc_ids, p.tfs, block_size) for term, p in index.items()}
+
+# Same content as build_inverted_index_bm25, keyed by integer doc ID.
+# Returns (index, doc_lengths, doc_names): doc_lengths is an array indexed by doc ID and
+# doc_names maps IDs back to filenames (see resolve_doc_names).
+# compress=True stores the postings as CompressedPostings blocks.
+def build_compact_index_bm25(documents, compress=False, block_size=128):
+    index = {}
+    doc_lengths = array("I")
+    doc_names = []
+
+    for doc_id, doc in enumerate(documents):
+        tokens = doc["tokens"]
+        doc_names.append(doc["doc_id"])
+        doc_lengths.append(len(tokens))
+
+        for term, tf in Counter(tokens).items():
+            postings = index.get(term)
+            if postings is None:
+                postings = index[term] = Postings()
+
+            # Documents are added in ID order, so each postings list stays sorted
+            postings.doc_ids.append(doc_id)
+            postings.tfs.append(tf)
+
+    if compress:
+        index = compress_index(index, block_size)
+
+    return index, doc_lengths, doc_names
+
+# -------------------------------
+# STREAMING BUILD
+# -------------------------------
+
+# Append-only list of strings kept as one UTF-8 buffer plus offsets: a few bytes per entry
+# instead of a str object each, for doc ids and titles of very large collections
+class StringStore:
+    __slots__ = ("_data", "_offsets")
+
+    def __init__(self, strings=()):
+        self._data = bytearray()
+        self._offsets = array("Q", [0])
+        for string in strings:
+            self.append(string)
+
+    def append(self, string):
+        self._data += string.encode("utf-8")
+        self._offsets.append(len(self._data))
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if not -len(self) <= i < len(self):
+            raise IndexError(i)
+        i %= len(self)
+        return self._data[self._offsets[i]:self._offsets[i + 1]].decode("utf-8")
+
+    def __iter__(self):
+        data, offsets = self._data, self._offsets
+        for i in range(len(self)):
+            yield data[offsets[i]:offsets[i + 1]].decode("utf-8")
+
+# Compact postings (integer doc IDs, as build_compact_index_bm25) for several fields in one
+# pass over documents carrying doc_id, title and one token list per field. Each document
+# is dropped once added, so documents can be a generator and memory holds only the
+# postings, the doc lengths and a StringStore of doc ids and titles.
+# Terms and postings come out in the same order as build_inverted_index_bm25 would give.
+def build_field_indexes_streaming(documents, fields=("title", "body")):
+    indexes = {field: {} for field in fields}
+    lengths = {field: array("I") for field in fields}
+    doc_ids = StringStore()
+    titles = StringStore()
+
+    for doc_number, doc in enumerate(documents):
+        doc_ids.append(doc["doc_id"])
+        titles.append(doc["title"])
+
+        for field in fields:
+            tokens = doc.get(f"{field}_tokens", [])
+            lengths[field].append(len(tokens))
+            index = indexes[field]
+
+            for term, tf in Counter(tokens).items():
+                postings = index.get(term)
+                if postings is None:
+                    postings = index[term] = Postings()
+                postings.doc_ids.append(doc_number)
+                postings.tfs.append(tf)
+
+    return {
+        "doc_ids": doc_ids,
+        "titles": titles,
+        "fields": {field: {"index": indexes[field], "doc_lengths": lengths[field]} for field in fields}
+    }
+
+# -------------------------------
+# POSITIONAL INDEX
+# -------------------------------
+
+# Where a term occurs in each document: sorted doc IDs, term frequencies, and every
+# document's token positions as variable-byte gaps (the first one absolute) in one buffer
+class PositionalPostings:
+    __slots__ = ("doc_ids", "tfs", "offsets", "data")
+
+    def __init__(self):
+        self.doc_ids = array("I")
+        self.tfs = array("I")
+        self.offsets = array("I", [0])
+        self.data = bytearray()
+
+    # Documents must be added in increasing doc ID order, positions in increasing order
+    def add(self, doc_id, positions):
+        self.doc_ids.append(doc_id)
+        self.tfs.append(len(positions))
+        encode_varbyte([p - q for p, q in zip(positions, [0] + positions[:-1])], self.data)
+        self.offsets.append(len(self.data))
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    # Entry number of doc_id, or -1; lo skips entries already known to be smaller
+    def find(self, doc_id, lo=0):
+        i = bisect_left(self.doc_ids, doc_id, lo)
+        return i if i < len(self.doc_ids) and self.doc_ids[i] == doc_id else -1
+
+    def positions(self, i):
+        gaps, _ = decode_varbyte(self.data, self.offsets[i], self.tfs[i])
+        return list(accumulate(gaps))
+
+# term -> PositionalPostings over integer doc IDs in collection order, plus doc_names to map
+# IDs back to filenames. Positions count tokens after preprocessing, so phrase queries
+# must be processed with the same settings.
+def build_positional_index(documents, tokens_key="tokens"):
+    index = {}
+    doc_names = []
+
+    for doc_id, doc in enumerate(documents):
+        doc_names.append(doc["doc_id"])
+
+        positions = defaultdict(list)
+        for position, token in enumerate(doc[tokens_key]):
+            positions[token].append(position)
+
+        for term, term_positions in positions.items():
+            postings = index.get(term)
+            if postings is None:
+                postings = index[term] = PositionalPostings()
+            postings.add(doc_id, term_positions)
+
+    return index, doc_names
+
+# Turns ranker output over a compact index back into (filename, score) pairs
+def resolve_doc_names(results, doc_names):
+    return [(doc_names[doc_id], score) for doc_id, score in results]
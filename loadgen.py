@@ -0,0 +1,157 @@
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from server import HOST, PORT, MODELS
+from experiments import QUERIES
+
+# -------------------------------
+# LOAD GENERATOR FOR server.py
+# -------------------------------
+#
+# Opens `concurrency` keep-alive connections and sends search requests as fast as the
+# server answers them, for a fixed number of requests or a fixed duration. Reports
+# throughput and the latency distribution (p50/p95/p99) per status code.
+
+
+# Nearest-rank percentile of an already sorted list
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def latency_summary(latencies):
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "mean_ms": sum(values) / len(values) * 1000 if values else 0.0,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "max_ms": values[-1] * 1000 if values else 0.0
+    }
+
+
+async def _request(reader, writer, host, payload):
+    body = json.dumps(payload).encode("utf-8")
+    writer.write(
+        f"POST /search HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ")[1])
+    length = 0
+    for line in lines[1:]:
+        if line.lower().startswith("content-length:"):
+            length = int(line.split(":", 1)[1])
+    await reader.readexactly(length)
+    return status
+
+
+async def _client(host, port, budget, payloads, deadline, latencies, statuses):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline and budget["remaining"] > 0:
+            budget["remaining"] -= 1
+            payload = random.choice(payloads)
+            start = time.perf_counter()
+            try:
+                status = await _request(reader, writer, host, payload)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                statuses["connection error"] = statuses.get("connection error", 0) + 1
+                writer.close()
+                reader, writer = await asyncio.open_connection(host, port)
+                continue
+            latencies.setdefault(status, []).append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def run_load(host=HOST, port=PORT, requests=1000, concurrency=16, duration=None, model="bm25", k=10,
+                   queries=QUERIES):
+    payloads = [{"query": q, "model": model, "k": k} for q in queries]
+    # A duration replaces the request count
+    budget = {"remaining": requests if duration is None else float("inf")}
+    deadline = float("inf") if duration is None else time.perf_counter() + duration
+
+    latencies, statuses = {}, {}
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        _client(host, port, budget, payloads, deadline, latencies, statuses) for _ in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - start
+
+    completed = sum(len(v) for v in latencies.values())
+    return {
+        "requests": completed,
+        "concurrency": concurrency,
+        "model": model,
+        "elapsed_s": elapsed,
+        "throughput_rps": completed / elapsed if elapsed else 0.0,
+        "statuses": {str(status): count for status, count in statuses.items()},
+        "latency": {str(status): latency_summary(values) for status, values in latencies.items()}
+    }
+
+
+def print_report(report):
+    print(f"\n{report['requests']} requests ({report['model']}) over {report['concurrency']} connections "
+          f"in {report['elapsed_s']:.2f}s: {report['throughput_rps']:.1f} req/s")
+    print(f"Status codes: {report['statuses']}\n")
+    print(f"{'status':>8} {'count':>8} {'mean':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}  (ms)")
+    for status, s in report["latency"].items():
+        print(f"{status:>8} {s['count']:>8} {s['mean_ms']:>9.2f} {s['p50_ms']:>9.2f} "
+              f"{s['p95_ms']:>9.2f} {s['p99_ms']:>9.2f} {s['max_ms']:>9.2f}")
+
+
+# Starts server.py as a subprocess and waits until it is listening
+def start_local_server(port, extra_args=()):
+    process = subprocess.Popen(
+        [sys.executable, str(Path(__file__).with_name("server.py")), "--port", str(port), *extra_args],
+        stdout=subprocess.PIPE, text=True
+    )
+    line = process.stdout.readline()
+    if not line.startswith("Serving"):
+        process.kill()
+        raise RuntimeError(f"server.py did not start: {line.strip() or 'no output'}")
+    return process
+
+
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Load-test the search server")
+    arg_parser.add_argument("--host", default=HOST)
+    arg_parser.add_argument("--port", type=int, default=PORT)
+    arg_parser.add_argument("--requests", type=int, default=2000)
+    arg_parser.add_argument("--duration", type=float, default=None, help="stop after this many seconds")
+    arg_parser.add_argument("--concurrency", type=int, default=16)
+    arg_parser.add_argument("--model", choices=MODELS, default="bm25")
+    arg_parser.add_argument("--k", type=int, default=10)
+    arg_parser.add_argument("--start-server", action="store_true", help="start a local server.py first")
+    arg_parser.add_argument("--server-args", default="", help="extra arguments for the started server")
+    arg_parser.add_argument("--json", help="also write the report to this file")
+    args = arg_parser.parse_args()
+
+    process = start_local_server(args.port, args.server_args.split()) if args.start_server else None
+    try:
+        report = asyncio.run(run_load(args.host, args.port, args.requests, args.concurrency, args.duration,
+                                      args.model, args.k))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
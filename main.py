@@ -1,11 +1,17 @@
 from pathlib import Path
 from parser import parse_collection
 from tokeniser import process_text
-from indexer import build_inverted_index, build_inverted_index_bm25
-from ranker import compute_idf, rank_documents, precision_at_k, recall_at_k
-from ranker import rank_documents_bm25,compute_avg_doc_length
+from indexer import build_inverted_index
+from ranker import rank_documents, precision_at_k, recall_at_k
+from ranker import rank_documents_bm25, rank_documents_bm25_maxscore
 from datetime import datetime
-from experiments import print_top10
+from experiments import CSV_PATH, load_metadata, print_top10
+from index_store import INDEX_PATH, open_or_build_index
+from segments import SEGMENTS_DIR, MANIFEST_NAME, SegmentedIndex
+from query_cache import QueryCache, query_key
+from boolean_query import is_boolean_query, parse_query, rank_documents_boolean
+from facets import build_facet_index, parse_filters, filter_bitset, DocFilter, facet_counts, print_facet_counts
+import profiling
 
 # -------------------------------
 # PREPROCESSING CONFIGURATION
@@ -16,6 +22,9 @@ PREPROCESSING = {
     "use_stemming":True
 }
 
+# Repeated queries are answered from here until the index changes or the entry expires
+QUERY_CACHE = QueryCache(maxsize=1024, ttl=600)
+
 # -------------------------------
 # 1. PATH SETUP
 # -------------------------------
@@ -116,33 +125,114 @@ def save_results_to_file(query, results, doc_titles, k=10):
 
 if __name__ == "__main__":
 
-    # -------------------------------
-    # Load & preprocess
-    # -------------------------------
-    documents = load_and_process_documents()
+    # SEARCH_PROFILE=summary (or a .json/.csv path) reports where the time went at exit
+    profiling.enable_from_env()
 
     # -------------------------------
-    # Build BM25-compatible index ONCE
+    # A segmented index (built by `python segments.py`) takes precedence over the single index file:
+    # new pages are added as a segment and merged in the background while queries are answered
     # -------------------------------
-    index, doc_lengths = build_inverted_index_bm25(documents)
-    avg_dl = compute_avg_doc_length(doc_lengths)
-
-    num_docs = len(documents)
-    idf = compute_idf(index, num_docs, smooth=True)
+    segmented = None
+    facet_index = None
+    if (SEGMENTS_DIR / MANIFEST_NAME).exists():
+        segmented = SegmentedIndex(SEGMENTS_DIR, PREPROCESSING)
+        segmented.sync(DATA_DIR)
+        segmented.start_merging()
+        print(f"Number of documents: {segmented.snapshot().num_docs} "
+              f"in {len(segmented.snapshot().segments)} segments")
+    else:
+        # -------------------------------
+        # Open the prebuilt index (built once by `python index_store.py`)
+        # -------------------------------
+        store = open_or_build_index(INDEX_PATH, DATA_DIR, PREPROCESSING)
+        print(f"Number of documents: {store['num_docs']}")
+
+        body = store["fields"]["body"]
+        index = body["index"]
+        doc_lengths = body["doc_lengths"]
+        avg_dl = body["avg_dl"]
+        idf = body["idf"]
+        maxscore_index = body["maxscore_index"]
+        doc_titles = store["doc_titles"]
+
+        # publisher / genre / esrb bitsets, numbered like the index's documents
+        if CSV_PATH.exists():
+            facet_index = build_facet_index(load_metadata(), doc_titles)
+        else:
+            print(f"[WARN] {CSV_PATH} not found; publisher:/genre:/esrb: filters are disabled")
 
     # -------------------------------
     # Print user query results & save query results to files
     # -------------------------------
 
-    doc_titles = {doc["doc_id"]: doc["title"] for doc in documents}
     while True:
 
         query = input("\nEnter query (or type 'exit'): ").strip()
         if query.lower() == "exit":
             break
 
-        query_tokens = process_text(query)
-        results = rank_documents_bm25(query_tokens, index, idf, doc_lengths, avg_dl)
-        print_top10("BM25", results, set(), doc_titles)
+        # publisher:Atari genre:Arcade esrb:E filters are applied while scoring, not to the ranked list
+        text, filters = parse_filters(query)
+        if filters and facet_index is None:
+            print("[WARN] Facet filters need the single index file and videogame.csv; ignoring them")
+            filters = {}
+        allowed = filter_bitset(facet_index, filters) if filters else None
+
+        # AND / OR / NOT queries: only documents matching the expression are scored
+        if segmented is not None and is_boolean_query(text):
+            print("[WARN] Boolean operators are not supported on a segmented index; searching as free text")
+        elif is_boolean_query(text):
+            try:
+                tree = parse_query(text)
+            except ValueError as e:
+                print(f"[ERROR] {e}")
+                continue
+            stats = {}
+            results = rank_documents_boolean(tree, maxscore_index, None if filters else 10, stats, allowed)
+            print_top10("Boolean BM25", results, set(), doc_titles)
+            print(f"Matching documents: {stats['candidates']}, postings: {stats['postings']}, "
+                  f"comparisons: {stats['comparisons']}, intersection: {stats['intersect_ms']:.2f} ms")
+            if filters:
+                print_facet_counts(facet_counts(facet_index, [doc_id for doc_id, _ in results], top=5))
+            save_results_to_file(query, results, doc_titles)
+            continue
+
+        query_tokens = process_text(text)
+        if filters:
+            if query_tokens:
+                results = rank_documents_bm25(query_tokens, index, idf, doc_lengths, avg_dl,
+                                              allowed=DocFilter(facet_index, allowed))
+            else:
+                # Filters alone list the matching documents in collection order
+                results = [(facet_index["doc_ids"][d], 0.0) for d in allowed]
+            print_top10("Filtered BM25", results, set(), doc_titles)
+            print(f"Matching documents: {len(results)}")
+            print_facet_counts(facet_counts(facet_index, [doc_id for doc_id, _ in results], top=5))
+            save_results_to_file(query, results, doc_titles)
+            continue
+
+        key = query_key(query_tokens, "bm25", k=10)
+        if segmented is not None:
+            # One snapshot per query: a merge finishing mid-query cannot change what it sees
+            snapshot = segmented.snapshot()
+            results = QUERY_CACHE.lookup(key, snapshot.version, snapshot.search, query_tokens, "bm25", "body", 10)
+            doc_titles = snapshot.doc_titles()
+            print_top10("BM25", results, set(), doc_titles)
+        else:
+            # Same top 10 as rank_documents_bm25, skipping documents that cannot make the cut
+            stats = {}
+            results = QUERY_CACHE.lookup(key, store["version"], rank_documents_bm25_maxscore,
+                                         query_tokens, maxscore_index, 10, stats)
+            print_top10("BM25", results, set(), doc_titles)
+            if stats:
+                print(f"Postings scored: {stats['postings_scored']}, skipped: {stats['postings_skipped']}")
+            else:
+                print("Served from the query cache")
 
         save_results_to_file(query, results, doc_titles)
+
+    info = QUERY_CACHE.info()
+    print(f"Query cache: {info['hits']} hits, {info['misses']} misses, {info['evictions']} evictions")
+
+    if segmented is not None:
+        segmented.stop_merging()
@@ -1,14 +1,27 @@
 from bs4 import BeautifulSoup
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from html.parser import HTMLParser
 from pathlib import Path
+import os
 import re
 
+BACKENDS = ("bs4", "stream")
+BOILERPLATE_TAGS = ("script", "style", "nav", "footer", "header")
+
 # parse raw HTML into structured documents
-def parse_html_file(filepath):
+def parse_html_file(filepath, backend="bs4"):
+    if backend == "stream":
+        return parse_html_file_streaming(filepath)
+    if backend != "bs4":
+        raise ValueError(f"Unknown parser backend: {backend!r} (expected one of {BACKENDS})")
+
     with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
         soup = BeautifulSoup(f, "html.parser")
 
 # tag.decompose() removes specified boilerplate elements from the HTML code
-    for tag in soup(["script", "style", "nav", "footer", "header"]):
+    for tag in soup(list(BOILERPLATE_TAGS)):
         tag.decompose()
 
 # extracted title and body fields
@@ -27,16 +40,175 @@ def parse_html_file(filepath):
         "body": clean_text(body)
     }
 
-def parse_collection(directory):
+# -------------------------------
+# STREAMING BACKEND
+# -------------------------------
+
+# Elements html.parser's tree builder closes immediately, so they never contain text
+_VOID_TAGS = {
+    "area", "base", "basefont", "bgsound", "br", "col", "command", "embed", "frame", "hr", "image",
+    "img", "input", "isindex", "keygen", "link", "menuitem", "meta", "nextid", "param", "source",
+    "spacer", "track", "wbr"
+}
+
+# Event-based extractor that mirrors the BeautifulSoup path without building a tree.
+# Only a stack of open tag names is kept, so that end tags close elements the way
+# the tree builder would (a stray </div> also closes a <nav> left open inside it).
+class _StreamingExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._open = []
+        self._dropped = 0
+        self._pending = []
+        self._chunks = []
+        self._title_depth = None
+        self._title_parts = None
+        self._body_depth = None
+        self._body_start = None
+        self._body_end = None
+
+    # A text node ends at the next tag; whitespace is collapsed per node, as clean_text would
+    def _flush(self):
+        if not self._pending:
+            return
+        text = "".join(self._pending)
+        self._pending = []
+        if not self._dropped:
+            self._add_text(text)
+
+    def _add_text(self, text):
+        text = " ".join(text.split())
+        if not text:
+            return
+        self._chunks.append(text)
+        if self._title_depth is not None:
+            self._title_parts.append(text)
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        if tag in _VOID_TAGS:
+            return
+
+        self._open.append(tag)
+        if tag in BOILERPLATE_TAGS:
+            self._dropped += 1
+        elif self._dropped:
+            return
+        elif tag == "title" and self._title_parts is None:
+            self._title_depth = len(self._open)
+            self._title_parts = []
+        elif tag == "body" and self._body_depth is None:
+            self._body_depth = len(self._open)
+            self._body_start = len(self._chunks)
+
+    def handle_endtag(self, tag):
+        self._flush()
+        if tag not in self._open:
+            return
+
+        # Pops back to the most recent matching element, closing anything left open inside it
+        while True:
+            name = self._open.pop()
+            if name in BOILERPLATE_TAGS:
+                self._dropped -= 1
+            if name == tag:
+                break
+
+        depth = len(self._open)
+        if self._title_depth is not None and depth < self._title_depth:
+            self._title_depth = None
+        if self._body_depth is not None and self._body_end is None and depth < self._body_depth:
+            self._body_end = len(self._chunks)
+
+    def handle_data(self, data):
+        self._pending.append(data)
+
+    # Comments, doctypes and processing instructions are not text but still split text nodes
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    # <![CDATA[...]]> sections are their own text nodes in BeautifulSoup
+    def unknown_decl(self, data):
+        self._flush()
+        if data.startswith("CDATA[") and not self._dropped:
+            self._add_text(data[len("CDATA["):])
+
+    def result(self):
+        self._flush()
+        title = " ".join(self._title_parts) if self._title_parts else ""
+        if self._body_depth is None:
+            body = " ".join(self._chunks)
+        else:
+            body = " ".join(self._chunks[self._body_start:self._body_end])
+        return title, body
+
+# Same record as parse_html_file, built by streaming the file through HTMLParser
+def parse_html_file_streaming(filepath, chunk_size=8192):
+    extractor = _StreamingExtractor()
+
+    with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
+        for chunk in iter(lambda: f.read(chunk_size), ""):
+            extractor.feed(chunk)
+    extractor.close()
+
+    title, body = extractor.result()
+    return {
+        "doc_id": Path(filepath).name,
+        "title": title,
+        "body": body
+    }
+
+# workers > 1 parses files in a process pool; output order always matches the serial path
+def parse_collection(directory, workers=1, chunksize=None, backend="bs4"):
     directory = Path(directory)
-    documents = []
 
     if not directory.exists():
         print(f"[ERROR] Directory not found: {directory}")
-        return documents
+        return []
+
+    return list(iter_collection(directory, workers, chunksize, backend))
+
+# Same documents as parse_collection, yielded one at a time so the caller can drop each
+# page's text before the next is parsed. With a pool, at most a few batches per worker
+# are in flight, so a slow consumer never lets parsed pages pile up in memory
+def iter_collection(directory, workers=1, chunksize=None, backend="bs4"):
+    directory = Path(directory)
+    if not directory.exists():
+        print(f"[ERROR] Directory not found: {directory}")
+        return
 
 # Matches any .html file regardless of name
-    for file in directory.glob("*.html"):
-        documents.append(parse_html_file(file))
+    files = list(directory.glob("*.html"))
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    parse = partial(parse_html_file, backend=backend)
+
+    if workers <= 1 or len(files) < 2:
+        for file in files:
+            yield parse(file)
+        return
+
+# Batches of files per task keep dispatch overhead low; batches are yielded in input order
+    if chunksize is None:
+        chunksize = max(1, len(files) // (workers * 4))
+    batches = [files[i:i + chunksize] for i in range(0, len(files), chunksize)]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for batch in batches:
+            pending.append(executor.submit(_parse_batch, parse, batch))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
 
-    return documents
+def _parse_batch(parse, files):
+    return [parse(file) for file in files]
@@ -0,0 +1,106 @@
+import tempfile
+from pathlib import Path
+from parser import parse_collection, iter_collection, parse_html_file
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DATA_DIR = BASE_DIR / "data" / "Videogames"
+
+PAGES = {
+    "plain.html": """<!DOCTYPE html><html><head><title>Pok&eacute;mon Trozei at Nintendo :: Games</title>
+        <style>body { color: red }</style></head>
+        <body><header>Site header</header><nav><a href="/">Home</a></nav>
+        <div><h1>Pok&eacute;mon   Trozei</h1><p>Match&nbsp;Pok&eacute;mon<br>in rows<br/>of four &amp; more.</p>
+        <script>var s = "<p>not text</p>";</script></div><footer>Copyright</footer></body></html>""",
+
+    # a <nav> left open is closed by its parent's end tag, as the tree builder does
+    "unclosed.html": """<html><head><title>Tony Hawk's Downhill Jam</title></head>
+        <body><div>kept <nav>dropped <b>also dropped</div> kept again</body></html>""",
+
+    # no <body>: the whole document text is used, title included
+    "nobody.html": """<title>London Taxi: Rush Hour</title><p>Drive a  black cab</p><!-- a comment -->""",
+
+    # CDATA, comments, unknown entities and text after </body>
+    "odd.html": """<html><head><title>The Sims 2 Apartment Pets</title></head>
+        <body>a<!--c-->b<![CDATA[x]]><?pi ok?>c&nbsp;d &foo e &#150; f<header><nav>x</nav>y</header>z</body>
+        </html>tail""",
+
+    # nested boilerplate and self-closing tags
+    "nested.html": """<html><head><title>  Arcade
+        Classics </title></head><body><footer><header>h</header><script>s</script>f</footer>
+        <div/>one<img src="a.png"/>two<span>three</span>four</body></html>""",
+}
+
+
+def _write_pages(directory):
+    for name, html in PAGES.items():
+        (Path(directory) / name).write_text(html, encoding="utf-8")
+
+
+def test_parallel_collection_matches_serial():
+    with tempfile.TemporaryDirectory() as tmp:
+        _write_pages(tmp)
+        serial = parse_collection(tmp)
+        assert len(serial) == len(PAGES)
+
+        # Same documents in the same order, however the files are batched
+        assert parse_collection(tmp, workers=2, chunksize=1) == serial
+        assert parse_collection(tmp, workers=2) == serial
+        assert parse_collection(tmp, workers=None) == serial
+
+
+def test_streaming_matches_bs4():
+    with tempfile.TemporaryDirectory() as tmp:
+        _write_pages(tmp)
+
+        for file in sorted(Path(tmp).glob("*.html")):
+            expected = parse_html_file(file, backend="bs4")
+            actual = parse_html_file(file, backend="stream")
+            assert actual == expected, (file.name, actual, expected)
+
+
+def test_streaming_drops_boilerplate():
+    with tempfile.TemporaryDirectory() as tmp:
+        _write_pages(tmp)
+        doc = parse_html_file(Path(tmp) / "plain.html", backend="stream")
+
+    assert doc["title"] == "Pokémon Trozei at Nintendo :: Games"
+    assert doc["body"] == "Pokémon Trozei Match Pokémon in rows of four & more."
+
+
+def test_collection_order_is_backend_independent():
+    with tempfile.TemporaryDirectory() as tmp:
+        _write_pages(tmp)
+        serial = parse_collection(tmp)
+
+        assert parse_collection(tmp, backend="stream") == serial
+        assert parse_collection(tmp, workers=2, backend="stream") == serial
+
+
+def test_iter_collection_yields_parse_collection_in_order():
+    with tempfile.TemporaryDirectory() as tmp:
+        _write_pages(tmp)
+        serial = parse_collection(tmp)
+
+        documents = iter_collection(tmp)
+        assert next(documents) == serial[0]
+        assert [serial[0]] + list(documents) == serial
+        assert list(iter_collection(tmp, workers=2, chunksize=1)) == serial
+        assert list(iter_collection(Path(tmp) / "missing")) == []
+
+
+def test_streaming_matches_bs4_on_collection():
+    if not DATA_DIR.exists():
+        print(f"Skipping collection parity: {DATA_DIR} not found")
+        return
+
+    assert parse_collection(DATA_DIR, backend="stream") == parse_collection(DATA_DIR)
+
+
+if __name__ == "__main__":
+    test_parallel_collection_matches_serial()
+    test_streaming_matches_bs4()
+    test_streaming_drops_boilerplate()
+    test_collection_order_is_backend_independent()
+    test_iter_collection_yields_parse_collection_in_order()
+    test_streaming_matches_bs4_on_collection()
+    print("Parser tests passed")
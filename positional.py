@@ -0,0 +1,234 @@
+import heapq
+import re
+from bisect import bisect_left
+
+from tokeniser import process_text
+from ranker import top_k
+
+# -------------------------------
+# PHRASE AND PROXIMITY QUERIES
+# -------------------------------
+#
+# Queries may contain quoted phrases and NEAR/n(...) groups next to free terms:
+#
+#     "tony hawk" downhill jam          the phrase must occur, all terms are scored
+#     NEAR/3(london rush) taxi           london and rush at most 3 positions apart
+#
+# Operators are filters over a positional index (indexer.build_positional_index); the
+# documents that pass are ranked by BM25 over every query term. Positions are counted in
+# the processed token stream, so "The Sims 2" matches wherever "sim 2" appears once
+# stopwords are gone.
+
+_OPERATOR = re.compile(r'"([^"]*)"|NEAR/(\d+)\(([^)]*)\)', re.IGNORECASE)
+
+
+# {"terms": every token in order, "phrases": [tokens, ...], "near": [(n, tokens), ...]}
+def parse_query(text, preprocessing=None):
+    preprocessing = preprocessing or {}
+    query = {"terms": [], "phrases": [], "near": []}
+    last = 0
+
+    for match in _OPERATOR.finditer(text):
+        query["terms"] += process_text(text[last:match.start()], **preprocessing)
+        if match.group(1) is not None:
+            tokens = process_text(match.group(1), **preprocessing)
+            if tokens:
+                query["phrases"].append(tokens)
+        else:
+            tokens = process_text(match.group(3), **preprocessing)
+            if tokens:
+                query["near"].append((int(match.group(2)), tokens))
+        query["terms"] += tokens
+        last = match.end()
+
+    query["terms"] += process_text(text[last:], **preprocessing)
+    return query
+
+
+# Doc IDs present in every postings list, walking the shortest list and probing the others
+def intersect_postings(postings_lists):
+    if not postings_lists:
+        return []
+    lists = sorted(postings_lists, key=len)
+    result = list(lists[0].doc_ids)
+
+    for postings in lists[1:]:
+        doc_ids = postings.doc_ids
+        matched = []
+        lo = 0
+        for doc_id in result:
+            lo = bisect_left(doc_ids, doc_id, lo)
+            if lo == len(doc_ids):
+                break
+            if doc_ids[lo] == doc_id:
+                matched.append(doc_id)
+        result = matched
+        if not result:
+            break
+
+    return result
+
+
+# (doc ID, {term: positions}) for every document containing all the terms; each list is
+# searched from where the previous document was found, since candidates come in order
+def _candidate_positions(terms, positional):
+    distinct = list(dict.fromkeys(terms))
+    if not distinct or any(term not in positional for term in distinct):
+        return distinct, []
+    lists = [(term, positional[term]) for term in distinct]
+
+    def candidates():
+        cursors = [0] * len(lists)
+        for doc_id in intersect_postings([postings for _, postings in lists]):
+            positions = {}
+            for n, (term, postings) in enumerate(lists):
+                cursors[n] = postings.find(doc_id, cursors[n])
+                positions[term] = postings.positions(cursors[n])
+            yield doc_id, positions
+
+    return distinct, candidates()
+
+
+# doc ID -> number of times the phrase occurs
+def phrase_matches(phrase, positional):
+    _, candidates = _candidate_positions(phrase, positional)
+    matches = {}
+
+    for doc_id, positions in candidates:
+        # Start positions where term j sits exactly j places after the first term
+        starts = set(positions[phrase[0]])
+        for offset, term in enumerate(phrase[1:], start=1):
+            starts.intersection_update([p - offset for p in positions[term]])
+            if not starts:
+                break
+        if starts:
+            matches[doc_id] = len(starts)
+
+    return matches
+
+
+# doc ID -> smallest span (last position - first position) holding every distinct term,
+# for documents where that span is at most `window`
+def proximity_matches(terms, positional, window):
+    distinct, candidates = _candidate_positions(terms, positional)
+    matches = {}
+
+    for doc_id, positions in candidates:
+        merged = heapq.merge(*([(p, t) for p in positions[term]] for t, term in enumerate(distinct)))
+
+        # Sliding window over the merged positions, shrunk from the left while it still holds every term
+        counts = [0] * len(distinct)
+        covered = 0
+        window_events = []
+        start = 0
+        best = None
+        for position, t in merged:
+            window_events.append((position, t))
+            if counts[t] == 0:
+                covered += 1
+            counts[t] += 1
+            while covered == len(distinct):
+                first, ft = window_events[start]
+                span = position - first
+                if best is None or span < best:
+                    best = span
+                counts[ft] -= 1
+                if counts[ft] == 0:
+                    covered -= 1
+                start += 1
+
+        if best is not None and best <= window:
+            matches[doc_id] = best
+
+    return matches
+
+
+# Documents (by doc ID) that satisfy every phrase and NEAR group, or None if there are none
+def allowed_documents(query, positional):
+    allowed = None
+    constraints = [lambda p=p: phrase_matches(p, positional) for p in query["phrases"]]
+    constraints += [lambda n=n, t=t: proximity_matches(t, positional, n) for n, t in query["near"]]
+    for constraint in constraints:
+        matched = set(constraint())
+        allowed = matched if allowed is None else allowed & matched
+        if not allowed:
+            break
+    return allowed
+
+
+# BM25 scores as rank_documents_bm25 computes them, in its insertion order; with docs given,
+# only those documents are scored (by lookup instead of walking whole postings lists)
+def _bm25_scores(query_tokens, index, idf, doc_lengths, avg_doc_length, k1, b, docs=None):
+    scores = {}
+    for term in query_tokens:
+        if term not in index:
+            continue
+        postings = index[term]
+        if docs is None:
+            entries = postings.items()
+        else:
+            entries = ((doc_id, postings[doc_id]) for doc_id in docs if doc_id in postings)
+        for doc_id, tf in entries:
+            numerator = tf * (k1 + 1)
+            denominator = tf + k1 * (1 - b + b * (doc_lengths[doc_id] / avg_doc_length))
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf[term] * (numerator / denominator)
+    return scores
+
+
+# BM25 over query["terms"] restricted to the documents matching every phrase and NEAR
+# group: the same scores and order as filtering rank_documents_bm25's full ranking.
+# Without operators, phrase_boost > 0 multiplies the score of documents containing the
+# whole query as a phrase by (1 + phrase_boost), so exact title matches rise above pages
+# that merely share the words.
+def rank_documents_bm25_positional(query, index, idf, doc_lengths, avg_doc_length, positional, doc_names,
+                                   k1=1.5, b=0.75, k=None, phrase_boost=0.0):
+    terms = query["terms"]
+    allowed = allowed_documents(query, positional)
+
+    if allowed is not None:
+        # Collection order, which is the order documents appear in every postings list
+        docs = [doc_names[doc_id] for doc_id in sorted(allowed)]
+        return top_k(_bm25_scores(terms, index, idf, doc_lengths, avg_doc_length, k1, b, docs), k)
+
+    scores = _bm25_scores(terms, index, idf, doc_lengths, avg_doc_length, k1, b)
+    if phrase_boost and len(terms) > 1:
+        for doc_id in phrase_matches(terms, positional):
+            name = doc_names[doc_id]
+            if name in scores:
+                scores[name] *= 1 + phrase_boost
+    return top_k(scores, k)
+
+
+if __name__ == "__main__":
+    import argparse
+    from index_store import DATA_DIR, DEFAULT_PREPROCESSING, stream_documents
+    from indexer import build_inverted_index_bm25, build_positional_index
+    from ranker import compute_idf, compute_avg_doc_length
+
+    arg_parser = argparse.ArgumentParser(description='Phrase ("...") and NEAR/n(...) search over the collection')
+    arg_parser.add_argument("--data", default=DATA_DIR, help="directory of .html documents")
+    arg_parser.add_argument("--phrase-boost", type=float, default=1.0,
+                            help="score boost for pages containing a whole unquoted query as a phrase")
+    arg_parser.add_argument("--k", type=int, default=10)
+    args = arg_parser.parse_args()
+
+    documents = list(stream_documents(args.data, DEFAULT_PREPROCESSING))
+    body = [{"doc_id": d["doc_id"], "tokens": d["body_tokens"]} for d in documents]
+    titles = {d["doc_id"]: d["title"] for d in documents}
+    index, doc_lengths = build_inverted_index_bm25(body)
+    idf = compute_idf(index, len(body), smooth=True)
+    avg_dl = compute_avg_doc_length(doc_lengths)
+    positional, doc_names = build_positional_index(body)
+    print(f"Number of documents: {len(body)}")
+
+    while True:
+        text = input('\nEnter query, e.g. "tony hawk" jam or NEAR/3(london rush) (or type \'exit\'): ').strip()
+        if text.lower() == "exit":
+            break
+        query = parse_query(text, DEFAULT_PREPROCESSING)
+        results = rank_documents_bm25_positional(query, index, idf, doc_lengths, avg_dl, positional, doc_names,
+                                                 k=args.k, phrase_boost=args.phrase_boost)
+        if not results:
+            print("[INFO] No matching documents")
+        for rank, (doc_id, score) in enumerate(results, start=1):
+            print(f"{rank:>2}. {score:.4f}  {titles.get(doc_id, doc_id)}")
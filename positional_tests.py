@@ -0,0 +1,147 @@
+import random
+
+from indexer import build_inverted_index_bm25, build_positional_index, decode_varbyte
+from ranker import compute_idf, compute_avg_doc_length, rank_documents_bm25
+from positional import (
+    parse_query,
+    intersect_postings,
+    phrase_matches,
+    proximity_matches,
+    rank_documents_bm25_positional
+)
+
+PREPROCESSING = {"use_stopwords": False, "use_stemming": True, "use_lemmatization": False, "tokenizer": "regex"}
+
+
+def _documents(num_docs=150, vocabulary=12, seed=7):
+    rng = random.Random(seed)
+    words = [f"w{i}" for i in range(vocabulary)]
+    return [
+        {"doc_id": f"doc{i}.html", "tokens": rng.choices(words, weights=range(vocabulary, 0, -1), k=rng.randint(0, 40))}
+        for i in range(num_docs)
+    ]
+
+
+def _brute_phrase(tokens, phrase):
+    n = len(phrase)
+    return sum(1 for i in range(len(tokens) - n + 1) if tokens[i:i + n] == phrase)
+
+
+def _brute_span(tokens, terms):
+    needed = set(terms)
+    best = None
+    for i in range(len(tokens)):
+        seen = set()
+        for j in range(i, len(tokens)):
+            if tokens[j] in needed:
+                seen.add(tokens[j])
+            if seen == needed:
+                if best is None or j - i < best:
+                    best = j - i
+                break
+    return best
+
+
+def test_positional_postings_round_trip():
+    documents = _documents()
+    positional, doc_names = build_positional_index(documents)
+    assert doc_names == [d["doc_id"] for d in documents]
+
+    for term, postings in positional.items():
+        assert list(postings.doc_ids) == sorted(postings.doc_ids)
+        for i, doc_id in enumerate(postings.doc_ids):
+            tokens = documents[doc_id]["tokens"]
+            assert postings.positions(i) == [p for p, t in enumerate(tokens) if t == term]
+            assert postings.find(doc_id) == i
+        assert postings.find(len(documents)) == -1
+
+    # Gaps, not absolute positions, are stored
+    postings = build_positional_index([{"doc_id": "a", "tokens": ["x"] * 300}])[0]["x"]
+    assert decode_varbyte(postings.data, 0, 300)[0] == [0] + [1] * 299
+    assert len(postings.data) == 300
+
+
+def test_phrase_and_proximity_match_brute_force():
+    documents = _documents()
+    positional, _ = build_positional_index(documents)
+    rng = random.Random(3)
+
+    for _ in range(200):
+        terms = rng.choices([f"w{i}" for i in range(13)], k=rng.randint(1, 3))
+        phrase = phrase_matches(terms, positional)
+        expected = {i: _brute_phrase(d["tokens"], terms) for i, d in enumerate(documents)}
+        assert phrase == {i: n for i, n in expected.items() if n}
+
+        window = rng.randint(0, 6)
+        near = proximity_matches(terms, positional, window)
+        spans = {i: _brute_span(d["tokens"], terms) for i, d in enumerate(documents)}
+        assert near == {i: s for i, s in spans.items() if s is not None and s <= window}
+
+    lists = [positional[t] for t in ("w0", "w3", "w7")]
+    assert intersect_postings(lists) == sorted(set.intersection(*(set(p.doc_ids) for p in lists)))
+    assert intersect_postings([]) == []
+
+
+def test_parse_query():
+    query = parse_query('"Tony Hawk" downhill NEAR/3(London Rush) jam', PREPROCESSING)
+    assert query["phrases"] == [["toni", "hawk"]]
+    assert query["near"] == [(3, ["london", "rush"])]
+    assert query["terms"] == ["toni", "hawk", "downhil", "london", "rush", "jam"]
+    assert parse_query("plain words", PREPROCESSING) == {"terms": ["plain", "word"], "phrases": [], "near": []}
+
+
+def test_filtered_ranking_equals_bm25():
+    documents = _documents()
+    index, doc_lengths = build_inverted_index_bm25(documents)
+    idf = compute_idf(index, len(documents), smooth=True)
+    avg_dl = compute_avg_doc_length(doc_lengths)
+    positional, doc_names = build_positional_index(documents)
+
+    for query in (
+            {"terms": ["w1", "w2", "w5"], "phrases": [["w1", "w2"]], "near": []},
+            {"terms": ["w0", "w4", "w9"], "phrases": [], "near": [(2, ["w0", "w4"])]},
+            {"terms": ["w3", "w2"], "phrases": [["w3", "w2"]], "near": [(4, ["w3", "w2"])]},
+            {"terms": ["w11", "w12"], "phrases": [["w11", "w12"]], "near": []}
+    ):
+        allowed = {doc_names[d] for d in phrase_matches(query["phrases"][0], positional)} if query["phrases"] \
+            else set(doc_names)
+        for window, terms in query["near"]:
+            allowed &= {doc_names[d] for d in proximity_matches(terms, positional, window)}
+
+        full = rank_documents_bm25(query["terms"], index, idf, doc_lengths, avg_dl)
+        expected = [(d, s) for d, s in full if d in allowed]
+        results = rank_documents_bm25_positional(query, index, idf, doc_lengths, avg_dl, positional, doc_names)
+        assert results == expected
+        assert rank_documents_bm25_positional(query, index, idf, doc_lengths, avg_dl, positional, doc_names,
+                                              k=3) == expected[:3]
+
+
+def test_phrase_boost():
+    documents = [
+        {"doc_id": "scattered.html", "tokens": ["hawk", "x", "x", "toni", "jam"]},
+        {"doc_id": "exact.html", "tokens": ["toni", "hawk", "x", "x", "x", "x"]},
+        {"doc_id": "other.html", "tokens": ["x", "y"]}
+    ]
+    index, doc_lengths = build_inverted_index_bm25(documents)
+    idf = compute_idf(index, len(documents), smooth=True)
+    avg_dl = compute_avg_doc_length(doc_lengths)
+    positional, doc_names = build_positional_index(documents)
+    query = {"terms": ["toni", "hawk"], "phrases": [], "near": []}
+
+    plain = rank_documents_bm25_positional(query, index, idf, doc_lengths, avg_dl, positional, doc_names)
+    assert plain == rank_documents_bm25(query["terms"], index, idf, doc_lengths, avg_dl)
+    assert plain[0][0] == "scattered.html"
+
+    boosted = rank_documents_bm25_positional(query, index, idf, doc_lengths, avg_dl, positional, doc_names,
+                                             phrase_boost=1.0)
+    assert [d for d, _ in boosted] == ["exact.html", "scattered.html"]
+    assert boosted[0][1] == dict(plain)["exact.html"] * 2
+
+
+if __name__ == "__main__":
+    test_positional_postings_round_trip()
+    test_phrase_and_proximity_match_brute_force()
+    test_parse_query()
+    test_filtered_ranking_equals_bm25()
+    test_phrase_boost()
+    print("Positional tests passed")
@@ -0,0 +1,346 @@
+import atexit
+import csv
+import functools
+import heapq
+import inspect
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# -------------------------------
+# PIPELINE INSTRUMENTATION
+# -------------------------------
+#
+# enable() swaps the parse, tokenise, index and rank functions below for timed wrappers,
+# in their own module and in every module of this project that imported them by name;
+# disable() puts the originals back. While disabled nothing is wrapped, so the pipeline
+# runs the exact functions it always did and pays nothing.
+#
+# Per stage it records calls, total and self time (total minus instrumented calls made
+# inside it), and optionally the traced peak allocation of outermost calls. Every outermost
+# ranker call is one query: its ranking time and postings touched are recorded next to the
+# time of the process_text call that preceded it on the same thread, which separates slow
+# query processing from slow postings traversal.
+#
+# Worker processes (parse_collection(workers>1), the experiment grid, the search service)
+# keep their own counters, which are not collected: profile with one worker.
+
+PACKAGE_DIR = Path(__file__).resolve().parent
+
+# (module, function, stage)
+TARGETS = (
+    ("parser", "parse_collection", "parse.collection"),
+    ("parser", "parse_html_file", "parse.file"),
+    ("tokeniser", "process_text", "tokenise"),
+    ("tokeniser", "tokenize", "tokenise.tokenize"),
+    ("tokeniser", "normalize", "tokenise.normalize"),
+    ("tokeniser", "remove_stopwords", "tokenise.stopwords"),
+    ("tokeniser", "remove_stopwords_regex", "tokenise.stopwords"),
+    ("tokeniser", "stem", "tokenise.stem"),
+    ("tokeniser", "lemmatize", "tokenise.lemmatize"),
+    ("indexer", "build_inverted_index", "index.build_inverted_index"),
+    ("indexer", "build_inverted_index_bm25", "index.build_inverted_index_bm25"),
+    ("indexer", "build_multifield_index", "index.build_multifield_index"),
+    ("indexer", "build_compact_index_bm25", "index.build_compact_index_bm25"),
+    ("ranker", "compute_idf", "index.compute_idf"),
+    ("ranker", "build_maxscore_index", "index.build_maxscore_index"),
+    ("ranker", "rank_documents", "rank.tfidf"),
+    ("ranker", "rank_documents_bm25", "rank.bm25"),
+    ("ranker", "rank_documents_bm25_maxscore", "rank.bm25_maxscore"),
+    ("ranker", "rank_documents_tfidf_field_weighted", "rank.tfidf_field_weighted"),
+    ("ranker", "rank_documents_bm25_field_weighted", "rank.bm25_field_weighted"),
+    ("ranker", "rank_documents_bm25f", "rank.bm25f")
+)
+
+QUERY_STAGE = "tokenise"
+RANK_PREFIX = "rank."
+
+_lock = threading.Lock()
+_local = threading.local()
+_state = {"enabled": False, "patched": [], "trace_memory": False, "started": None, "exit_hook": False}
+_stages = {}
+_queries = {"count": 0, "processing_sec": 0.0, "ranking_sec": 0.0, "postings": 0}
+_slowest = []
+_slow_limit = 20
+_sequence = itertools.count()
+
+
+def _dict_postings(arguments):
+    index = arguments["index"]
+    return sum(len(index[term]) for term in arguments["query_tokens"] if term in index)
+
+
+# Postings a leaf ranker walks for one call, from its bound arguments (and maxscore's stats)
+POSTINGS = {
+    "rank_documents": _dict_postings,
+    "rank_documents_bm25": _dict_postings,
+    "rank_documents_bm25f": _dict_postings,
+    "rank_documents_bm25_maxscore": lambda arguments: arguments["stats"]["postings_scored"]
+}
+
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _record(stage, elapsed, child, peak):
+    with _lock:
+        s = _stages.get(stage)
+        if s is None:
+            s = _stages[stage] = {"calls": 0, "total_sec": 0.0, "self_sec": 0.0, "max_sec": 0.0, "peak_bytes": 0}
+        s["calls"] += 1
+        s["total_sec"] += elapsed
+        s["self_sec"] += elapsed - child
+        s["max_sec"] = max(s["max_sec"], elapsed)
+        if peak is not None:
+            s["peak_bytes"] = max(s["peak_bytes"], peak)
+
+
+def _record_query(stage, arguments, elapsed, postings):
+    processing = getattr(_local, "processing", None)
+    _local.processing = None
+    tokens = arguments.get("query_tokens")
+    entry = (elapsed, next(_sequence), stage, list(tokens) if tokens is not None else None, postings, processing)
+    with _lock:
+        _queries["count"] += 1
+        _queries["ranking_sec"] += elapsed
+        _queries["processing_sec"] += processing or 0.0
+        _queries["postings"] += postings
+        if len(_slowest) < _slow_limit:
+            heapq.heappush(_slowest, entry)
+        elif elapsed > _slowest[0][0]:
+            heapq.heapreplace(_slowest, entry)
+
+
+def _wrap(fn, stage):
+    signature = inspect.signature(fn)
+    count_postings = POSTINGS.get(fn.__name__)
+    is_ranker = stage.startswith(RANK_PREFIX)
+    needs_stats = "stats" in signature.parameters
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        stack = _stack()
+        outermost = not stack
+        top_ranker = is_ranker and not any(f[1] for f in stack)
+        arguments = None
+        if count_postings is not None or top_ranker:
+            bound = signature.bind(*args, **kwargs)
+            if needs_stats and bound.arguments.get("stats") is None:
+                bound.arguments["stats"] = {}
+                args, kwargs = bound.args, bound.kwargs
+            arguments = bound.arguments
+
+        # [time spent in instrumented children, is a ranker, postings touched below]
+        frame = [0.0, is_ranker, 0]
+        stack.append(frame)
+        trace = outermost and _state["trace_memory"] and tracemalloc.is_tracing()
+        if trace:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] - before if trace else None
+            stack.pop()
+            if stack:
+                stack[-1][0] += elapsed
+
+            postings = frame[2]
+            if count_postings is not None:
+                postings += count_postings(arguments)
+            if stack:
+                stack[-1][2] += postings
+
+            _record(stage, elapsed, frame[0], peak)
+            if stage == QUERY_STAGE and outermost:
+                _local.processing = elapsed
+            elif top_ranker:
+                _record_query(stage, arguments, elapsed, postings)
+
+    wrapper.__profiled__ = fn
+    return wrapper
+
+
+def _project_modules():
+    for module in list(sys.modules.values()):
+        path = getattr(module, "__file__", None)
+        if path and Path(path).resolve().parent == PACKAGE_DIR:
+            yield module
+
+
+def is_enabled():
+    return _state["enabled"]
+
+
+# report_to: None, "summary" (printed at exit) or a .json / .csv path written at exit
+def enable(trace_memory=False, report_to=None, slow_queries=20):
+    global _slow_limit
+    if _state["enabled"]:
+        return
+    import parser, tokeniser, indexer, ranker
+    modules = {"parser": parser, "tokeniser": tokeniser, "indexer": indexer, "ranker": ranker}
+
+    wrappers = {}
+    for module_name, name, stage in TARGETS:
+        original = getattr(modules[module_name], name)
+        wrappers[id(original)] = (original, _wrap(original, stage))
+
+    patched = []
+    for module in _project_modules():
+        if module.__name__ == __name__:
+            continue
+        for attribute, value in list(vars(module).items()):
+            if id(value) in wrappers and wrappers[id(value)][0] is value:
+                setattr(module, attribute, wrappers[id(value)][1])
+                patched.append((module, attribute, value))
+
+    _slow_limit = slow_queries
+    _state.update(enabled=True, patched=patched, trace_memory=trace_memory, started=time.perf_counter())
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    if report_to is not None:
+        _state["report_to"] = report_to
+        if not _state["exit_hook"]:
+            atexit.register(_report_at_exit)
+            _state["exit_hook"] = True
+
+
+# Puts the original functions back, including references copied from a wrapper since enable()
+def disable():
+    if not _state["enabled"]:
+        return
+    for module, attribute, original in _state["patched"]:
+        setattr(module, attribute, original)
+    for module in _project_modules():
+        for attribute, value in list(vars(module).items()):
+            original = getattr(value, "__profiled__", None)
+            if original is not None:
+                setattr(module, attribute, original)
+    _state.update(enabled=False, patched=[])
+
+
+# SEARCH_PROFILE=summary | <path>.json | <path>.csv, SEARCH_PROFILE_MEMORY=1 to trace allocations
+def enable_from_env(variable="SEARCH_PROFILE"):
+    target = os.environ.get(variable)
+    if not target:
+        return False
+    enable(trace_memory=os.environ.get(variable + "_MEMORY") == "1",
+           report_to="summary" if target in ("1", "summary") else target)
+    return True
+
+
+def reset():
+    with _lock:
+        _stages.clear()
+        _slowest.clear()
+        _queries.update(count=0, processing_sec=0.0, ranking_sec=0.0, postings=0)
+    _state["started"] = time.perf_counter() if _state["enabled"] else None
+
+
+def report():
+    with _lock:
+        stages = {
+            stage: {
+                "calls": s["calls"],
+                "total_sec": s["total_sec"],
+                "self_sec": s["self_sec"],
+                "mean_ms": s["total_sec"] / s["calls"] * 1000,
+                "max_ms": s["max_sec"] * 1000,
+                "peak_mib": s["peak_bytes"] / 2**20
+            }
+            for stage, s in sorted(_stages.items())
+        }
+        queries = dict(_queries)
+        slowest = sorted(_slowest, reverse=True)
+
+    queries["slowest"] = [
+        {"ranker": stage, "query_tokens": tokens, "ranking_ms": elapsed * 1000, "postings": postings,
+         "processing_ms": processing * 1000 if processing is not None else None}
+        for elapsed, _, stage, tokens, postings, processing in slowest
+    ]
+
+    memory = {}
+    if tracemalloc.is_tracing():
+        memory["traced_peak_mib"] = tracemalloc.get_traced_memory()[1] / 2**20
+    if resource is not None:
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        scale = 1 if sys.platform == "darwin" else 1024
+        memory["max_rss_mib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20
+
+    started = _state["started"]
+    return {
+        "wall_sec": time.perf_counter() - started if started is not None else 0.0,
+        "stages": stages,
+        "queries": queries,
+        "memory": memory
+    }
+
+
+def write_json(path, data=None):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data or report(), f, indent=2)
+    return path
+
+
+# One row per stage
+def write_csv(path, data=None):
+    stages = (data or report())["stages"]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["stage", "calls", "total_sec", "self_sec", "mean_ms", "max_ms", "peak_mib"])
+        for stage, s in stages.items():
+            writer.writerow([stage, s["calls"], f"{s['total_sec']:.6f}", f"{s['self_sec']:.6f}",
+                             f"{s['mean_ms']:.4f}", f"{s['max_ms']:.4f}", f"{s['peak_mib']:.3f}"])
+    return path
+
+
+def summary(data=None):
+    data = data or report()
+    lines = [f"Profile ({data['wall_sec']:.2f}s wall)", "",
+             f"{'stage':<34} {'calls':>9} {'total s':>9} {'self s':>9} {'mean ms':>9} {'max ms':>9} {'peak MiB':>9}"]
+    for stage, s in data["stages"].items():
+        lines.append(f"{stage:<34} {s['calls']:>9} {s['total_sec']:>9.3f} {s['self_sec']:>9.3f} "
+                     f"{s['mean_ms']:>9.3f} {s['max_ms']:>9.3f} {s['peak_mib']:>9.2f}")
+
+    q = data["queries"]
+    if q["count"]:
+        lines += ["", f"Queries: {q['count']}, query processing {q['processing_sec'] * 1000:.1f} ms, "
+                      f"ranking {q['ranking_sec'] * 1000:.1f} ms, {q['postings']:,} postings touched",
+                  "Slowest:"]
+        for entry in q["slowest"][:10]:
+            processing = f"{entry['processing_ms']:.3f}" if entry["processing_ms"] is not None else "-"
+            lines.append(f"  {entry['ranking_ms']:>9.3f} ms ranking  {processing:>8} ms processing  "
+                         f"{entry['postings']:>8,} postings  {entry['ranker']}  {entry['query_tokens']}")
+
+    if data["memory"]:
+        lines += [""] + [f"{name}: {value:.1f}" for name, value in data["memory"].items()]
+    return "\n".join(lines)
+
+
+def _report_at_exit():
+    target = _state.get("report_to")
+    if not _state["enabled"] or target is None:
+        return
+    if target == "summary":
+        print("\n" + summary())
+    elif str(target).endswith(".csv"):
+        print(f"Saved profile to: {write_csv(target)}")
+    else:
+        print(f"Saved profile to: {write_json(target)}")
@@ -0,0 +1,93 @@
+import csv
+import json
+import os
+import tempfile
+
+import profiling
+import ranker
+import tokeniser
+from tokeniser import process_text
+from indexer import build_inverted_index_bm25
+from ranker import compute_idf, compute_avg_doc_length, rank_documents_bm25, rank_documents_bm25_field_weighted
+
+# Runs without NLTK data: regex tokenizer, no stopword list, no WordNet
+PREPROCESSING = {"use_stopwords": False, "use_stemming": True, "use_lemmatization": False, "tokenizer": "regex"}
+
+PAGES = [
+    {"doc_id": "a.html", "title": "Tony Hawk's Downhill Jam", "body": "downhill jam skate game"},
+    {"doc_id": "b.html", "title": "London Taxi: Rush Hour", "body": "taxi rush hour driving game"},
+    {"doc_id": "c.html", "title": "Arcade Classics", "body": "arcade game game atari"},
+]
+
+
+def _field(name):
+    streams = [{"doc_id": p["doc_id"], "tokens": process_text(p[name], **PREPROCESSING)} for p in PAGES]
+    index, doc_lengths = build_inverted_index_bm25(streams)
+    return index, compute_idf(index, len(PAGES), smooth=True), doc_lengths, compute_avg_doc_length(doc_lengths)
+
+
+def test_disabled_runs_the_original_functions():
+    originals = (tokeniser.process_text, ranker.rank_documents_bm25, process_text, rank_documents_bm25)
+    profiling.enable()
+    try:
+        assert tokeniser.process_text is not originals[0]
+        # names imported into other modules are wrapped too
+        assert globals()["rank_documents_bm25"] is not originals[3]
+        assert tokeniser.process_text("Taxi jam", **PREPROCESSING) == originals[0]("Taxi jam", **PREPROCESSING)
+    finally:
+        profiling.disable()
+    assert (tokeniser.process_text, ranker.rank_documents_bm25,
+            globals()["process_text"], globals()["rank_documents_bm25"]) == originals
+
+
+def test_stages_queries_and_postings():
+    title, body = _field("title"), _field("body")
+    profiling.enable()
+    profiling.reset()
+    try:
+        tokens = process_text("taxi game", **PREPROCESSING)
+        rank_documents_bm25_field_weighted(tokens, *title, *body, k=2)
+        report = profiling.report()
+    finally:
+        profiling.disable()
+
+    stages = report["stages"]
+    assert stages["tokenise"]["calls"] == 1
+    assert stages["tokenise.tokenize"]["calls"] == 1 and stages["tokenise.stem"]["calls"] == 1
+    assert stages["rank.bm25"]["calls"] == 2 and stages["rank.bm25_field_weighted"]["calls"] == 1
+    outer = stages["rank.bm25_field_weighted"]
+    assert outer["self_sec"] <= outer["total_sec"]
+
+    # one query: the nested per-field rankers add up to its postings
+    queries = report["queries"]
+    assert queries["count"] == 1
+    # title: "taxi" 1 doc; body: "taxi" 1 doc, "game" 3 docs
+    assert queries["postings"] == 1 + 1 + 3
+    slowest = queries["slowest"][0]
+    assert slowest["ranker"] == "rank.bm25_field_weighted" and slowest["query_tokens"] == tokens
+    assert slowest["processing_ms"] > 0
+
+
+def test_reports_are_written():
+    profiling.enable()
+    profiling.reset()
+    try:
+        process_text("arcade game", **PREPROCESSING)
+        with tempfile.TemporaryDirectory() as tmp:
+            json_path = profiling.write_json(os.path.join(tmp, "profile.json"))
+            csv_path = profiling.write_csv(os.path.join(tmp, "profile.csv"))
+            with open(json_path, encoding="utf-8") as f:
+                assert json.load(f)["stages"]["tokenise"]["calls"] == 1
+            with open(csv_path, newline="", encoding="utf-8") as f:
+                rows = list(csv.DictReader(f))
+            assert {row["stage"] for row in rows} >= {"tokenise", "tokenise.tokenize"}
+        assert "tokenise" in profiling.summary()
+    finally:
+        profiling.disable()
+
+
+if __name__ == "__main__":
+    test_disabled_runs_the_original_functions()
+    test_stages_queries_and_postings()
+    test_reports_are_written()
+    print("Profiling tests passed")
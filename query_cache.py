@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import OrderedDict
+
+# -------------------------------
+# QUERY RESULT CACHE
+# -------------------------------
+#
+# Bounded LRU cache of ranked results with a time-to-live. Keys are the processed query
+# tokens (after process_text, so queries differing only in case, punctuation or stopwords
+# share an entry) plus the model, k and ranking parameters.
+#
+# Every lookup passes the version of the index it would be answered from. When the version
+# differs from the one the cached entries were computed against, the whole cache is dropped
+# first, so a result is never served from an index that has since changed.
+#
+# Results are kept as a tuple of (doc_id, score) tuples and that same tuple is handed to
+# every caller, so no caller can change what a later hit returns.
+
+
+# Cache key for one query: token order matters (it decides float summation and tie order)
+def query_key(query_tokens, model, k=None, **params):
+    return tuple(query_tokens), model, k, tuple(sorted(params.items()))
+
+
+class QueryCache:
+    def __init__(self, maxsize=1024, ttl=300.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    # Cached ranking for key, or fn(*args) computed, frozen to a tuple and stored;
+    # version identifies the index
+    def lookup(self, key, version, fn, *args):
+        with self._lock:
+            self._check_version(version)
+            entry = self._data.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires is None or self._clock() < expires:
+                    self.hits += 1
+                    self._data.move_to_end(key)
+                    return value
+                del self._data[key]
+                self.expirations += 1
+            self.misses += 1
+
+        # Computed outside the lock: concurrent misses on one key just compute it twice
+        value = tuple(fn(*args))
+
+        with self._lock:
+            if self._version == version:
+                self._store(key, value)
+        return value
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._data:
+                self.invalidations += 1
+                self._data.clear()
+            self._version = version
+
+    def _store(self, key, value):
+        expires = self._clock() + self.ttl if self.ttl is not None else None
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self):
+        with self._lock:
+            if self._data:
+                self.invalidations += 1
+            self._data.clear()
+
+    def info(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "size": len(self._data),
+            "maxsize": self.maxsize
+        }
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._version = None
+            self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
@@ -0,0 +1,106 @@
+from query_cache import QueryCache, query_key
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _ranker(calls):
+    def rank(tokens):
+        calls.append(tokens)
+        return [(token, 1.0) for token in tokens]
+    return rank
+
+
+def test_repeats_are_served_from_cache():
+    calls = []
+    cache = QueryCache(maxsize=8)
+    rank = _ranker(calls)
+    key = query_key(["toni", "hawk"], "bm25", k=10, k1=1.5, b=0.75)
+
+    first = cache.lookup(key, "v1", rank, ["toni", "hawk"])
+    assert cache.lookup(key, "v1", rank, ["toni", "hawk"]) == first
+    assert len(calls) == 1
+    assert cache.info()["hits"] == 1 and cache.info()["misses"] == 1
+
+    # any parameter is part of the key
+    assert query_key(["toni", "hawk"], "bm25", k=10, b=0.75, k1=1.5) == key
+    assert query_key(["toni", "hawk"], "bm25", k=10, k1=1.2, b=0.75) != key
+    assert query_key(["toni", "hawk"], "tfidf", k=10, k1=1.5, b=0.75) != key
+    assert query_key(["hawk", "toni"], "bm25", k=10, k1=1.5, b=0.75) != key
+
+
+def test_callers_cannot_change_cached_results():
+    calls = []
+    cache = QueryCache()
+    rank = _ranker(calls)
+    key = query_key(["jam", "game"], "bm25", k=10)
+
+    first = cache.lookup(key, "v1", rank, ["jam", "game"])
+    assert first == (("jam", 1.0), ("game", 1.0))
+    try:
+        first.append(("extra", 0.0))
+        assert False
+    except AttributeError:
+        pass
+
+    assert cache.lookup(key, "v1", rank, ["jam", "game"]) == (("jam", 1.0), ("game", 1.0))
+    assert len(calls) == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    calls = []
+    cache = QueryCache(maxsize=2)
+    rank = _ranker(calls)
+
+    for tokens in (["a"], ["b"], ["a"], ["c"]):
+        cache.lookup(query_key(tokens, "bm25"), "v1", rank, tokens)
+    assert cache.info()["evictions"] == 1
+
+    # "b" was the least recently used, "a" survived
+    cache.lookup(query_key(["a"], "bm25"), "v1", rank, ["a"])
+    cache.lookup(query_key(["b"], "bm25"), "v1", rank, ["b"])
+    assert calls == [["a"], ["b"], ["c"], ["b"]]
+
+
+def test_entries_expire():
+    calls = []
+    clock = _Clock()
+    cache = QueryCache(ttl=10, clock=clock)
+    rank = _ranker(calls)
+    key = query_key(["jam"], "bm25")
+
+    cache.lookup(key, "v1", rank, ["jam"])
+    clock.now = 9.9
+    cache.lookup(key, "v1", rank, ["jam"])
+    clock.now = 10.0
+    cache.lookup(key, "v1", rank, ["jam"])
+    assert len(calls) == 2
+    assert cache.info()["expirations"] == 1
+
+
+def test_index_change_invalidates_everything():
+    calls = []
+    cache = QueryCache()
+    rank = _ranker(calls)
+
+    for tokens in (["a"], ["b"]):
+        cache.lookup(query_key(tokens, "bm25"), 1, rank, tokens)
+    cache.lookup(query_key(["a"], "bm25"), 2, rank, ["a"])
+
+    assert calls == [["a"], ["b"], ["a"]]
+    assert cache.info()["invalidations"] == 1
+    assert cache.info()["size"] == 1
+
+
+if __name__ == "__main__":
+    test_repeats_are_served_from_cache()
+    test_callers_cannot_change_cached_results()
+    test_least_recently_used_entry_is_evicted()
+    test_entries_expire()
+    test_index_change_invalidates_everything()
+    print("Query cache tests passed")
@@ -1,29 +1,39 @@
+import heapq
 import math
+from bisect import bisect_left
 from collections import defaultdict
 
 # Precompute document frequency
 def compute_idf(index, num_docs, smooth=False):
 
-# Empty dictionary to store IDF values
-    idf = {}
-
-# Loops over every term in index
-    for term, postings in index.items():
-
-        # Number of documents containing this term
-        df = len(postings)
+# Number of documents containing each term; the formula itself lives in compute_idf_from_df
+# so single-index and sharded IDF cannot drift apart
+    doc_freqs = {term: len(postings) for term, postings in index.items()}
+    return compute_idf_from_df(doc_freqs, num_docs, smooth)
 
+# Same IDF from document frequencies alone (term -> df), e.g. summed over index shards
+def compute_idf_from_df(doc_freqs, num_docs, smooth=False):
+    idf = {}
+    for term, df in doc_freqs.items():
         if smooth:
             # Smoothed IDF
             idf[term] = math.log((num_docs + 1) / (df + 1)) + 1
         else:
             # Original IDF
             idf[term] = math.log(num_docs / df)
-
     return idf
 
-# Ranks documents by TF-IDF relevance to a query
-def rank_documents(query_tokens, index, idf):
+# Returns the k highest-scoring (doc_id, score) pairs, or every pair when k is None.
+# heapq.nlargest is stable, so ties come out in the same order as the full sort
+def top_k(scores, k=None):
+    if k is None:
+        return sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    return heapq.nlargest(k, scores.items(), key=lambda x: x[1])
+
+# Ranks documents by TF-IDF relevance to a query.
+# allowed (anything supporting `doc_id in allowed`, e.g. facets.DocFilter) restricts
+# scoring to those documents; the rest are skipped inside the loop.
+def rank_documents(query_tokens, index, idf, k=None, allowed=None):
 
     # Makes every document start with score = 0
     scores = defaultdict(float)
@@ -35,12 +45,14 @@ def rank_documents(query_tokens, index, idf):
 
         # Looks up the postings list, iterates only over relevant documents
         for doc_id, tf in index[term].items():
+            if allowed is not None and doc_id not in allowed:
+                continue
 
             # Scoring Logic - Each matching term contributes to the document's relevance score
             scores[doc_id] += tf * idf[term]
 
     # sorts by score and highlights score first
-    return sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    return top_k(scores, k)
 
 # Evaluates ranking quality - how accurate the top results are
 def precision_at_k(results, relevant_docs, k):
@@ -49,14 +61,11 @@ def precision_at_k(results, relevant_docs, k):
     if k == 0:
         return 0.0
 
-    # Takes top k results and extracts only document IDs
-    retrieved = [doc_id for doc_id, _ in results[:k]]
-
-    # Finds documents that were both retrieved and relevant
-    relevant_retrieved = set(retrieved) & relevant_docs
+    # Counts relevant documents in the top k (rankings never repeat a document)
+    relevant_retrieved = sum(1 for doc_id, _ in results[:k] if doc_id in relevant_docs)
 
     # Precision formula - number of relevant retrieved docs / total number of retrieved docs
-    return len(relevant_retrieved) / k
+    return relevant_retrieved / k
 
 # How many relevant docs you find
 def recall_at_k(results, relevant_docs, k):
@@ -65,21 +74,19 @@ def recall_at_k(results, relevant_docs, k):
     if not relevant_docs:
         return 0.0
 
-    # Takes top k results and extracts only document IDs
-    retrieved = [doc_id for doc_id, _ in results[:k]]
-
-    # Finds documents that were both retrieved and relevant
-    relevant_retrieved = set(retrieved) & relevant_docs
+    # Counts relevant documents in the top k
+    relevant_retrieved = sum(1 for doc_id, _ in results[:k] if doc_id in relevant_docs)
 
     # Recall formula
-    return len(relevant_retrieved) / len(relevant_docs)
+    return relevant_retrieved / len(relevant_docs)
 
 
-# Computes average document length
+# Computes average document length (doc_lengths is a dict, or an array indexed by integer doc ID)
 def compute_avg_doc_length(doc_lengths):
-    return sum(doc_lengths.values()) / len(doc_lengths)
+    lengths = doc_lengths.values() if hasattr(doc_lengths, "values") else doc_lengths
+    return sum(lengths) / len(doc_lengths)
 
-# Implementing BM25
+# Implementing BM25 (allowed restricts scoring as in rank_documents)
 def rank_documents_bm25(
         query_tokens,
         index,
@@ -87,7 +94,9 @@ def rank_documents_bm25(
         doc_lengths,
         avg_doc_length,
         k1=1.5,
-        b=0.75
+        b=0.75,
+        k=None,
+        allowed=None
 ):
     scores = defaultdict(float)
 
@@ -96,6 +105,8 @@ def rank_documents_bm25(
             continue
 
         for doc_id, tf in index[term].items():
+            if allowed is not None and doc_id not in allowed:
+                continue
             dl = doc_lengths[doc_id]
 
             # Limits the benefit of repeated terms
@@ -104,12 +115,13 @@ def rank_documents_bm25(
 
             scores[doc_id] += idf[term] * (numerator / denominator)
 
-    return sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    return top_k(scores, k)
 
 def _to_score_dict(results):
     return {doc_id: score for doc_id, score in results}
 
-def combine_weighted_rankings(results_a, results_b, w_a=1.0, w_b=1.0):
+# Inputs must be full rankings: a document cut from either list would lose part of its score
+def combine_weighted_rankings(results_a, results_b, w_a=1.0, w_b=1.0, k=None):
     scores = defaultdict(float)
 
     a = _to_score_dict(results_a)
@@ -121,19 +133,227 @@ def combine_weighted_rankings(results_a, results_b, w_a=1.0, w_b=1.0):
     for doc_id, score in b.items():
         scores[doc_id] += w_b * score
 
-    return sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    return top_k(scores, k)
 
 def rank_documents_tfidf_field_weighted(query_tokens, title_index, title_idf, body_index, body_idf,
-                                        w_title=2.0, w_body=1.0):
+                                        w_title=2.0, w_body=1.0, k=None):
     title_results = rank_documents(query_tokens, title_index, title_idf)
     body_results  = rank_documents(query_tokens, body_index,  body_idf)
-    return combine_weighted_rankings(title_results, body_results, w_title, w_body)
+    return combine_weighted_rankings(title_results, body_results, w_title, w_body, k=k)
 
 def rank_documents_bm25_field_weighted(query_tokens, title_index, title_idf, title_lengths, title_avg_dl,
                                        body_index, body_idf, body_lengths, body_avg_dl,
-                                       w_title=2.0, w_body=1.0, k1=1.5, b=0.75):
+                                       w_title=2.0, w_body=1.0, k1=1.5, b=0.75, k=None):
 
     title_results = rank_documents_bm25(query_tokens, title_index, title_idf, title_lengths, title_avg_dl, k1=k1, b=b)
     body_results  = rank_documents_bm25(query_tokens, body_index,  body_idf,  body_lengths,  body_avg_dl,  k1=k1, b=b)
 
-    return combine_weighted_rankings(title_results, body_results, w_title, w_body)
\ No newline at end of file
+    return combine_weighted_rankings(title_results, body_results, w_title, w_body, k=k)
+
+# BM25F over a multi-field index (indexer.build_multifield_index) in one pass over the postings:
+# each field's tf is length-normalised with its own b, weighted, and summed into one pseudo
+# frequency that is saturated once. With a single field of weight 1 this is BM25.
+# b may be one value for every field or a {field: b} dict; idf comes from compute_idf on
+# the multi-field index (df counts documents with the term in any field). Weights are
+# >= 0, and a term found only in fields of weight 0 adds nothing to the document.
+def rank_documents_bm25f(query_tokens, index, idf, field_lengths, field_avg_dl, weights,
+                         k1=1.5, b=0.75, k=None):
+    fields = list(field_lengths)
+    field_b = [b[field] if isinstance(b, dict) else b for field in fields]
+    field_w = [weights.get(field, 0.0) for field in fields]
+    lengths = [field_lengths[field] for field in fields]
+    averages = [field_avg_dl[field] for field in fields]
+
+    scores = defaultdict(float)
+
+    for term in query_tokens:
+        if term not in index:
+            continue
+
+        for doc_id, tfs in index[term].items():
+            pseudo_tf = 0.0
+            for f, tf in enumerate(tfs):
+                if tf and field_w[f]:
+                    norm = 1 - field_b[f] + field_b[f] * (lengths[f][doc_id] / averages[f])
+                    pseudo_tf += field_w[f] * tf / norm
+
+            if pseudo_tf == 0:
+                continue
+            scores[doc_id] += idf[term] * (pseudo_tf * (k1 + 1)) / (pseudo_tf + k1)
+
+    return top_k(scores, k)
+
+# -------------------------------
+# DOCUMENT-AT-A-TIME BM25 WITH MAXSCORE PRUNING
+# -------------------------------
+
+# Highest BM25 contribution each term can make to any document (per query occurrence)
+def compute_max_scores(postings, idf, doc_lengths, avg_doc_length, k1=1.5, b=0.75):
+    max_scores = {}
+
+    for term, (docs, tfs) in postings.items():
+        best = 0.0
+        for d, tf in zip(docs, tfs):
+            numerator = tf * (k1 + 1)
+            denominator = tf + k1 * (1 - b + b * (doc_lengths[d] / avg_doc_length))
+            best = max(best, idf[term] * (numerator / denominator))
+        max_scores[term] = best
+
+    return max_scores
+
+# Re-keys a dict index by dense doc numbers (in doc_lengths order) with sorted postings
+# arrays, and precomputes each term's maximum score for the given k1/b.
+# A compact index (indexer.build_compact_index_bm25) is used as is: pass its doc_names.
+def build_maxscore_index(index, idf, doc_lengths, avg_doc_length, k1=1.5, b=0.75, doc_names=None):
+    postings = {}
+
+    if doc_names is not None:
+        doc_ids = doc_names
+        lengths = doc_lengths
+        for term, docs in index.items():
+            postings[term] = docs.decode()
+    else:
+        doc_ids = list(doc_lengths)
+        numbers = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+        lengths = [doc_lengths[doc_id] for doc_id in doc_ids]
+        for term, docs in index.items():
+            pairs = sorted((numbers[doc_id], tf) for doc_id, tf in docs.items())
+            postings[term] = ([d for d, _ in pairs], [tf for _, tf in pairs])
+
+    return {
+        "doc_ids": doc_ids,
+        "doc_lengths": lengths,
+        "avg_dl": avg_doc_length,
+        "postings": postings,
+        "idf": idf,
+        "max_scores": compute_max_scores(postings, idf, lengths, avg_doc_length, k1, b),
+        "k1": k1,
+        "b": b
+    }
+
+# Same top k as rank_documents_bm25(..., k=k), scored one document at a time.
+# Terms are ordered by maximum score; once the top k is full, the cheapest terms whose
+# bounds together cannot reach the k-th score become non-essential: they only get
+# probed (by binary search) for documents found in the essential terms, and a
+# document is dropped as soon as its bound falls below the threshold.
+# Pass a dict as stats to receive postings_total / postings_scored / postings_skipped.
+def rank_documents_bm25_maxscore(query_tokens, maxscore_index, k=10, stats=None):
+    postings = maxscore_index["postings"]
+    idf = maxscore_index["idf"]
+    max_scores = maxscore_index["max_scores"]
+    lengths = maxscore_index["doc_lengths"]
+    avg_doc_length = maxscore_index["avg_dl"]
+    k1, b = maxscore_index["k1"], maxscore_index["b"]
+
+    # Repeated query terms count once per occurrence, as in rank_documents_bm25
+    terms = []
+    term_numbers = {}
+    query_sequence = []
+    for term in query_tokens:
+        if term not in postings:
+            continue
+        if term not in term_numbers:
+            term_numbers[term] = len(terms)
+            terms.append(term)
+        query_sequence.append(term_numbers[term])
+
+    lists = [postings[term] for term in terms]
+    total = sum(len(docs) for docs, _ in lists)
+    if stats is not None:
+        stats.update({"postings_total": total, "postings_scored": 0, "postings_skipped": total})
+    if not terms or k <= 0:
+        return []
+
+    n = len(terms)
+    weights = [query_sequence.count(i) for i in range(n)]
+    first_positions = [query_sequence.index(i) for i in range(n)]
+    bounds = [weights[i] * max_scores[terms[i]] for i in range(n)]
+
+    # order[j] is the j-th cheapest term; cumulative[j] bounds the score from order[:j]
+    order = sorted(range(n), key=lambda i: bounds[i])
+    cumulative = [0.0]
+    for i in order:
+        cumulative.append(cumulative[-1] + bounds[i])
+
+    def contribution(i, c):
+        docs, tfs = lists[i]
+        tf = tfs[c]
+        numerator = tf * (k1 + 1)
+        denominator = tf + k1 * (1 - b + b * (lengths[docs[c]] / avg_doc_length))
+        return idf[terms[i]] * (numerator / denominator)
+
+    # Bounds are only trusted to prune when clearly below the threshold, so rounding
+    # differences between a bound and an exact score can never drop a tied document
+    def below(bound, threshold):
+        return bound < threshold - 1e-9 * max(1.0, abs(threshold))
+
+    cursors = [0] * n
+    heap = []
+    threshold = float("-inf")
+    first_essential = 0
+    scored = 0
+
+    while True:
+        # Next candidate: the smallest current doc number among the essential terms
+        d = None
+        for j in range(first_essential, n):
+            docs = lists[order[j]][0]
+            c = cursors[order[j]]
+            if c < len(docs) and (d is None or docs[c] < d):
+                d = docs[c]
+        if d is None:
+            break
+
+        found = {}
+        partial = 0.0
+        for j in range(first_essential, n):
+            i = order[j]
+            docs = lists[i][0]
+            c = cursors[i]
+            if c < len(docs) and docs[c] == d:
+                found[i] = contribution(i, c)
+                partial += weights[i] * found[i]
+                scored += 1
+                cursors[i] = c + 1
+
+        # Probe non-essential terms, most valuable first, while the doc can still qualify
+        qualifies = True
+        for j in range(first_essential - 1, -1, -1):
+            if below(partial + cumulative[j + 1], threshold):
+                qualifies = False
+                break
+            i = order[j]
+            docs = lists[i][0]
+            c = bisect_left(docs, d, cursors[i])
+            cursors[i] = c
+            if c < len(docs) and docs[c] == d:
+                found[i] = contribution(i, c)
+                partial += weights[i] * found[i]
+                scored += 1
+        if not qualifies:
+            continue
+
+        # Exact score, summed in query order like the term-at-a-time ranker
+        score = 0.0
+        for i in query_sequence:
+            if i in found:
+                score += found[i]
+
+        # Ties rank like rank_documents_bm25: earliest matching query term, then doc order
+        entry = (score, -min(first_positions[i] for i in found), -d)
+        if len(heap) < k:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+
+        if len(heap) == k:
+            threshold = heap[0][0]
+            while first_essential < n and below(cumulative[first_essential + 1], threshold):
+                first_essential += 1
+
+    if stats is not None:
+        stats["postings_scored"] = scored
+        stats["postings_skipped"] = total - scored
+
+    doc_ids = maxscore_index["doc_ids"]
+    return [(doc_ids[-neg_d], score) for score, _, neg_d in sorted(heap, reverse=True)]
@@ -0,0 +1,247 @@
+from indexer import (
+    build_inverted_index_bm25,
+    build_compact_index_bm25,
+    build_multifield_index,
+    build_field_indexes_streaming,
+    resolve_doc_names,
+    CompressedPostings,
+    StringStore
+)
+from ranker import (
+    compute_idf,
+    compute_avg_doc_length,
+    rank_documents,
+    rank_documents_bm25,
+    rank_documents_bm25_field_weighted,
+    rank_documents_bm25_maxscore,
+    rank_documents_bm25f,
+    build_maxscore_index,
+    top_k
+)
+
+# Small tokenised collection with repeated terms and exact score ties
+DOCS = [
+    {"doc_id": "d1", "title_tokens": ["toni", "hawk"], "tokens": ["toni", "hawk", "downhil", "jam", "game"]},
+    {"doc_id": "d2", "title_tokens": ["london", "taxi"], "tokens": ["london", "taxi", "rush", "hour", "game"]},
+    {"doc_id": "d3", "title_tokens": ["arcad"], "tokens": ["arcad", "game", "game", "atari"]},
+    {"doc_id": "d4", "title_tokens": ["sim", "pet"], "tokens": ["sim", "2", "apart", "pet", "game"]},
+    {"doc_id": "d5", "title_tokens": ["arcad"], "tokens": ["arcad", "game", "game", "atari"]},
+    {"doc_id": "d6", "title_tokens": ["jam"], "tokens": ["jam", "jam", "toni", "atari", "publish"]},
+    {"doc_id": "d7", "title_tokens": [], "tokens": []},
+]
+
+QUERIES = [
+    ["toni", "hawk", "downhil", "jam"],
+    ["game", "publish", "atari"],
+    ["arcad", "game"],
+    ["game", "game", "jam"],
+    ["missing"],
+    [],
+]
+
+
+def build_collection():
+    index, doc_lengths = build_inverted_index_bm25(DOCS)
+    idf = compute_idf(index, len(DOCS), smooth=True)
+    title_index, title_lengths = build_inverted_index_bm25(
+        [{"doc_id": d["doc_id"], "tokens": d["title_tokens"]} for d in DOCS]
+    )
+    title_idf = compute_idf(title_index, len(DOCS), smooth=True)
+    return {
+        "index": index, "idf": idf, "doc_lengths": doc_lengths,
+        "avg_dl": compute_avg_doc_length(doc_lengths),
+        "title_index": title_index, "title_idf": title_idf, "title_lengths": title_lengths,
+        "title_avg_dl": compute_avg_doc_length(title_lengths)
+    }
+
+
+def test_top_k_matches_full_sort():
+    c = build_collection()
+
+    for query in QUERIES:
+        full_tfidf = rank_documents(query, c["index"], c["idf"])
+        full_bm25 = rank_documents_bm25(query, c["index"], c["idf"], c["doc_lengths"], c["avg_dl"])
+        full_fw = rank_documents_bm25_field_weighted(
+            query, c["title_index"], c["title_idf"], c["title_lengths"], c["title_avg_dl"],
+            c["index"], c["idf"], c["doc_lengths"], c["avg_dl"]
+        )
+
+        for k in (0, 1, 2, 3, 10):
+            assert rank_documents(query, c["index"], c["idf"], k=k) == full_tfidf[:k]
+            assert rank_documents_bm25(query, c["index"], c["idf"], c["doc_lengths"], c["avg_dl"], k=k) == \
+                full_bm25[:k]
+            assert rank_documents_bm25_field_weighted(
+                query, c["title_index"], c["title_idf"], c["title_lengths"], c["title_avg_dl"],
+                c["index"], c["idf"], c["doc_lengths"], c["avg_dl"], k=k
+            ) == full_fw[:k]
+
+
+def test_top_k_breaks_ties_by_insertion_order():
+    scores = {"a": 1.0, "b": 2.0, "c": 1.0, "d": 2.0}
+
+    assert top_k(scores, 3) == [("b", 2.0), ("d", 2.0), ("a", 1.0)]
+    assert top_k(scores) == [("b", 2.0), ("d", 2.0), ("a", 1.0), ("c", 1.0)]
+
+
+def test_maxscore_matches_exhaustive_bm25():
+    c = build_collection()
+    maxscore_index = build_maxscore_index(c["index"], c["idf"], c["doc_lengths"], c["avg_dl"])
+
+    for query in QUERIES:
+        for k in (1, 2, 3, 10):
+            stats = {}
+            expected = rank_documents_bm25(query, c["index"], c["idf"], c["doc_lengths"], c["avg_dl"], k=k)
+            assert rank_documents_bm25_maxscore(query, maxscore_index, k=k, stats=stats) == expected
+            assert stats["postings_scored"] + stats["postings_skipped"] == stats["postings_total"]
+
+
+def test_maxscore_skips_postings_that_cannot_reach_top_k():
+    c = build_collection()
+    maxscore_index = build_maxscore_index(c["index"], c["idf"], c["doc_lengths"], c["avg_dl"])
+
+    stats = {}
+    rank_documents_bm25_maxscore(["toni", "game"], maxscore_index, k=1, stats=stats)
+    assert stats["postings_skipped"] > 0
+
+
+def test_compact_index_ranks_like_dict_index():
+    c = build_collection()
+    index, doc_lengths, doc_names = build_compact_index_bm25(DOCS)
+    idf = compute_idf(index, len(DOCS), smooth=True)
+    avg_dl = compute_avg_doc_length(doc_lengths)
+
+    assert idf == c["idf"]
+    assert avg_dl == c["avg_dl"]
+    assert {t: dict(p.items()) for t, p in index.items()} == \
+        {t: {doc_names.index(d): tf for d, tf in p.items()} for t, p in c["index"].items()}
+
+    maxscore_index = build_maxscore_index(index, idf, doc_lengths, avg_dl, doc_names=doc_names)
+    for query in QUERIES:
+        assert resolve_doc_names(rank_documents(query, index, idf), doc_names) == \
+            rank_documents(query, c["index"], c["idf"])
+        assert resolve_doc_names(rank_documents_bm25(query, index, idf, doc_lengths, avg_dl), doc_names) == \
+            rank_documents_bm25(query, c["index"], c["idf"], c["doc_lengths"], c["avg_dl"])
+        assert rank_documents_bm25_maxscore(query, maxscore_index, k=3) == \
+            rank_documents_bm25(query, c["index"], c["idf"], c["doc_lengths"], c["avg_dl"], k=3)
+
+
+def test_streaming_build_matches_dict_index():
+    documents = ({"doc_id": d["doc_id"], "title": d["doc_id"].upper(),
+                  "title_tokens": d["title_tokens"], "body_tokens": d["tokens"]} for d in DOCS)
+    built = build_field_indexes_streaming(documents)
+
+    assert list(built["doc_ids"]) == [d["doc_id"] for d in DOCS]
+    assert built["titles"][2] == "D3" and built["titles"][-1] == "D7"
+
+    for field, key in (("title", "title_tokens"), ("body", "tokens")):
+        expected, lengths = build_inverted_index_bm25([{"doc_id": d["doc_id"], "tokens": d[key]} for d in DOCS])
+        index = built["fields"][field]["index"]
+        # same terms, postings and tfs, in the same order
+        assert list(index) == list(expected)
+        assert {t: dict(resolve_doc_names(p.items(), built["doc_ids"])) for t, p in index.items()} == expected
+        assert list(built["fields"][field]["doc_lengths"]) == list(lengths.values())
+
+
+def test_string_store():
+    store = StringStore(["a.html", "Pokémon Trozei", ""])
+    store.append("London Taxi")
+    assert list(store) == ["a.html", "Pokémon Trozei", "", "London Taxi"]
+    assert len(store) == 4 and store[1] == "Pokémon Trozei" and store[-1] == "London Taxi"
+
+
+def test_compressed_postings_rank_like_uncompressed():
+    index, doc_lengths, doc_names = build_compact_index_bm25(DOCS)
+    compressed, _, _ = build_compact_index_bm25(DOCS, compress=True, block_size=2)
+    idf = compute_idf(index, len(DOCS), smooth=True)
+    avg_dl = compute_avg_doc_length(doc_lengths)
+
+    assert compute_idf(compressed, len(DOCS), smooth=True) == idf
+    for query in QUERIES:
+        assert rank_documents(query, compressed, idf) == rank_documents(query, index, idf)
+        assert rank_documents_bm25(query, compressed, idf, doc_lengths, avg_dl) == \
+            rank_documents_bm25(query, index, idf, doc_lengths, avg_dl)
+
+
+def test_compressed_postings_skip_blocks():
+    doc_ids = [0, 3, 4, 130, 131, 70000, 2**31]
+    tfs = [1, 2, 200, 1, 3, 2**20, 9]
+    postings = CompressedPostings(doc_ids, tfs, block_size=2)
+
+    assert list(postings.items()) == list(zip(doc_ids, tfs))
+    assert list(postings.block_last) == [3, 130, 70000, 2**31]
+    assert postings.next_geq(5) == (130, 1)
+    assert postings.next_geq(2**31 + 1) is None
+    assert postings[70000] == 2**20
+    assert 132 not in postings
+
+
+def test_vector_engine_matches_rankers():
+    import vector_engine
+
+    c = build_collection()
+    engine = vector_engine.build_engine(c["index"], c["idf"], c["doc_lengths"], c["avg_dl"])
+    for k in (1, 3, None):
+        expected = [rank_documents_bm25(q, c["index"], c["idf"], c["doc_lengths"], c["avg_dl"], k=k)
+                    for q in QUERIES]
+        assert vector_engine.rank_batch(engine, QUERIES, k=k, batch_size=2) == expected
+        # Chunks cut by gathered postings rather than query count, down to one query each
+        assert vector_engine.rank_batch(engine, QUERIES, k=k, max_postings=1) == expected
+
+    vector_engine.set_weights(engine, c["idf"], c["avg_dl"], model="tfidf")
+    assert vector_engine.rank_batch(engine, QUERIES, k=3) == \
+        [rank_documents(q, c["index"], c["idf"], k=3) for q in QUERIES]
+
+
+def test_bm25f_with_one_field_is_bm25():
+    c = build_collection()
+    index, field_lengths = build_multifield_index([{"doc_id": d["doc_id"], "body_tokens": d["tokens"]} for d in DOCS],
+                                                  fields=("body",))
+    avg_dl = {"body": c["avg_dl"]}
+
+    for query in QUERIES:
+        actual = rank_documents_bm25f(query, index, c["idf"], field_lengths, avg_dl, {"body": 1.0})
+        expected = rank_documents_bm25(query, c["index"], c["idf"], c["doc_lengths"], c["avg_dl"])
+        assert [doc_id for doc_id, _ in actual] == [doc_id for doc_id, _ in expected]
+        assert all(abs(a - e) < 1e-9 for (_, a), (_, e) in zip(actual, expected))
+
+
+def test_bm25f_weights_title_matches():
+    index, field_lengths = build_multifield_index(
+        [{"doc_id": d["doc_id"], "title_tokens": d["title_tokens"], "body_tokens": d["tokens"]} for d in DOCS]
+    )
+    idf = compute_idf(index, len(DOCS), smooth=True)
+    avg_dl = {field: compute_avg_doc_length(lengths) for field, lengths in field_lengths.items()}
+    query = ["jam"]
+
+    # d6 has "jam" in its title; d1 only in its body
+    body_only = rank_documents_bm25f(query, index, idf, field_lengths, avg_dl, {"title": 0.0, "body": 1.0})
+    title_heavy = rank_documents_bm25f(query, index, idf, field_lengths, avg_dl, {"title": 5.0, "body": 1.0}, k=1)
+    assert [doc_id for doc_id, _ in body_only] == ["d6", "d1"]
+    assert title_heavy[0][0] == "d6"
+    assert title_heavy[0][1] > body_only[0][1]
+
+    # A term found only in a field of weight 0 adds nothing, so k1 = 0 cannot divide by zero
+    index, field_lengths = build_multifield_index([
+        {"doc_id": "t", "title_tokens": ["hawk"], "body_tokens": ["game"]},
+        {"doc_id": "u", "title_tokens": ["game"], "body_tokens": ["hawk", "game"]}
+    ])
+    idf = compute_idf(index, 2, smooth=True)
+    avg_dl = {field: compute_avg_doc_length(lengths) for field, lengths in field_lengths.items()}
+    results = rank_documents_bm25f(["hawk"], index, idf, field_lengths, avg_dl, {"title": 0.0, "body": 1.0}, k1=0.0)
+    assert [doc_id for doc_id, _ in results] == ["u"] and abs(results[0][1] - idf["hawk"]) < 1e-12
+
+
+if __name__ == "__main__":
+    test_top_k_matches_full_sort()
+    test_top_k_breaks_ties_by_insertion_order()
+    test_maxscore_matches_exhaustive_bm25()
+    test_maxscore_skips_postings_that_cannot_reach_top_k()
+    test_compact_index_ranks_like_dict_index()
+    test_streaming_build_matches_dict_index()
+    test_string_store()
+    test_compressed_postings_rank_like_uncompressed()
+    test_compressed_postings_skip_blocks()
+    test_vector_engine_matches_rankers()
+    test_bm25f_with_one_field_is_bm25()
+    test_bm25f_weights_title_matches()
+    print("Ranker tests passed")
@@ -0,0 +1,420 @@
+import json
+import math
+import threading
+from collections import Counter
+from pathlib import Path
+
+from parser import parse_html_file
+from tokeniser import process_text
+from indexer import build_inverted_index_bm25
+from ranker import compute_idf, rank_documents, rank_documents_bm25
+from index_store import BASE_DIR, DATA_DIR, FIELDS, preprocessing_config, write_index, open_index
+from incremental import scan_changes, file_entry
+
+# -------------------------------
+# SEGMENTED INDEX
+# -------------------------------
+#
+# New documents go into small immutable segments instead of one growing index. A search
+# runs over every segment of a snapshot with collection-wide statistics (document count,
+# df, avg_dl), so it scores exactly like one monolithic index over the same documents.
+#
+# Deleting or replacing a document only records a tombstone against the segment holding
+# it. A merge policy (size tiers, as in a log-structured store) combines runs of adjacent
+# segments of the same tier and drops tombstoned documents while doing so; it can run in
+# a background thread. Writers publish a new Snapshot (segments + tombstones) in one
+# assignment, so a reader that took a snapshot never sees a half-applied merge.
+#
+# Documents are ranked in the order they were added (oldest segment first). Merges only
+# combine adjacent segments, so that order - and with it tie-breaking - never changes.
+
+SEGMENTS_DIR = BASE_DIR / "data" / "segments"
+MANIFEST_NAME = "segments.json"
+
+MERGE_FACTOR = 4
+MIN_SEGMENT_SIZE = 16
+
+
+class Segment:
+    def __init__(self, name, doc_ids, titles, fields, path=None):
+        self.name = name
+        self.doc_ids = doc_ids
+        self.titles = titles
+        # field -> {"index": term -> {doc_id: tf}, "doc_lengths": doc_id -> length}
+        self.fields = fields
+        self.path = path
+        self.total_lengths = {field: sum(data["doc_lengths"].values()) for field, data in fields.items()}
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    # In-memory segment from tokenised documents (doc_id, title, <field>_tokens)
+    @classmethod
+    def from_documents(cls, name, documents, fields=FIELDS):
+        data = {}
+        for field in fields:
+            index, doc_lengths = build_inverted_index_bm25(
+                [{"doc_id": d["doc_id"], "tokens": d.get(f"{field}_tokens", [])} for d in documents]
+            )
+            data[field] = {"index": dict(index), "doc_lengths": doc_lengths}
+        return cls(name, [d["doc_id"] for d in documents], {d["doc_id"]: d["title"] for d in documents}, data)
+
+    # Memory-mapped segment written by write()
+    @classmethod
+    def open(cls, path, preprocessing=None):
+        store = open_index(path, preprocessing)
+        fields = {
+            field: {"index": data["index"], "doc_lengths": data["doc_lengths"]}
+            for field, data in store["fields"].items()
+        }
+        return cls(Path(path).stem, list(store["doc_titles"]), store["doc_titles"], fields, Path(path))
+
+    # Tokenised documents back out of the postings, skipping the given doc_ids (for merges)
+    def documents(self, skip=()):
+        counts = {doc_id: {field: Counter() for field in self.fields} for doc_id in self.doc_ids if doc_id not in skip}
+        for field, data in self.fields.items():
+            for term, postings in data["index"].items():
+                for doc_id, tf in postings.items():
+                    if doc_id in counts:
+                        counts[doc_id][field][term] = tf
+
+        return [
+            dict({"doc_id": doc_id, "title": self.titles[doc_id]},
+                 **{f"{field}_tokens": list(c.elements()) for field, c in counts[doc_id].items()})
+            for doc_id in self.doc_ids if doc_id in counts
+        ]
+
+    def write(self, path, preprocessing=None):
+        write_index(path, self.documents(), preprocessing)
+        return Segment.open(path, preprocessing)
+
+
+# An immutable view of the index: segments oldest first, plus each one's tombstones
+class Snapshot:
+    def __init__(self, segments, deleted, version=0):
+        # Increases with every published change (e.g. for query_cache.QueryCache)
+        self.version = version
+        self.segments = tuple(segments)
+        self.deleted = {segment.name: frozenset(deleted.get(segment.name, ())) for segment in self.segments}
+        self.num_docs = sum(len(segment) - len(self.deleted[segment.name]) for segment in self.segments)
+
+        self.total_lengths = {}
+        for segment in self.segments:
+            for field, data in segment.fields.items():
+                dead = sum(data["doc_lengths"][doc_id] for doc_id in self.deleted[segment.name])
+                self.total_lengths[field] = self.total_lengths.get(field, 0) + segment.total_lengths[field] - dead
+
+    def avg_doc_length(self, field="body"):
+        return self.total_lengths.get(field, 0) / self.num_docs if self.num_docs else 0.0
+
+    # Live postings for the query terms, merged across segments in document order, with the
+    # doc lengths they need; compute_idf over these gives the collection-wide (smoothed) IDF
+    def query_view(self, query_tokens, field="body"):
+        index, doc_lengths = {}, {}
+        for term in dict.fromkeys(query_tokens):
+            postings = {}
+            for segment in self.segments:
+                segment_postings = segment.fields[field]["index"].get(term)
+                if not segment_postings:
+                    continue
+                deleted = self.deleted[segment.name]
+                lengths = segment.fields[field]["doc_lengths"]
+                for doc_id, tf in segment_postings.items():
+                    if doc_id not in deleted:
+                        postings[doc_id] = tf
+                        doc_lengths[doc_id] = lengths[doc_id]
+            if postings:
+                index[term] = postings
+        return index, doc_lengths
+
+    def search(self, query_tokens, model="bm25", field="body", k=10, k1=1.5, b=0.75):
+        index, doc_lengths = self.query_view(query_tokens, field)
+        idf = compute_idf(index, self.num_docs, smooth=True)
+        if model == "tfidf":
+            return rank_documents(query_tokens, index, idf, k=k)
+        if model != "bm25":
+            raise ValueError(f"Unknown model: {model!r} (expected 'bm25' or 'tfidf')")
+        return rank_documents_bm25(query_tokens, index, idf, doc_lengths, self.avg_doc_length(field), k1, b, k=k)
+
+    def doc_titles(self):
+        titles = {}
+        for segment in self.segments:
+            deleted = self.deleted[segment.name]
+            titles.update((doc_id, title) for doc_id, title in segment.titles.items() if doc_id not in deleted)
+        return titles
+
+
+# Size tier of a segment: 0 below MIN_SEGMENT_SIZE live docs, then one tier per MERGE_FACTOR
+def segment_tier(live_docs, merge_factor=MERGE_FACTOR, min_size=MIN_SEGMENT_SIZE):
+    if live_docs < min_size:
+        return 0
+    return 1 + int(math.log(live_docs / min_size, merge_factor))
+
+
+class SegmentedIndex:
+    def __init__(self, path=None, preprocessing=None, fields=FIELDS, merge_factor=MERGE_FACTOR,
+                 min_segment_size=MIN_SEGMENT_SIZE):
+        # path=None keeps every segment in memory; otherwise segments are index files under path
+        self.path = Path(path) if path is not None else None
+        self.preprocessing = preprocessing_config(preprocessing)
+        self.fields = tuple(fields)
+        self.merge_factor = merge_factor
+        self.min_segment_size = min_segment_size
+
+        # file name -> [size, mtime_ns, sha1] of indexed pages (see sync)
+        self.files = {}
+        self._next_segment = 0
+        self._live = {}
+        self._snapshot = Snapshot([], {})
+        self._lock = threading.Lock()
+        self._merge_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._merger = None
+
+        if self.path is not None:
+            self._load()
+
+    # The current consistent view; keep using one snapshot for a whole query
+    def snapshot(self):
+        return self._snapshot
+
+    # Builds (and writes) a segment without touching the published state
+    def _new_segment(self, documents):
+        with self._lock:
+            name = f"segment_{self._next_segment:06d}"
+            self._next_segment += 1
+
+        segment = Segment.from_documents(name, documents, self.fields)
+        if self.path is not None:
+            segment = segment.write(self.path / f"{name}.idx", self.preprocessing)
+        return segment
+
+    # Called with the writer lock held: tombstones doc_ids, appends segment (if any) with
+    # earlier versions of its doc_ids tombstoned, and publishes the result once
+    def _apply(self, segment=None, deleted_ids=()):
+        current = self._snapshot
+        deleted = {s.name: set(current.deleted[s.name]) for s in current.segments}
+        for doc_id in deleted_ids:
+            name = self._live.pop(doc_id, None)
+            if name is not None:
+                deleted[name].add(doc_id)
+
+        segments = list(current.segments)
+        if segment is not None:
+            for doc_id in segment.doc_ids:
+                if doc_id in self._live:
+                    deleted[self._live[doc_id]].add(doc_id)
+                self._live[doc_id] = segment.name
+            segments.append(segment)
+        self._publish(segments, deleted)
+
+    # Writes documents as one new segment; earlier versions of the same doc_ids are tombstoned
+    def add_documents(self, documents):
+        documents = list(documents)
+        if not documents:
+            return None
+
+        segment = self._new_segment(documents)
+        with self._lock:
+            self._apply(segment)
+
+        self._wake.set()
+        return segment
+
+    # Tombstones documents; the space is reclaimed when their segment is next merged
+    def delete_documents(self, doc_ids):
+        with self._lock:
+            self._apply(deleted_ids=doc_ids)
+        self._wake.set()
+
+    # First run of merge_factor adjacent segments in the same tier, or None
+    def _pick_merge(self, snapshot):
+        tiers = [
+            segment_tier(len(s) - len(snapshot.deleted[s.name]), self.merge_factor, self.min_segment_size)
+            for s in snapshot.segments
+        ]
+        start = 0
+        for i in range(1, len(tiers) + 1):
+            if i == len(tiers) or tiers[i] != tiers[start]:
+                if i - start >= self.merge_factor:
+                    return start, start + self.merge_factor
+                start = i
+        return None
+
+    # Performs one merge if the policy asks for one; returns True if it merged
+    def maybe_merge(self):
+        with self._merge_lock:
+            snapshot = self._snapshot
+            picked = self._pick_merge(snapshot)
+            if picked is None:
+                return False
+
+            # The expensive part runs without the writer lock: readers and writers carry on
+            first, last = picked
+            inputs = snapshot.segments[first:last]
+            documents = []
+            for segment in inputs:
+                documents.extend(segment.documents(skip=snapshot.deleted[segment.name]))
+
+            with self._lock:
+                name = f"segment_{self._next_segment:06d}"
+                self._next_segment += 1
+            merged = Segment.from_documents(name, documents, self.fields)
+            if self.path is not None:
+                merged = merged.write(self.path / f"{name}.idx", self.preprocessing)
+
+            with self._lock:
+                current = self._snapshot
+                deleted = {s.name: set(current.deleted[s.name]) for s in current.segments}
+                # Tombstones that arrived during the merge move to the merged segment
+                deleted[name] = set()
+                for segment in inputs:
+                    deleted[name].update(deleted.pop(segment.name) - snapshot.deleted[segment.name])
+                for doc_id in merged.doc_ids:
+                    if doc_id not in deleted[name]:
+                        self._live[doc_id] = name
+
+                # Only the merger removes segments, so the inputs are still adjacent here
+                position = current.segments.index(inputs[0])
+                segments = list(current.segments)
+                segments[position:position + len(inputs)] = [merged]
+                self._publish(segments, deleted)
+
+            # Snapshots still holding the old segments keep their memory maps (POSIX unlink)
+            for segment in inputs:
+                if segment.path is not None:
+                    try:
+                        segment.path.unlink()
+                    except OSError:
+                        pass
+            return True
+
+    def merge_all(self):
+        merges = 0
+        while self.maybe_merge():
+            merges += 1
+        return merges
+
+    # Background merging: wakes up after every write, or every `interval` seconds
+    def start_merging(self, interval=1.0):
+        if self._merger is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                self._wake.wait(interval)
+                self._wake.clear()
+                self.merge_all()
+
+        self._merger = threading.Thread(target=run, name="segment-merger", daemon=True)
+        self._merger.start()
+
+    def stop_merging(self):
+        if self._merger is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._merger.join()
+        self._merger = None
+
+    # Indexes new and changed pages of a directory as one segment and tombstones removed ones
+    def sync(self, directory=DATA_DIR, use_hash=False):
+        directory = Path(directory)
+        if not directory.exists():
+            print(f"[ERROR] Directory not found: {directory}")
+            return {"added": [], "modified": [], "deleted": [], "touched": []}
+
+        with self._lock:
+            changes = scan_changes(directory, dict(self.files), use_hash)
+        if not any(changes.values()):
+            return changes
+
+        # Parse and write the new segment first; self.files and the snapshot then change
+        # together under the writer lock, so the manifest the merger saves is never half-updated
+        documents = []
+        entries = {}
+        for name in changes["added"] + changes["modified"]:
+            doc = parse_html_file(directory / name)
+            for field in self.fields:
+                doc[f"{field}_tokens"] = process_text(doc[field], **self.preprocessing)
+            documents.append(doc)
+            entries[name] = file_entry(directory / name)
+        touched = {name: file_entry(directory / name)[:2] for name in changes["touched"]}
+        segment = self._new_segment(documents) if documents else None
+
+        with self._lock:
+            for name in changes["deleted"]:
+                self.files.pop(name, None)
+            self.files.update(entries)
+            for name, stat in touched.items():
+                self.files[name] = stat + self.files[name][2:]
+            # One publish (and manifest write) for deletes, touches and the new segment alike
+            self._apply(segment, changes["deleted"])
+
+        self._wake.set()
+        return changes
+
+    # Called with the writer lock held
+    def _publish(self, segments, deleted):
+        snapshot = Snapshot(segments, deleted, self._snapshot.version + 1)
+        if self.path is not None:
+            self._save_manifest(snapshot)
+        self._snapshot = snapshot
+
+    def _save_manifest(self, snapshot):
+        manifest = {
+            "preprocessing": self.preprocessing,
+            "next_segment": self._next_segment,
+            "segments": [segment.name for segment in snapshot.segments],
+            "deleted": {name: sorted(ids) for name, ids in snapshot.deleted.items() if ids},
+            "files": self.files
+        }
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path / (MANIFEST_NAME + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        tmp_path.replace(self.path / MANIFEST_NAME)
+
+    def _load(self):
+        manifest_path = self.path / MANIFEST_NAME
+        if not manifest_path.exists():
+            return
+
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest["preprocessing"] != self.preprocessing:
+            raise ValueError(f"{manifest_path} was built with preprocessing {manifest['preprocessing']}, "
+                             f"expected {self.preprocessing}")
+
+        self._next_segment = manifest["next_segment"]
+        self.files = manifest["files"]
+        segments = [Segment.open(self.path / f"{name}.idx", self.preprocessing) for name in manifest["segments"]]
+        deleted = {name: set(ids) for name, ids in manifest["deleted"].items()}
+        for segment in segments:
+            for doc_id in segment.doc_ids:
+                if doc_id not in deleted.get(segment.name, ()):
+                    self._live[doc_id] = segment.name
+        self._snapshot = Snapshot(segments, deleted)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Add new and changed pages to the segmented index")
+    arg_parser.add_argument("--data", default=DATA_DIR, help="directory of .html documents")
+    arg_parser.add_argument("--segments", default=SEGMENTS_DIR, help="directory holding the segment files")
+    arg_parser.add_argument("--hash", action="store_true", help="re-hash every file instead of trusting mtimes")
+    arg_parser.add_argument("--merge", action="store_true", help="run every merge the policy asks for")
+    args = arg_parser.parse_args()
+
+    segmented = SegmentedIndex(args.segments)
+    changes = segmented.sync(args.data, use_hash=args.hash)
+    print(f"Added: {len(changes['added'])}, modified: {len(changes['modified'])}, "
+          f"deleted: {len(changes['deleted'])}")
+    if args.merge:
+        print(f"Merges: {segmented.merge_all()}")
+
+    snapshot = segmented.snapshot()
+    print(f"Documents: {snapshot.num_docs}, segments: {[len(s) for s in snapshot.segments]}")
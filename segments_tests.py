@@ -0,0 +1,148 @@
+import os
+import random
+import tempfile
+from pathlib import Path
+
+from segments import SegmentedIndex
+from indexer import build_inverted_index_bm25
+from ranker import compute_idf, compute_avg_doc_length, rank_documents, rank_documents_bm25
+
+PREPROCESSING = {"use_stopwords": False, "use_stemming": True, "use_lemmatization": False, "tokenizer": "regex"}
+VOCABULARY = ["toni", "hawk", "jam", "game", "arcad", "atari", "taxi", "london", "sim", "pet", "puzzl", "race"]
+QUERIES = [["jam", "game"], ["taxi"], ["arcad", "atari", "game"], ["puzzl", "race", "race"], ["missing"]]
+
+
+def _random_doc(rnd, doc_id):
+    return {
+        "doc_id": doc_id,
+        "title": doc_id,
+        "title_tokens": rnd.choices(VOCABULARY, k=rnd.randint(0, 3)),
+        "body_tokens": rnd.choices(VOCABULARY, k=rnd.randint(0, 12))
+    }
+
+
+# Monolithic index over the live documents, in the order they were (last) added
+def _monolithic(live, field="body"):
+    streams = [{"doc_id": doc_id, "tokens": doc[f"{field}_tokens"]} for doc_id, doc in live.items()]
+    index, doc_lengths = build_inverted_index_bm25(streams)
+    avg_dl = compute_avg_doc_length(doc_lengths) if doc_lengths else 0.0
+    return index, compute_idf(index, len(streams), smooth=True), doc_lengths, avg_dl
+
+
+def _assert_same_rankings(snapshot, live):
+    for field in ("title", "body"):
+        index, idf, doc_lengths, avg_dl = _monolithic(live, field)
+        for query in QUERIES:
+            for k in (3, None):
+                assert snapshot.search(query, field=field, k=k) == \
+                    rank_documents_bm25(query, index, idf, doc_lengths, avg_dl, k=k)
+                assert snapshot.search(query, model="tfidf", field=field, k=k) == \
+                    rank_documents(query, index, idf, k=k)
+    assert snapshot.num_docs == len(live)
+
+
+def _random_workload(segmented, rnd, rounds=30):
+    live = {}
+    next_id = 0
+    for _ in range(rounds):
+        batch = []
+        for _ in range(rnd.randint(1, 6)):
+            batch.append(_random_doc(rnd, f"doc{next_id}"))
+            next_id += 1
+        # replace a few existing documents
+        for doc_id in rnd.sample(sorted(live), min(2, len(live))):
+            batch.append(_random_doc(rnd, doc_id))
+        segmented.add_documents(batch)
+        for doc in batch:
+            live.pop(doc["doc_id"], None)
+            live[doc["doc_id"]] = doc
+
+        deleted = rnd.sample(sorted(live), min(rnd.randint(0, 2), len(live)))
+        segmented.delete_documents(deleted)
+        for doc_id in deleted:
+            del live[doc_id]
+
+        yield live
+
+
+def test_segmented_ranks_like_monolithic():
+    rnd = random.Random(7)
+    segmented = SegmentedIndex(merge_factor=3, min_segment_size=4)
+
+    for step, live in enumerate(_random_workload(segmented, rnd)):
+        _assert_same_rankings(segmented.snapshot(), live)
+        if step % 4 == 3:
+            segmented.merge_all()
+            _assert_same_rankings(segmented.snapshot(), live)
+
+    # merging reclaims tombstoned documents
+    assert len(segmented.snapshot().segments) < 30
+    assert sum(len(s) for s in segmented.snapshot().segments) < 30 * 8
+
+
+def test_snapshot_is_unchanged_by_later_merges_and_writes():
+    rnd = random.Random(3)
+    segmented = SegmentedIndex(merge_factor=2, min_segment_size=4)
+    live = {}
+    for live in _random_workload(segmented, rnd, rounds=8):
+        pass
+
+    before = segmented.snapshot()
+    expected = {tuple(q): before.search(q, k=None) for q in QUERIES}
+    segmented.merge_all()
+    segmented.add_documents([_random_doc(rnd, "late")])
+    segmented.delete_documents(list(live)[:3])
+
+    assert segmented.snapshot() is not before
+    assert {tuple(q): before.search(q, k=None) for q in QUERIES} == expected
+
+
+def test_background_merging_and_reopen():
+    rnd = random.Random(11)
+    with tempfile.TemporaryDirectory() as tmp:
+        segmented = SegmentedIndex(tmp, merge_factor=3, min_segment_size=4)
+        segmented.start_merging(interval=0.01)
+        live = {}
+        for live in _random_workload(segmented, rnd, rounds=20):
+            _assert_same_rankings(segmented.snapshot(), live)
+        segmented.stop_merging()
+        segmented.merge_all()
+
+        reopened = SegmentedIndex(tmp, merge_factor=3, min_segment_size=4)
+        assert [s.name for s in reopened.snapshot().segments] == [s.name for s in segmented.snapshot().segments]
+        _assert_same_rankings(reopened.snapshot(), live)
+
+
+def test_delete_and_touch_only_sync_is_saved():
+    pages = {
+        "a.html": "<title>Tony Hawk</title><p>downhill jam skate game</p>",
+        "b.html": "<title>London Taxi</title><p>taxi rush hour</p>",
+        "c.html": "<title>Arcade Classics</title><p>arcade game atari</p>"
+    }
+    with tempfile.TemporaryDirectory() as data, tempfile.TemporaryDirectory() as tmp:
+        for name, html in pages.items():
+            (Path(data) / name).write_text(html, encoding="utf-8")
+        segmented = SegmentedIndex(tmp, PREPROCESSING)
+        segmented.sync(data)
+
+        # Nothing added: b.html removed, c.html touched (same content, newer mtime)
+        (Path(data) / "b.html").unlink()
+        stat = (Path(data) / "c.html").stat()
+        os.utime(Path(data) / "c.html", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        changes = segmented.sync(data)
+        assert (changes["added"], changes["modified"], changes["deleted"], changes["touched"]) == \
+            ([], [], ["b.html"], ["c.html"])
+        assert segmented.snapshot().num_docs == 2
+
+        reopened = SegmentedIndex(tmp, PREPROCESSING)
+        assert sorted(reopened.files) == ["a.html", "c.html"]
+        assert reopened.snapshot().num_docs == 2
+        assert reopened.sync(data) == {"added": [], "modified": [], "deleted": [], "touched": []}
+
+
+if __name__ == "__main__":
+    test_segmented_ranks_like_monolithic()
+    test_snapshot_is_unchanged_by_later_merges_and_writes()
+    test_background_merging_and_reopen()
+    test_delete_and_touch_only_sync_is_saved()
+    print("Segment tests passed")
@@ -0,0 +1,342 @@
+import asyncio
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlsplit
+
+from tokeniser import TOKENIZERS, process_text
+from ranker import (
+    rank_documents,
+    rank_documents_bm25,
+    rank_documents_bm25_field_weighted,
+    rank_documents_bm25_maxscore,
+    rank_documents_bm25f
+)
+from index_store import DATA_DIR, INDEX_PATH, BM25_PARAMS, open_index, open_or_build_index
+from query_cache import QueryCache, query_key
+
+# -------------------------------
+# ASYNCIO JSON SEARCH SERVICE
+# -------------------------------
+#
+# GET  /search?q=...&model=bm25&k=10&k1=1.5&b=0.75&w_title=2&w_body=1
+# POST /search  {"query": "...", "model": "field-weighted", "k": 10, "w_title": 3.0}
+#
+# Models: tfidf, bm25 (body field), field-weighted (merged title and body BM25 rankings)
+# and bm25f (both fields in one BM25F score); w_title / w_body apply to the last two.
+# GET  /health
+#
+# The event loop only parses HTTP and JSON. Tokenising and scoring run in an executor:
+# worker processes by default, each memory-mapping the same index file (the pages are
+# shared, so N workers cost about one index in RAM), or threads with --workers 0.
+# A semaphore bounds how many queries are in flight; a request that cannot get a slot
+# or an answer within its timeout gets 503 / 504 instead of piling up.
+
+MODELS = ("tfidf", "bm25", "field-weighted", "bm25f")
+# Models that take w_title / w_body
+WEIGHTED_MODELS = ("field-weighted", "bm25f")
+DEFAULT_PARAMS = {"model": "bm25", "k": 10, "k1": BM25_PARAMS["k1"], "b": BM25_PARAMS["b"],
+                  "w_title": 2.0, "w_body": 1.0}
+MAX_K = 1000
+MAX_BODY = 64 * 1024
+
+HOST = "127.0.0.1"
+PORT = 8080
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable", 504: "Gateway Timeout"}
+
+# The index used by _search(): set in each worker process, or in this process for threads
+_STORE = None
+# Ranked results per processed query and parameters (one per worker process)
+QUERY_CACHE = QueryCache(maxsize=4096, ttl=600)
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# Validates a query request (JSON body or query string) into search parameters
+def parse_search_request(payload):
+    query = payload.get("query", payload.get("q"))
+    if not isinstance(query, str) or not query.strip():
+        raise RequestError(400, "'query' must be a non-empty string")
+
+    params = dict(DEFAULT_PARAMS)
+    params["query"] = query
+    if "model" in payload:
+        params["model"] = payload["model"]
+    if params["model"] not in MODELS:
+        raise RequestError(400, f"'model' must be one of {MODELS}")
+
+    try:
+        if "k" in payload:
+            params["k"] = int(payload["k"])
+        for name in ("k1", "b", "w_title", "w_body"):
+            if name in payload:
+                params[name] = float(payload[name])
+    except (TypeError, ValueError, OverflowError) as e:
+        raise RequestError(400, f"bad numeric parameter: {e}")
+
+    for name in ("k1", "b", "w_title", "w_body"):
+        if not math.isfinite(params[name]):
+            raise RequestError(400, f"'{name}' must be a finite number")
+    if not 1 <= params["k"] <= MAX_K:
+        raise RequestError(400, f"'k' must be between 1 and {MAX_K}")
+    if params["k1"] < 0 or not 0 <= params["b"] <= 1:
+        raise RequestError(400, "'k1' must be >= 0 and 'b' between 0 and 1")
+    if params["w_title"] < 0 or params["w_body"] < 0:
+        raise RequestError(400, "'w_title' and 'w_body' must be >= 0")
+    return params
+
+
+def set_store(store):
+    global _STORE
+    _STORE = store
+
+
+def _init_worker(path, preprocessing):
+    set_store(open_index(path, preprocessing))
+
+
+# Tokenises and scores one query against _STORE; runs in the executor
+def _search(params):
+    store = _STORE
+    start = time.perf_counter()
+    query_tokens = process_text(params["query"], **store["preprocessing"])
+    model, k, k1, b = params["model"], params["k"], params["k1"], params["b"]
+    key = query_key(query_tokens, model, k, k1=k1, b=b,
+                    **({"w_title": params["w_title"], "w_body": params["w_body"]} if model in WEIGHTED_MODELS else {}))
+
+    computed = []
+
+    def rank():
+        computed.append(True)
+        return _rank(store, query_tokens, params)
+
+    results = QUERY_CACHE.lookup(key, store["version"], rank)
+
+    titles = store["doc_titles"]
+    return {
+        "query": params["query"],
+        "tokens": query_tokens,
+        "model": model,
+        "cached": not computed,
+        "results": [{"doc_id": doc_id, "title": titles.get(doc_id, ""), "score": score}
+                    for doc_id, score in results],
+        "elapsed_ms": (time.perf_counter() - start) * 1000
+    }
+
+
+def _rank(store, query_tokens, params):
+    title, body = store["fields"]["title"], store["fields"]["body"]
+    model, k, k1, b = params["model"], params["k"], params["k1"], params["b"]
+
+    if model == "tfidf":
+        return rank_documents(query_tokens, body["index"], body["idf"], k=k)
+    if model == "field-weighted":
+        return rank_documents_bm25_field_weighted(
+            query_tokens, title["index"], title["idf"], title["doc_lengths"], title["avg_dl"],
+            body["index"], body["idf"], body["doc_lengths"], body["avg_dl"],
+            w_title=params["w_title"], w_body=params["w_body"], k1=k1, b=b, k=k
+        )
+    if model == "bm25f":
+        multifield = store["multifield"]
+        return rank_documents_bm25f(
+            query_tokens, multifield["index"], multifield["idf"], multifield["field_lengths"],
+            multifield["field_avg_dl"], {"title": params["w_title"], "body": params["w_body"]}, k1=k1, b=b, k=k
+        )
+    if k1 == body["maxscore_index"]["k1"] and b == body["maxscore_index"]["b"]:
+        # The stored maximum scores are only valid for the parameters they were built with
+        return rank_documents_bm25_maxscore(query_tokens, body["maxscore_index"], k=k)
+    return rank_documents_bm25(query_tokens, body["index"], body["idf"], body["doc_lengths"],
+                               body["avg_dl"], k1, b, k=k)
+
+
+class SearchServer:
+    def __init__(self, executor, max_concurrency=64, timeout=5.0, num_docs=None):
+        self.executor = executor
+        self.timeout = timeout
+        self.num_docs = num_docs
+        self.max_concurrency = max_concurrency
+        self._slots = None
+        self._server = None
+        self.stats = {"requests": 0, "ok": 0, "errors": 0, "rejected": 0, "timeouts": 0}
+
+    async def start(self, host=HOST, port=PORT):
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "malformed request line"}, False)
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get("content-length", 0) or 0)
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "bad Content-Length"}, False)
+                    break
+                if length > MAX_BODY:
+                    await self._respond(writer, 413, {"error": "request body too large"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                status, payload = await self._dispatch(method, target, body)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, target, body):
+        url = urlsplit(target)
+        if url.path == "/health":
+            return 200, {"status": "ok", "documents": self.num_docs, **self.stats}
+        if url.path != "/search":
+            return 404, {"error": f"no route for {url.path}"}
+
+        self.stats["requests"] += 1
+        try:
+            if method == "GET":
+                payload = dict(parse_qsl(url.query))
+            elif method == "POST":
+                try:
+                    payload = json.loads(body or b"{}")
+                except ValueError:
+                    raise RequestError(400, "body is not valid JSON")
+                if not isinstance(payload, dict):
+                    raise RequestError(400, "body must be a JSON object")
+            else:
+                raise RequestError(405, f"{method} is not supported")
+
+            params = parse_search_request(payload)
+            result = await self._run(params)
+            self.stats["ok"] += 1
+            return 200, result
+        except RequestError as e:
+            self.stats["errors"] += 1
+            return e.status, {"error": str(e)}
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"[ERROR] {target}: {e!r}")
+            return 500, {"error": "internal error"}
+
+    # Waits for a concurrency slot, then for the executor, both within the request timeout
+    async def _run(self, params):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.stats["rejected"] += 1
+            raise RequestError(503, "server busy, try again")
+
+        try:
+            future = loop.run_in_executor(self.executor, _search, params)
+        except Exception:
+            self._slots.release()
+            raise
+        # A timed-out query keeps its worker busy until it finishes, so it keeps its slot too
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), max(0.0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise RequestError(504, f"query took longer than {self.timeout}s")
+
+    async def _respond(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+# Executor for the scoring work: worker processes sharing the mapped index, or threads
+def make_executor(workers, path=INDEX_PATH, preprocessing=None, store=None):
+    if workers == 0:
+        set_store(store if store is not None else open_index(path, preprocessing))
+        return ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) + 4))
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(path, preprocessing))
+
+
+async def main(host, port, workers, max_concurrency, timeout, path, directory, preprocessing=None):
+    # Built (or rebuilt) once here so the workers only ever open an up-to-date file
+    store = open_or_build_index(path, directory, preprocessing)
+    executor = make_executor(workers, path, store["preprocessing"], store)
+    server = SearchServer(executor, max_concurrency, timeout, store["num_docs"])
+    host, port = await server.start(host, port)
+    print(f"Serving {store['num_docs']} documents on http://{host}:{port}/search", flush=True)
+    try:
+        await server.serve_forever()
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Serve JSON search queries over HTTP")
+    arg_parser.add_argument("--host", default=HOST)
+    arg_parser.add_argument("--port", type=int, default=PORT)
+    arg_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                            help="scoring processes (0 = threads in this process)")
+    arg_parser.add_argument("--max-concurrency", type=int, default=64, help="queries in flight at once")
+    arg_parser.add_argument("--timeout", type=float, default=5.0, help="per-request timeout in seconds")
+    arg_parser.add_argument("--index", default=INDEX_PATH, help="index file built by index_store.py")
+    arg_parser.add_argument("--data", default=DATA_DIR, help="directory of .html documents")
+    arg_parser.add_argument("--no-stopwords", action="store_true")
+    arg_parser.add_argument("--no-stemming", action="store_true")
+    arg_parser.add_argument("--no-lemmatization", action="store_true")
+    arg_parser.add_argument("--tokenizer", choices=TOKENIZERS, default="nltk")
+    args = arg_parser.parse_args()
+
+    preprocessing = {
+        "use_stopwords": not args.no_stopwords,
+        "use_stemming": not args.no_stemming,
+        "use_lemmatization": not args.no_lemmatization,
+        "tokenizer": args.tokenizer
+    }
+    try:
+        asyncio.run(main(args.host, args.port, args.workers, args.max_concurrency, args.timeout,
+                         args.index, args.data, preprocessing))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import server
+from server import SearchServer, parse_search_request, RequestError, make_executor
+from tokeniser import process_text
+from indexer import build_inverted_index_bm25, build_multifield_index
+from ranker import (
+    compute_idf,
+    compute_avg_doc_length,
+    build_maxscore_index,
+    rank_documents,
+    rank_documents_bm25,
+    rank_documents_bm25_field_weighted,
+    rank_documents_bm25f
+)
+
+# Runs without NLTK data: regex tokenizer, no stopword list, no WordNet
+PREPROCESSING = {"use_stopwords": False, "use_stemming": True, "use_lemmatization": False, "tokenizer": "regex"}
+
+PAGES = [
+    {"doc_id": "a.html", "title": "Tony Hawk's Downhill Jam", "body": "downhill jam skate game"},
+    {"doc_id": "b.html", "title": "London Taxi: Rush Hour", "body": "taxi rush hour driving game"},
+    {"doc_id": "c.html", "title": "Arcade Classics", "body": "arcade game game atari"},
+    {"doc_id": "d.html", "title": "Puzzle Quest", "body": "puzzle game with taxi jam"},
+]
+
+
+# Same shape as index_store.open_index, built in memory
+def _store():
+    fields = {}
+    for field in ("title", "body"):
+        streams = [{"doc_id": p["doc_id"], "tokens": process_text(p[field], **PREPROCESSING)} for p in PAGES]
+        index, doc_lengths = build_inverted_index_bm25(streams)
+        idf = compute_idf(index, len(PAGES), smooth=True)
+        avg_dl = compute_avg_doc_length(doc_lengths)
+        fields[field] = {
+            "index": index, "doc_lengths": doc_lengths, "avg_dl": avg_dl, "idf": idf,
+            "maxscore_index": build_maxscore_index(index, idf, doc_lengths, avg_dl)
+        }
+    index, field_lengths = build_multifield_index(
+        [{"doc_id": p["doc_id"], **{f"{field}_tokens": process_text(p[field], **PREPROCESSING) for field in fields}}
+         for p in PAGES])
+    multifield = {"index": index, "idf": compute_idf(index, len(PAGES), smooth=True), "field_lengths": field_lengths,
+                  "field_avg_dl": {field: f["avg_dl"] for field, f in fields.items()}}
+    return {"num_docs": len(PAGES), "doc_titles": {p["doc_id"]: p["title"] for p in PAGES},
+            "preprocessing": PREPROCESSING, "version": "test", "fields": fields, "multifield": multifield}
+
+
+async def _call(port, method, target, payload=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    writer.write(f"{method} {target} HTTP/1.1\r\nHost: x\r\nConnection: close\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, content = response.partition(b"\r\n\r\n")
+    return int(head.split(b" ")[1]), json.loads(content)
+
+
+async def _with_server(executor, check, **options):
+    search_server = SearchServer(executor, **options)
+    _, port = await search_server.start("127.0.0.1", 0)
+    try:
+        return await check(port)
+    finally:
+        await search_server.close()
+
+
+def test_search_matches_rankers():
+    server.QUERY_CACHE.clear()
+    store = _store()
+    body, title = store["fields"]["body"], store["fields"]["title"]
+    tokens = process_text("taxi jam game", **PREPROCESSING)
+
+    async def check(port):
+        status, bm25 = await _call(port, "POST", "/search", {"query": "taxi jam game", "k": 3})
+        assert status == 200
+        assert [(r["doc_id"], r["score"]) for r in bm25["results"]] == \
+            rank_documents_bm25(tokens, body["index"], body["idf"], body["doc_lengths"], body["avg_dl"], k=3)
+
+        _, tuned = await _call(port, "GET", "/search?q=taxi+jam+game&k1=1.2&b=0.3")
+        assert [(r["doc_id"], r["score"]) for r in tuned["results"]] == \
+            rank_documents_bm25(tokens, body["index"], body["idf"], body["doc_lengths"], body["avg_dl"],
+                                1.2, 0.3, k=10)
+
+        _, tfidf = await _call(port, "POST", "/search", {"query": "taxi jam game", "model": "tfidf"})
+        assert [(r["doc_id"], r["score"]) for r in tfidf["results"]] == \
+            rank_documents(tokens, body["index"], body["idf"], k=10)
+
+        _, weighted = await _call(port, "POST", "/search",
+                                  {"query": "taxi jam game", "model": "field-weighted", "w_title": 3})
+        assert [(r["doc_id"], r["score"]) for r in weighted["results"]] == rank_documents_bm25_field_weighted(
+            tokens, title["index"], title["idf"], title["doc_lengths"], title["avg_dl"],
+            body["index"], body["idf"], body["doc_lengths"], body["avg_dl"], w_title=3.0, k=10)
+        assert weighted["results"][0]["title"]
+
+        multifield = store["multifield"]
+        _, bm25f = await _call(port, "POST", "/search",
+                               {"query": "taxi jam game", "model": "bm25f", "w_title": 3, "b": 0.5})
+        assert [(r["doc_id"], r["score"]) for r in bm25f["results"]] == rank_documents_bm25f(
+            tokens, multifield["index"], multifield["idf"], multifield["field_lengths"], multifield["field_avg_dl"],
+            {"title": 3.0, "body": 1.0}, b=0.5, k=10)
+        _, reweighted = await _call(port, "POST", "/search", {"query": "taxi jam game", "model": "bm25f", "b": 0.5})
+        assert not reweighted["cached"] and reweighted["results"] != bm25f["results"]
+
+        _, repeated = await _call(port, "POST", "/search", {"query": "Taxi, jam, GAME!", "k": 3})
+        assert repeated["cached"] and not bm25["cached"]
+        assert repeated["results"] == bm25["results"]
+
+        status, health = await _call(port, "GET", "/health")
+        assert status == 200 and health["ok"] == 7
+
+    with make_executor(0, store=store) as executor:
+        asyncio.run(_with_server(executor, check, num_docs=store["num_docs"]))
+
+
+def test_bad_requests_are_rejected():
+    for payload in ({}, {"query": " "}, {"query": "jam", "model": "bm26"}, {"query": "jam", "k": 0},
+                    {"query": "jam", "b": 2}, {"query": "jam", "k1": "x"}, {"query": "jam", "w_title": -1},
+                    {"query": "jam", "w_body": "nan"}, {"query": "jam", "k1": float("inf")}, {"query": "jam", "b": "nan"},
+                    {"query": "jam", "k": float("inf")}, {"query": "jam", "model": "bm25f", "w_title": -0.5}):
+        try:
+            parse_search_request(payload)
+            assert False, payload
+        except RequestError as e:
+            assert e.status == 400
+
+    async def check(port):
+        assert (await _call(port, "POST", "/search", ["jam"]))[0] == 400
+        assert (await _call(port, "GET", "/nowhere"))[0] == 404
+        assert (await _call(port, "DELETE", "/search"))[0] == 405
+        assert (await _call(port, "GET", "/search?q=jam&model=bm25f&w_body=inf"))[0] == 400
+        assert (await _call(port, "GET", "/search?q=jam&model=bm25f&k1=nan"))[0] == 400
+
+        # "hawk" is only in a title: with that field at weight 0 nothing matches, and k1 = 0 is fine
+        status, payload = await _call(port, "POST", "/search",
+                                      {"query": "hawk", "model": "bm25f", "k1": 0, "w_title": 0})
+        assert status == 200 and payload["results"] == []
+        status, payload = await _call(port, "POST", "/search",
+                                      {"query": "hawk jam", "model": "bm25f", "k1": 0, "w_title": 0})
+        assert status == 200 and {r["doc_id"] for r in payload["results"]} == {"a.html", "d.html"}
+
+    with make_executor(0, store=_store()) as executor:
+        asyncio.run(_with_server(executor, check))
+
+
+class _SlowExecutor(ThreadPoolExecutor):
+    def submit(self, fn, *args):
+        def slow(*a):
+            time.sleep(0.3)
+            return fn(*a)
+        return super().submit(slow, *args)
+
+
+def test_timeouts_and_concurrency_limit():
+    server.set_store(_store())
+
+    async def check(port):
+        statuses = await asyncio.gather(*(_call(port, "POST", "/search", {"query": "jam"}) for _ in range(3)))
+        return sorted(status for status, _ in statuses)
+
+    with _SlowExecutor(max_workers=4) as executor:
+        # one slot: the first request times out while running, the others never get the slot
+        assert asyncio.run(_with_server(executor, check, max_concurrency=1, timeout=0.1)) == [503, 503, 504]
+        # enough slots and time: everything is answered
+        assert asyncio.run(_with_server(executor, check, max_concurrency=4, timeout=2.0)) == [200, 200, 200]
+
+
+if __name__ == "__main__":
+    test_search_matches_rankers()
+    test_bad_requests_are_rejected()
+    test_timeouts_and_concurrency_limit()
+    print("Server tests passed")
@@ -0,0 +1,237 @@
+import multiprocessing
+import zlib
+from collections import Counter
+from pathlib import Path
+
+from parser import parse_html_file
+from tokeniser import process_text
+from indexer import build_inverted_index_bm25
+from ranker import compute_idf_from_df, rank_documents, rank_documents_bm25
+from index_store import DATA_DIR, FIELDS, preprocessing_config
+
+# -------------------------------
+# SHARDED INDEX (SCATTER-GATHER)
+# -------------------------------
+#
+# Documents are split across N shards by a hash of their doc ID. Each shard is a worker
+# process holding its own inverted index; the coordinator talks to it over a Pipe.
+#
+# Statistics are global: at start-up every shard reports its document count, total length
+# and per-term df, and the coordinator sends back the collection-wide IDF and avg_dl. Each
+# shard then scores with exactly the numbers the unsharded index would use, so BM25/TF-IDF
+# scores are identical, not just close.
+#
+# A query is sent to every shard (scatter); each returns its local top k with the
+# document's collection position and the first query term it matched, which is what the
+# unsharded rankers break ties on. Merging on (score, first term, position) and cutting
+# at k (gather) gives exactly rank_documents_bm25(..., k=k) on the whole collection.
+#
+# Messages are plain picklable tuples, so a shard could equally sit behind a
+# multiprocessing.connection.Listener on another machine.
+
+MODELS = ("bm25", "tfidf")
+
+
+def shard_of(doc_id, num_shards):
+    return zlib.crc32(doc_id.encode("utf-8")) % num_shards
+
+
+# Splits (position, document) pairs by doc ID; positions are collection order
+def partition(documents, num_shards):
+    shards = [[] for _ in range(num_shards)]
+    for position, doc in enumerate(documents):
+        shards[shard_of(doc["doc_id"], num_shards)].append((position, doc))
+    return shards
+
+
+class _Shard:
+    def __init__(self, documents, fields):
+        self.positions = {doc["doc_id"]: position for position, doc in documents}
+        self.fields = {}
+        for field in fields:
+            index, doc_lengths = build_inverted_index_bm25(
+                [{"doc_id": doc["doc_id"], "tokens": doc[f"{field}_tokens"]} for _, doc in documents]
+            )
+            self.fields[field] = {"index": dict(index), "doc_lengths": doc_lengths}
+        self.idf = {}
+        self.avg_dl = {}
+
+    def local_stats(self):
+        return {
+            field: {
+                "num_docs": len(data["doc_lengths"]),
+                "total_length": sum(data["doc_lengths"].values()),
+                "df": {term: len(postings) for term, postings in data["index"].items()}
+            }
+            for field, data in self.fields.items()
+        }
+
+    def search(self, query_tokens, model, field, k, k1, b):
+        data = self.fields[field]
+        index, idf = data["index"], self.idf[field]
+        if model == "tfidf":
+            results = rank_documents(query_tokens, index, idf, k=k)
+        else:
+            results = rank_documents_bm25(query_tokens, index, idf, data["doc_lengths"], self.avg_dl[field],
+                                          k1, b, k=k)
+
+        hits = []
+        for doc_id, score in results:
+            first = next(i for i, term in enumerate(query_tokens) if doc_id in index.get(term, ()))
+            hits.append((score, first, self.positions[doc_id], doc_id))
+        return hits
+
+
+# Parses and tokenises one shard's files inside the worker, so no process holds every page
+def _load_files(files, fields, preprocessing):
+    documents = []
+    for position, path in files:
+        doc = parse_html_file(path)
+        for field in fields:
+            doc[f"{field}_tokens"] = process_text(doc[field], **preprocessing)
+        documents.append((position, doc))
+    return documents
+
+
+def _serve_shard(conn, documents, files, fields, preprocessing):
+    if files is not None:
+        documents = _load_files(files, fields, preprocessing)
+    shard = _Shard(documents, fields)
+    conn.send(("stats", shard.local_stats()))
+
+    while True:
+        message = conn.recv()
+        command = message[0]
+        if command == "stop":
+            break
+        if command == "stats":
+            shard.idf, shard.avg_dl = message[1], message[2]
+            conn.send(("ok", None))
+        elif command == "search":
+            _, queries, model, field, k, k1, b = message
+            try:
+                conn.send(("ok", [shard.search(q, model, field, k, k1, b) for q in queries]))
+            except Exception as e:
+                conn.send(("error", repr(e)))
+    conn.close()
+
+
+class ShardedIndex:
+    def __init__(self, documents=None, num_shards=2, fields=FIELDS, files=None, preprocessing=None):
+        # Either tokenised documents (doc_id, <field>_tokens), or a list of .html files that
+        # the shards parse and tokenise themselves
+        self.num_shards = num_shards
+        self.fields = tuple(fields)
+        self.num_docs = 0
+        self.avg_dl = {}
+        self.idf = {}
+
+        if files is not None:
+            items = [{"doc_id": Path(path).name, "path": path} for path in files]
+        else:
+            items = list(documents)
+        parts = partition(items, num_shards)
+
+        context = multiprocessing.get_context()
+        self._conns = []
+        self._workers = []
+        for part in parts:
+            parent, child = context.Pipe()
+            if files is not None:
+                args = (child, None, [(position, doc["path"]) for position, doc in part], self.fields,
+                        preprocessing_config(preprocessing))
+            else:
+                args = (child, part, None, self.fields, None)
+            worker = context.Process(target=_serve_shard, args=args, daemon=True)
+            worker.start()
+            child.close()
+            self._conns.append(parent)
+            self._workers.append(worker)
+
+        self._share_statistics([conn.recv()[1] for conn in self._conns])
+
+    @classmethod
+    def from_directory(cls, directory=DATA_DIR, num_shards=2, fields=FIELDS, preprocessing=None):
+        files = list(Path(directory).glob("*.html"))
+        return cls(num_shards=num_shards, fields=fields, files=files, preprocessing=preprocessing)
+
+    # Sums the shards' N, length totals and df into collection-wide IDF and avg_dl
+    def _share_statistics(self, shard_stats):
+        for field in self.fields:
+            num_docs = sum(stats[field]["num_docs"] for stats in shard_stats)
+            total_length = sum(stats[field]["total_length"] for stats in shard_stats)
+            df = Counter()
+            for stats in shard_stats:
+                df.update(stats[field]["df"])
+
+            self.num_docs = num_docs
+            self.avg_dl[field] = total_length / num_docs if num_docs else 0.0
+            self.idf[field] = compute_idf_from_df(df, num_docs, smooth=True)
+
+        for conn in self._conns:
+            conn.send(("stats", self.idf, self.avg_dl))
+        for conn in self._conns:
+            conn.recv()
+
+    # Global top k (doc_id, score) for each query; k=None returns every match
+    def search_batch(self, queries, model="bm25", field="body", k=10, k1=1.5, b=0.75):
+        if model not in MODELS:
+            raise ValueError(f"Unknown model: {model!r} (expected one of {MODELS})")
+        queries = [list(q) for q in queries]
+
+        # Scatter to every shard before waiting on any, so they score in parallel
+        for conn in self._conns:
+            conn.send(("search", queries, model, field, k, k1, b))
+        replies = [conn.recv() for conn in self._conns]
+        for status, payload in replies:
+            if status == "error":
+                raise RuntimeError(f"Shard failed: {payload}")
+
+        results = []
+        for q in range(len(queries)):
+            hits = [hit for _, payload in replies for hit in payload[q]]
+            hits.sort(key=lambda hit: (-hit[0], hit[1], hit[2]))
+            results.append([(doc_id, score) for score, _, _, doc_id in hits[:k]])
+        return results
+
+    def search(self, query_tokens, model="bm25", field="body", k=10, k1=1.5, b=0.75):
+        return self.search_batch([query_tokens], model, field, k, k1, b)[0]
+
+    def close(self):
+        for conn in self._conns:
+            try:
+                conn.send(("stop",))
+            except (BrokenPipeError, OSError):
+                pass
+        for worker in self._workers:
+            worker.join()
+        for conn in self._conns:
+            conn.close()
+        self._conns, self._workers = [], []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    arg_parser = argparse.ArgumentParser(description="Serve the collection from N shard processes")
+    arg_parser.add_argument("--data", default=DATA_DIR, help="directory of .html documents")
+    arg_parser.add_argument("--shards", type=int, default=multiprocessing.cpu_count())
+    args = arg_parser.parse_args()
+
+    start = time.perf_counter()
+    with ShardedIndex.from_directory(args.data, args.shards) as sharded:
+        print(f"Indexed {sharded.num_docs} documents in {args.shards} shards "
+              f"({time.perf_counter() - start:.1f}s)")
+        while True:
+            query = input("\nEnter query (or type 'exit'): ").strip()
+            if query.lower() == "exit":
+                break
+            for rank, (doc_id, score) in enumerate(sharded.search(process_text(query)), start=1):
+                print(f"{rank}. {doc_id} score={score:.4f}")
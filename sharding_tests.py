@@ -0,0 +1,91 @@
+import random
+import tempfile
+from pathlib import Path
+
+from sharding import ShardedIndex, partition
+from parser import parse_collection
+from tokeniser import process_text
+from indexer import build_inverted_index_bm25
+from ranker import compute_idf, compute_avg_doc_length, rank_documents, rank_documents_bm25
+
+VOCABULARY = ["toni", "hawk", "jam", "game", "arcad", "atari", "taxi", "london", "sim", "pet", "puzzl", "race"]
+QUERIES = [["jam", "game"], ["taxi"], ["arcad", "atari", "game"], ["puzzl", "race", "race"], ["missing"], []]
+
+# Runs without NLTK data: regex tokenizer, no stopword list, no WordNet
+PREPROCESSING = {"use_stopwords": False, "use_stemming": True, "use_lemmatization": False, "tokenizer": "regex"}
+
+
+def _documents(num_docs=60, seed=5):
+    rnd = random.Random(seed)
+    return [
+        {
+            "doc_id": f"doc{i}.html",
+            "title_tokens": rnd.choices(VOCABULARY, k=rnd.randint(0, 3)),
+            "body_tokens": rnd.choices(VOCABULARY, k=rnd.randint(0, 10))
+        }
+        for i in range(num_docs)
+    ]
+
+
+def _unsharded(documents, field="body"):
+    index, doc_lengths = build_inverted_index_bm25(
+        [{"doc_id": d["doc_id"], "tokens": d[f"{field}_tokens"]} for d in documents]
+    )
+    return index, compute_idf(index, len(documents), smooth=True), doc_lengths, compute_avg_doc_length(doc_lengths)
+
+
+def test_partition_splits_by_doc_id():
+    documents = _documents()
+    shards = partition(documents, 3)
+
+    assert sorted(position for shard in shards for position, _ in shard) == list(range(len(documents)))
+    assert all(shard for shard in shards)
+    assert partition(documents, 3) == shards
+
+
+def test_sharded_scores_equal_unsharded():
+    documents = _documents()
+
+    for num_shards in (1, 3):
+        with ShardedIndex(documents, num_shards) as sharded:
+            for field in ("title", "body"):
+                index, idf, doc_lengths, avg_dl = _unsharded(documents, field)
+                assert sharded.idf[field] == idf
+                assert sharded.avg_dl[field] == avg_dl
+
+                for k in (0, 1, 5, None):
+                    assert sharded.search_batch(QUERIES, field=field, k=k) == \
+                        [rank_documents_bm25(q, index, idf, doc_lengths, avg_dl, k=k) for q in QUERIES]
+                    assert sharded.search_batch(QUERIES, model="tfidf", field=field, k=k) == \
+                        [rank_documents(q, index, idf, k=k) for q in QUERIES]
+
+                assert sharded.search(["game"], field=field, k1=1.2, b=0.5) == \
+                    rank_documents_bm25(["game"], index, idf, doc_lengths, avg_dl, 1.2, 0.5, k=10)
+
+
+def test_shards_parse_their_own_files():
+    pages = {
+        "a.html": "<title>Tony Hawk's Downhill Jam</title><body>downhill jam skate game</body>",
+        "b.html": "<title>London Taxi</title><body>taxi rush hour driving game</body>",
+        "c.html": "<title>Arcade Classics</title><body>arcade game game atari</body>",
+        "d.html": "<title>Puzzle Quest</title><body>puzzle game with taxi jam</body>",
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, html in pages.items():
+            (Path(tmp) / name).write_text(html, encoding="utf-8")
+
+        documents = parse_collection(tmp)
+        for doc in documents:
+            doc["body_tokens"] = process_text(doc["body"], **PREPROCESSING)
+        index, idf, doc_lengths, avg_dl = _unsharded(documents)
+
+        with ShardedIndex.from_directory(tmp, 2, fields=("body",), preprocessing=PREPROCESSING) as sharded:
+            for query in (["game"], ["taxi", "jam"], ["arcad", "game"]):
+                assert sharded.search(query, k=None) == rank_documents_bm25(query, index, idf, doc_lengths, avg_dl)
+
+
+if __name__ == "__main__":
+    test_partition_splits_by_doc_id()
+    test_sharded_scores_equal_unsharded()
+    test_shards_parse_their_own_files()
+    print("Sharding tests passed")
@@ -1,3 +1,9 @@
+import json
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
 import nltk
 from nltk.tokenize import word_tokenize
 from nltk.corpus import stopwords, wordnet
@@ -7,7 +13,109 @@ STOP_WORDS = set(stopwords.words("english"))
 stemmer = PorterStemmer()
 lemmatizer = WordNetLemmatizer()
 
-def tokenize(text):
+# Bounded LRU cache of results per word type. Stemming and lemmatisation are pure functions of
+# (word, options), so one cache stays valid across documents, queries and (saved to disk) reindexes.
+# process_text is shared by every thread of a process (e.g. server.py's thread mode), so
+# the LRU bookkeeping runs under a lock.
+class TermCache:
+    def __init__(self, maxsize=200_000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key, fn, *args):
+        data = self._data
+        with self._lock:
+            try:
+                value = data[key]
+            except KeyError:
+                self.misses += 1
+            else:
+                self.hits += 1
+                data.move_to_end(key)
+                return value
+
+        # Computed outside the lock: concurrent misses on one word just compute it twice
+        value = fn(*args)
+
+        with self._lock:
+            data[key] = value
+            data.move_to_end(key)
+            while len(data) > self.maxsize:
+                data.popitem(last=False)
+        return value
+
+    def info(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._data),
+                "maxsize": self.maxsize
+            }
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    # Results depend on the NLTK version, so a cache saved under another version is not reused
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            entries = [[list(k), v] for k, v in self._data.items()]
+        payload = {"nltk_version": nltk.__version__, "entries": entries}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+
+    def load(self, path):
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+
+        if payload.get("nltk_version") != nltk.__version__:
+            return 0
+
+        entries = payload["entries"][-self.maxsize:]
+        with self._lock:
+            for key, value in entries:
+                self._data[tuple(key)] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return len(entries)
+
+TERM_CACHE = TermCache()
+
+def cache_info():
+    return TERM_CACHE.info()
+
+def clear_cache():
+    TERM_CACHE.clear()
+
+def save_cache(path):
+    TERM_CACHE.save(path)
+
+# Returns the number of entries loaded (0 if the file is missing or from another NLTK version)
+def load_cache(path):
+    if not Path(path).exists():
+        return 0
+    return TERM_CACHE.load(path)
+
+TOKENIZERS = ("nltk", "regex")
+
+# Runs of letters/digits, i.e. exactly the tokens that can pass the isalnum() filter
+_ALNUM_RUN = re.compile(r"[^\W_]+")
+
+def tokenize(text, tokenizer="nltk"):
+    if tokenizer == "regex":
+        return _ALNUM_RUN.findall(text)
+    if tokenizer != "nltk":
+        raise ValueError(f"Unknown tokenizer: {tokenizer!r} (expected one of {TOKENIZERS})")
     return word_tokenize(text)
 
 def normalize(tokens):
@@ -17,8 +125,16 @@ def remove_stopwords(tokens):
     #   .isalnum() removes punctuation-only tokens
     return [t for t in tokens if t not in STOP_WORDS and t.isalnum()]
 
-def stem(tokens):
-    return [stemmer.stem(t) for t in tokens]
+# Regex tokens are already lowercase runs of letters and digits
+def remove_stopwords_regex(tokens):
+    return [t for t in tokens if t not in STOP_WORDS]
+
+def stem(tokens, use_cache=True):
+    if not use_cache:
+        return [stemmer.stem(t) for t in tokens]
+
+    lookup = TERM_CACHE.lookup
+    return [lookup(("stem", t), stemmer.stem, t) for t in tokens]
 
 def _get_wordnet_pos(treebank_tag: str):
     if treebank_tag.startswith("J"):
@@ -29,25 +145,45 @@ def _get_wordnet_pos(treebank_tag: str):
         return wordnet.ADV
     return wordnet.NOUN
 
-def lemmatize(tokens, use_pos=True):
+# POS tags depend on context, so tagging still runs per sequence; the WordNet lookups are cached
+def lemmatize(tokens, use_pos=True, use_cache=True):
     if not use_pos:
-        return [lemmatizer.lemmatize(t) for t in tokens]
+        if not use_cache:
+            return [lemmatizer.lemmatize(t) for t in tokens]
+        lookup = TERM_CACHE.lookup
+        return [lookup(("lemma", t), lemmatizer.lemmatize, t) for t in tokens]
 
     tagged = nltk.pos_tag(tokens)
-    return [lemmatizer.lemmatize(word, _get_wordnet_pos(tag)) for word, tag in tagged]
+    if not use_cache:
+        return [lemmatizer.lemmatize(word, _get_wordnet_pos(tag)) for word, tag in tagged]
+
+    lookup = TERM_CACHE.lookup
+    lemmas = []
+    for word, tag in tagged:
+        pos = _get_wordnet_pos(tag)
+        lemmas.append(lookup(("lemma", word, pos), lemmatizer.lemmatize, word, pos))
+    return lemmas
 
 
-def process_text(text, use_stopwords=True, use_stemming=True, use_lemmatization=True, lemmatize_with_pos=True):
-    tokens = tokenize(text)
-    tokens = normalize(tokens)
+# tokenizer="regex" lowercases and splits on non-alphanumerics in one pass; it never emits
+# punctuation and splits contractions/hyphenated words differently (see tokenizer_parity.py)
+def process_text(text, use_stopwords=True, use_stemming=True, use_lemmatization=True, lemmatize_with_pos=True,
+                 use_cache=True, tokenizer="nltk"):
+    if tokenizer == "regex":
+        tokens = tokenize(text.lower(), tokenizer)
+        if use_stopwords:
+            tokens = remove_stopwords_regex(tokens)
+    else:
+        tokens = tokenize(text, tokenizer)
+        tokens = normalize(tokens)
 
-    if use_stopwords:
-        tokens = remove_stopwords(tokens)
+        if use_stopwords:
+            tokens = remove_stopwords(tokens)
 
     if use_stemming:
-        tokens = stem(tokens)
+        tokens = stem(tokens, use_cache=use_cache)
 
     if use_lemmatization:
-        tokens = lemmatize(tokens, use_pos= lemmatize_with_pos)
+        tokens = lemmatize(tokens, use_pos= lemmatize_with_pos, use_cache=use_cache)
 
     return tokens
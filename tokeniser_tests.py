@@ -0,0 +1,125 @@
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from tokeniser import TermCache, TERM_CACHE, clear_cache, cache_info, process_text, stem, lemmatize
+
+TEXT = "Running runners ran past the racing games; players played and replayed the games."
+
+
+def test_cached_stems_match_uncached():
+    clear_cache()
+    tokens = process_text(TEXT, use_stemming=False, use_lemmatization=False)
+
+    assert stem(tokens) == stem(tokens, use_cache=False)
+    assert stem(tokens) == stem(tokens, use_cache=False)
+    assert process_text(TEXT, use_lemmatization=False) == \
+        process_text(TEXT, use_lemmatization=False, use_cache=False)
+
+
+def test_cached_lemmas_match_uncached():
+    try:
+        lemmatize(["games"], use_cache=False)
+    except LookupError:
+        print("Skipping lemma cache parity: WordNet / POS tagger data not installed")
+        return
+
+    clear_cache()
+    tokens = process_text(TEXT, use_stemming=False, use_lemmatization=False)
+    for use_pos in (True, False):
+        expected = lemmatize(tokens, use_pos=use_pos, use_cache=False)
+        assert lemmatize(tokens, use_pos=use_pos) == expected
+        assert lemmatize(tokens, use_pos=use_pos) == expected
+
+    options = {"use_stemming": False, "use_lemmatization": True, "lemmatize_with_pos": True}
+    assert process_text(TEXT, **options) == process_text(TEXT, **options, use_cache=False)
+    assert process_text(TEXT, **options) == process_text(TEXT, **options, use_cache=False)
+    assert cache_info()["hits"] > 0
+
+
+def test_cache_counts_hits_per_word_type():
+    clear_cache()
+    stem(["games", "games", "played", "games"])
+
+    info = cache_info()
+    assert info["misses"] == 2
+    assert info["hits"] == 2
+    assert info["size"] == 2
+    assert info["hit_rate"] == 0.5
+
+
+def test_cache_is_bounded():
+    cache = TermCache(maxsize=2)
+    for word in ["a", "b", "c"]:
+        cache.lookup(("stem", word), str.upper, word)
+
+    # least recently used entry is evicted
+    assert cache.info()["size"] == 2
+    cache.lookup(("stem", "a"), str.upper, "a")
+    assert cache.info()["misses"] == 4
+
+
+def test_cache_is_thread_safe():
+    cache = TermCache(maxsize=8)
+    words = [f"w{i}" for i in range(32)]
+    errors = []
+
+    def run(offset):
+        try:
+            for i in range(3000):
+                word = words[(i * 7 + offset) % len(words)]
+                assert cache.lookup(("stem", word), str.upper, word) == word.upper()
+        except Exception as e:
+            errors.append(e)
+
+    # Switch threads as often as possible so lookups interleave with evictions
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=run, args=(t,)) for t in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+
+    assert not errors
+    info = cache.info()
+    assert info["size"] <= 8 and info["hits"] + info["misses"] == 8 * 3000
+
+
+def test_cache_round_trips_through_disk():
+    clear_cache()
+    stem(["games", "played"])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "cache.json"
+        TERM_CACHE.save(path)
+
+        warm = TermCache()
+        assert warm.load(path) == 2
+        assert warm.lookup(("stem", "games"), lambda w: None, "games") == "game"
+        assert warm.info()["hits"] == 1
+
+
+def test_regex_tokenizer_matches_nltk_on_plain_text():
+    text = "London Taxi: Rush Hour, the arcade driving game (2006)!"
+    assert process_text(text, tokenizer="regex", use_lemmatization=False) == \
+        process_text(text, use_lemmatization=False)
+
+    # without stopword removal the NLTK path keeps punctuation; the regex path never emits it
+    tokens = process_text(text, tokenizer="regex", use_stopwords=False, use_stemming=False,
+                          use_lemmatization=False)
+    assert tokens == ["london", "taxi", "rush", "hour", "the", "arcade", "driving", "game", "2006"]
+
+
+if __name__ == "__main__":
+    test_cached_stems_match_uncached()
+    test_cached_lemmas_match_uncached()
+    test_cache_counts_hits_per_word_type()
+    test_cache_is_bounded()
+    test_cache_is_thread_safe()
+    test_cache_round_trips_through_disk()
+    test_regex_tokenizer_matches_nltk_on_plain_text()
+    print("Tokeniser tests passed")
@@ -0,0 +1,120 @@
+from collections import Counter
+from pathlib import Path
+
+from parser import parse_collection
+from tokeniser import process_text
+from indexer import build_inverted_index_bm25
+from ranker import compute_idf, compute_avg_doc_length, rank_documents, rank_documents_bm25
+from experiments import QUERIES, DATA_DIR, CSV_PATH, DOC_PREPROCESSING
+
+# Reports what switching process_text from the NLTK tokenizer to the regex tokenizer changes:
+# per-document token streams over the collection, and TF-IDF/BM25 top 10 for experiments.QUERIES
+
+MODES = ("nltk", "regex")
+TOP_K = 10
+
+
+def compare_tokens(documents, options):
+    counts = {mode: Counter() for mode in MODES}
+    streams = {mode: [] for mode in MODES}
+    identical = {"title": 0, "body": 0}
+
+    for doc in documents:
+        for field in ("title", "body"):
+            tokens = {mode: process_text(doc[field], tokenizer=mode, **options) for mode in MODES}
+            if tokens["nltk"] == tokens["regex"]:
+                identical[field] += 1
+            for mode in MODES:
+                counts[mode].update(tokens[mode])
+
+        # doc["tokens"] is the body field, as in main.py
+        for mode in MODES:
+            streams[mode].append({"doc_id": doc["doc_id"], "tokens": tokens[mode]})
+
+    return counts, streams, identical
+
+
+def compare_rankings(streams, options, relevance=None):
+    engines = {}
+    for mode in MODES:
+        index, doc_lengths = build_inverted_index_bm25(streams[mode])
+        idf = compute_idf(index, len(streams[mode]), smooth=True)
+        engines[mode] = (index, idf, doc_lengths, compute_avg_doc_length(doc_lengths))
+
+    rows = []
+    for query in QUERIES:
+        tops = {}
+        for mode in MODES:
+            index, idf, doc_lengths, avg_dl = engines[mode]
+            query_tokens = process_text(query, tokenizer=mode, **options)
+            tops[mode, "tfidf"] = rank_documents(query_tokens, index, idf, k=TOP_K)
+            tops[mode, "bm25"] = rank_documents_bm25(query_tokens, index, idf, doc_lengths, avg_dl, k=TOP_K)
+
+        for model in ("tfidf", "bm25"):
+            a = [doc_id for doc_id, _ in tops["nltk", model]]
+            b = [doc_id for doc_id, _ in tops["regex", model]]
+            row = {
+                "query": query,
+                "model": model,
+                "overlap": len(set(a) & set(b)),
+                "same_order": a == b
+            }
+            if relevance is not None:
+                relevant = relevance.get(query, set())
+                row["nltk_p10"] = len(set(a) & relevant) / TOP_K
+                row["regex_p10"] = len(set(b) & relevant) / TOP_K
+            rows.append(row)
+
+    return rows
+
+
+def print_report(documents, counts, identical, rows, top_n=15):
+    nltk_vocab, regex_vocab = set(counts["nltk"]), set(counts["regex"])
+
+    print("\nTOKEN-LEVEL DIFFERENCES\n")
+    print(f"Documents: {len(documents)}")
+    print(f"Identical title streams: {identical['title']}/{len(documents)}")
+    print(f"Identical body streams:  {identical['body']}/{len(documents)}")
+    print(f"Tokens: nltk={sum(counts['nltk'].values())} regex={sum(counts['regex'].values())}")
+    print(f"Vocabulary: nltk={len(nltk_vocab)} regex={len(regex_vocab)} shared={len(nltk_vocab & regex_vocab)}")
+
+    diff = counts["regex"].copy()
+    diff.subtract(counts["nltk"])
+    print(f"\nTerms the regex tokenizer adds most (top {top_n}):")
+    for term, n in diff.most_common(top_n):
+        if n > 0:
+            print(f"  {term!r}: +{n}")
+    print(f"\nTerms the regex tokenizer loses most (top {top_n}):")
+    for term, n in sorted(diff.items(), key=lambda x: x[1])[:top_n]:
+        if n < 0:
+            print(f"  {term!r}: {n}")
+
+    print(f"\nRANKING-LEVEL DIFFERENCES (top {TOP_K})\n")
+    has_p10 = rows and "nltk_p10" in rows[0]
+    header = "Query,Model,Overlap,SameOrder"
+    print(header + (",NLTK_P10,REGEX_P10" if has_p10 else ""))
+    for row in rows:
+        line = f"{row['query']},{row['model']},{row['overlap']}/{TOP_K},{row['same_order']}"
+        if has_p10:
+            line += f",{row['nltk_p10']:.3f},{row['regex_p10']:.3f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Compare the regex tokenizer with word_tokenize")
+    arg_parser.add_argument("--data", default=DATA_DIR, help="directory of .html documents")
+    args = arg_parser.parse_args()
+
+    documents = parse_collection(args.data)
+    counts, streams, identical = compare_tokens(documents, DOC_PREPROCESSING)
+
+    # Relevance sets are optional: they need the CSV metadata
+    relevance = None
+    if Path(CSV_PATH).exists():
+        from experiments import load_metadata, build_relevance_sets
+        relevance = build_relevance_sets(documents, load_metadata())
+
+    rows = compare_rankings(streams, DOC_PREPROCESSING, relevance)
+    print_report(documents, counts, identical, rows)
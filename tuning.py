@@ -0,0 +1,262 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from evaluation import evaluate_query
+from ranker import compute_idf_from_df
+
+# -------------------------------
+# BM25 PARAMETER SWEEP
+# -------------------------------
+#
+# For every query the postings of its terms are fetched once, per field, into dense
+# (query position x candidate document) tf matrices. Every (k1, b) pair is then scored
+# for all candidates at once with NumPy, and every (w_title, w_body) pair is a weighted
+# sum of the two field scores. Nothing touches the index again after the first fetch.
+#
+# Scores use the same expressions, summed in the same query-term order, as
+# rank_documents_bm25, and ties are broken the way combine_weighted_rankings breaks them,
+# so each combination's top k equals rank_documents_bm25_field_weighted(...) (or
+# rank_documents_bm25(...) for model="bm25") with those parameters.
+#
+# model="bm25f" weights the fields inside the saturation, so every (w_title, w_body) pair
+# is scored on its own from the same tf matrices; its top k equals rank_documents_bm25f(...)
+# over the multi-field index of the same two fields.
+
+SWEEP_MODELS = ("field-weighted", "bm25", "bm25f")
+WEIGHTED_MODELS = ("field-weighted", "bm25f")
+
+DEFAULT_GRID = {
+    "k1": [0.6, 0.8, 1.0, 1.2, 1.5, 1.8, 2.0, 2.4],
+    "b": [0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.75, 0.8, 0.9, 1.0],
+    "w_title": [0.5, 1.0, 2.0, 3.0, 4.0],
+    "w_body": [1.0]
+}
+
+
+# Dense per-field statistics of one query's candidates (every document matching any term)
+def prepare_query(query_tokens, fields, doc_numbers):
+    postings = {}
+    candidates = set()
+    for name, field in fields.items():
+        rows = []
+        for position, term in enumerate(query_tokens):
+            if term not in field["index"]:
+                continue
+            entries = field["index"][term]
+            docs = np.fromiter((doc_numbers[doc_id] for doc_id in entries), dtype=np.int64, count=len(entries))
+            tfs = np.fromiter(entries.values(), dtype=np.float64, count=len(entries))
+            rows.append((position, field["idf"][term], docs, tfs))
+            candidates.update(docs.tolist())
+        postings[name] = rows
+
+    candidates = np.array(sorted(candidates), dtype=np.int64)
+    prepared = {"candidates": candidates, "tokens": list(query_tokens), "num_docs": len(doc_numbers), "fields": {}}
+    for name, field in fields.items():
+        rows = postings[name]
+        tf = np.zeros((len(rows), len(candidates)))
+        first = np.full(len(candidates), np.iinfo(np.int64).max, dtype=np.int64)
+        for row, (position, _, docs, tfs) in enumerate(rows):
+            local = np.searchsorted(candidates, docs)
+            tf[row, local] = tfs
+            first[local] = np.minimum(first[local], position)
+        prepared["fields"][name] = {
+            "tf": tf,
+            "positions": [position for position, _, _, _ in rows],
+            "idf": [idf for _, idf, _, _ in rows],
+            "dl": field["doc_lengths_array"][candidates],
+            "avg_dl": field["avg_dl"],
+            "first": first,
+            "matched": first != np.iinfo(np.int64).max
+        }
+    return prepared
+
+
+# BM25 scores of every candidate for each (k1, b) pair: shape (pairs, candidates)
+def score_field(field, k1s, bs):
+    k1 = np.asarray(k1s, dtype=np.float64)[:, None]
+    b = np.asarray(bs, dtype=np.float64)[:, None]
+    norm = k1 * (1 - b + b * (field["dl"] / field["avg_dl"]))
+    scores = np.zeros((len(k1s), field["tf"].shape[1]))
+    for tf, idf in zip(field["tf"], field["idf"]):
+        # tf = 0 contributes exactly 0.0, like a document missing from the postings (and
+        # is never divided: an empty field at b = 1 would make that 0 / 0)
+        scores += idf * np.divide(tf * (k1 + 1), tf + norm, out=np.zeros_like(scores), where=tf > 0)
+    return scores
+
+
+# BM25F scores of every candidate for each (k1, b) pair under one field weighting: shape
+# (pairs, candidates), with each candidate's first contributing query position and whether
+# any term contributes at all. Same expressions and order as rank_documents_bm25f; idf
+# comes from the number of candidates holding the term in either field.
+def score_bm25f(prepared, k1s, bs, weights):
+    fields = prepared["fields"]
+    k1 = np.asarray(k1s, dtype=np.float64)[:, None]
+    b = np.asarray(bs, dtype=np.float64)[:, None]
+    num_candidates = len(prepared["candidates"])
+
+    # One row per query position matching any field, with tf 0 where a field lacks the term
+    positions = sorted(set().union(*(field["positions"] for field in fields.values())))
+    tfs = {}
+    for name, field in fields.items():
+        tf = np.zeros((len(positions), num_candidates))
+        for row, position in zip(field["tf"], field["positions"]):
+            tf[positions.index(position)] = row
+        tfs[name] = tf
+    present = np.logical_or.reduce([tf > 0 for tf in tfs.values()])
+    tokens = prepared["tokens"]
+    idf = compute_idf_from_df({tokens[p]: int(np.count_nonzero(present[i])) for i, p in enumerate(positions)},
+                              prepared["num_docs"], smooth=True)
+
+    norms = {name: 1 - b + b * (field["dl"] / field["avg_dl"]) for name, field in fields.items()}
+    scores = np.zeros((len(k1s), num_candidates))
+    first = np.full(num_candidates, np.iinfo(np.int64).max, dtype=np.int64)
+    for i, position in enumerate(positions):
+        pseudo_tf = np.zeros_like(scores)
+        for name, w in weights.items():
+            tf = tfs[name][i]
+            pseudo_tf += np.divide(w * tf, norms[name], out=np.zeros_like(scores), where=tf > 0)
+        # Only a tf in a field of weight > 0 makes pseudo_tf > 0; the ranker skips the rest
+        contributes = np.logical_or.reduce([(tfs[name][i] > 0) & (w > 0) for name, w in weights.items()])
+        scores += np.divide(idf[tokens[position]] * (pseudo_tf * (k1 + 1)), pseudo_tf + k1,
+                            out=np.zeros_like(scores), where=contributes)
+        first[contributes] = np.minimum(first[contributes], position)
+    return scores, first, first != np.iinfo(np.int64).max
+
+
+# Position of each candidate in the field's own ranking (ties by first query term, then doc order)
+def _ranking_positions(scores, field, candidates):
+    matched = np.flatnonzero(field["matched"])
+    order = matched[np.lexsort((candidates[matched], field["first"][matched], -scores[matched]))]
+    positions = np.full(len(candidates), -1, dtype=np.int64)
+    positions[order] = np.arange(len(order))
+    return positions
+
+
+def sweep_query(prepared, grid, model="field-weighted", k=10):
+    candidates = prepared["candidates"]
+    title, body = prepared["fields"]["title"], prepared["fields"]["body"]
+    pairs = list(itertools.product(grid["k1"], grid["b"]))
+    weights = list(itertools.product(grid["w_title"], grid["w_body"])) if model in WEIGHTED_MODELS else [(None, None)]
+    if len(candidates) == 0:
+        return [((k1, b, w_title, w_body), []) for k1, b in pairs for w_title, w_body in weights]
+
+    k1s, bs = [p[0] for p in pairs], [p[1] for p in pairs]
+    if model == "bm25f":
+        # Ties by first contributing query term, then doc order
+        scored = {(w_title, w_body): score_bm25f(prepared, k1s, bs, {"title": w_title, "body": w_body})
+                  for w_title, w_body in weights}
+        results = []
+        for p, (k1, b) in enumerate(pairs):
+            for w_title, w_body in weights:
+                scores, first, matched = scored[w_title, w_body]
+                matched = np.flatnonzero(matched)
+                order = matched[np.lexsort((candidates[matched], first[matched], -scores[p, matched]))][:k]
+                results.append(((k1, b, w_title, w_body), [(candidates[i], scores[p, i]) for i in order]))
+        return results
+
+    body_scores = score_field(body, k1s, bs)
+    title_scores = score_field(title, k1s, bs) if model == "field-weighted" else None
+
+    results = []
+    for p, (k1, b) in enumerate(pairs):
+        if model == "bm25":
+            matched = np.flatnonzero(body["matched"])
+            order = matched[np.lexsort((candidates[matched], body["first"][matched], -body_scores[p, matched]))]
+            results.append(((k1, b, None, None), [(candidates[i], body_scores[p, i]) for i in order[:k]]))
+            continue
+
+        # combine_weighted_rankings inserts title matches in title-ranking order, then the
+        # remaining body matches in body-ranking order; its stable sort keeps that for ties
+        title_positions = _ranking_positions(title_scores[p], title, candidates)
+        body_positions = _ranking_positions(body_scores[p], body, candidates)
+        insertion = np.where(title["matched"], title_positions, len(candidates) + body_positions)
+        matched = np.flatnonzero(title["matched"] | body["matched"])
+
+        for w_title, w_body in weights:
+            combined = w_title * title_scores[p, matched] + w_body * body_scores[p, matched]
+            order = np.lexsort((insertion[matched], -combined))[:k]
+            results.append(((k1, b, w_title, w_body),
+                            [(candidates[matched[i]], combined[i]) for i in order]))
+    return results
+
+
+# Numbers every document in collection order (the order of its doc_lengths) for both fields
+def prepare_fields(title, body):
+    doc_ids = list(body["doc_lengths"])
+    doc_numbers = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+    fields = {}
+    for name, field in (("title", title), ("body", body)):
+        fields[name] = dict(field)
+        fields[name]["doc_lengths_array"] = np.array([field["doc_lengths"].get(d, 0) for d in doc_ids], dtype=np.float64)
+    return fields, doc_ids, doc_numbers
+
+
+# Mean P@k, R@k, MRR@k and nDCG@k per parameter combination, best first
+def sweep(queries, title, body, relevance, grid=None, model="field-weighted", k=10):
+    if model not in SWEEP_MODELS:
+        raise ValueError(f"Unknown model: {model!r} (expected one of {SWEEP_MODELS})")
+    grid = dict(DEFAULT_GRID, **(grid or {}))
+    fields, doc_ids, doc_numbers = prepare_fields(title, body)
+
+    totals = {}
+    for query, query_tokens in queries.items():
+        relevant_docs = relevance.get(query, set())
+        prepared = prepare_query(query_tokens, fields, doc_numbers)
+        for params, top in sweep_query(prepared, grid, model, k):
+            results = [(doc_ids[d], float(s)) for d, s in top]
+            evaluated = evaluate_query(results, relevant_docs, (k,))
+            evaluated[f"MRR@{k}"] = evaluated.pop("RR")
+            metrics = totals.setdefault(params, dict.fromkeys((f"P@{k}", f"R@{k}", f"MRR@{k}", f"nDCG@{k}"), 0.0))
+            for name in metrics:
+                metrics[name] += evaluated[name]
+
+    rows = []
+    for (k1, b, w_title, w_body), metrics in totals.items():
+        row = {"k1": k1, "b": b}
+        if model in WEIGHTED_MODELS:
+            row.update({"w_title": w_title, "w_body": w_body})
+        row.update({name: value / len(queries) for name, value in metrics.items()})
+        rows.append(row)
+
+    table = pd.DataFrame(rows)
+    return table.sort_values([f"P@{k}", f"R@{k}", f"nDCG@{k}"], ascending=False, kind="stable").reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from tokeniser import process_text
+    from index_store import INDEX_PATH, open_or_build_index
+    from experiments import QUERIES, DATA_DIR, DOC_PREPROCESSING, load_relevance_sets
+
+    arg_parser = argparse.ArgumentParser(description="Sweep BM25 k1, b and field weights over experiments.QUERIES")
+    arg_parser.add_argument("--k1", type=float, nargs="+", default=DEFAULT_GRID["k1"])
+    arg_parser.add_argument("--b", type=float, nargs="+", default=DEFAULT_GRID["b"])
+    arg_parser.add_argument("--w-title", type=float, nargs="+", default=DEFAULT_GRID["w_title"])
+    arg_parser.add_argument("--w-body", type=float, nargs="+", default=DEFAULT_GRID["w_body"])
+    arg_parser.add_argument("--model", choices=SWEEP_MODELS, default="field-weighted")
+    arg_parser.add_argument("--k", type=int, default=10)
+    arg_parser.add_argument("--top", type=int, default=15, help="rows of the table to print")
+    arg_parser.add_argument("--csv", help="write the full table to this file")
+    args = arg_parser.parse_args()
+
+    store = open_or_build_index(INDEX_PATH, DATA_DIR, DOC_PREPROCESSING)
+    title, body = store["fields"]["title"], store["fields"]["body"]
+    documents = [{"doc_id": doc_id, "title": t} for doc_id, t in store["doc_titles"].items()]
+    relevance = load_relevance_sets(documents)
+    queries = {q: process_text(q, **DOC_PREPROCESSING) for q in QUERIES}
+
+    grid = {"k1": args.k1, "b": args.b, "w_title": args.w_title, "w_body": args.w_body}
+    start = time.perf_counter()
+    table = sweep(queries, title, body, relevance, grid, args.model, args.k)
+    print(f"{len(table)} combinations x {len(queries)} queries in {time.perf_counter() - start:.2f}s\n")
+
+    print(table.head(args.top).to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+    best = table.iloc[0]
+    print("\nBest setting: " + ", ".join(f"{name}={best[name]:g}" for name in grid if name in table.columns))
+
+    if args.csv:
+        table.to_csv(args.csv, index=False)
+        print(f"Saved results to: {args.csv}")
@@ -0,0 +1,115 @@
+from tuning import prepare_fields, prepare_query, sweep_query, sweep
+from tokeniser import process_text
+from indexer import build_inverted_index_bm25, build_multifield_index
+from ranker import (
+    compute_idf,
+    compute_avg_doc_length,
+    rank_documents_bm25,
+    rank_documents_bm25_field_weighted,
+    rank_documents_bm25f
+)
+
+# Runs without NLTK data: regex tokenizer, no stopword list, no WordNet
+PREPROCESSING = {"use_stopwords": False, "use_stemming": True, "use_lemmatization": False, "tokenizer": "regex"}
+
+PAGES = [
+    {"doc_id": "a.html", "title": "Tony Hawk's Downhill Jam", "body": "downhill jam skate game game"},
+    {"doc_id": "b.html", "title": "London Taxi: Rush Hour", "body": "taxi rush hour driving game"},
+    {"doc_id": "c.html", "title": "Arcade Classics", "body": "arcade game game atari classic arcade"},
+    {"doc_id": "d.html", "title": "Puzzle Quest", "body": "puzzle game with taxi jam"},
+    {"doc_id": "e.html", "title": "Jam Session", "body": "music jam"},
+    {"doc_id": "f.html", "title": "Taxi Game", "body": "a long description of a taxi driving game in the city"},
+]
+
+QUERIES = ["taxi jam game", "arcade game", "jam jam", "nothing"]
+
+GRID = {"k1": [0.5, 1.2, 2.0], "b": [0.0, 0.75, 1.0], "w_title": [0.0, 1.0, 3.0], "w_body": [1.0, 0.5]}
+
+
+def _field(name, pages=PAGES):
+    streams = [{"doc_id": p["doc_id"], "tokens": process_text(p[name], **PREPROCESSING)} for p in pages]
+    index, doc_lengths = build_inverted_index_bm25(streams)
+    return {"index": index, "doc_lengths": doc_lengths,
+            "avg_dl": compute_avg_doc_length(doc_lengths), "idf": compute_idf(index, len(pages), smooth=True)}
+
+
+def test_sweep_matches_rankers():
+    title, body = _field("title"), _field("body")
+    fields, doc_ids, doc_numbers = prepare_fields(title, body)
+
+    for query in QUERIES:
+        tokens = process_text(query, **PREPROCESSING)
+        prepared = prepare_query(tokens, fields, doc_numbers)
+
+        for (k1, b, w_title, w_body), top in sweep_query(prepared, GRID, k=4):
+            assert [(doc_ids[d], float(s)) for d, s in top] == rank_documents_bm25_field_weighted(
+                tokens, title["index"], title["idf"], title["doc_lengths"], title["avg_dl"],
+                body["index"], body["idf"], body["doc_lengths"], body["avg_dl"],
+                w_title=w_title, w_body=w_body, k1=k1, b=b, k=4), (query, k1, b, w_title, w_body)
+
+        for (k1, b, _, _), top in sweep_query(prepared, GRID, "bm25", k=4):
+            assert [(doc_ids[d], float(s)) for d, s in top] == rank_documents_bm25(
+                tokens, body["index"], body["idf"], body["doc_lengths"], body["avg_dl"], k1, b, k=4)
+
+
+def test_bm25f_sweep_matches_ranker():
+    title, body = _field("title"), _field("body")
+    fields, doc_ids, doc_numbers = prepare_fields(title, body)
+    index, field_lengths = build_multifield_index(
+        [{"doc_id": p["doc_id"], **{f"{f}_tokens": process_text(p[f], **PREPROCESSING) for f in ("title", "body")}}
+         for p in PAGES])
+    idf = compute_idf(index, len(PAGES), smooth=True)
+    avg_dl = {"title": title["avg_dl"], "body": body["avg_dl"]}
+
+    # "hawk" and "quest" are only in titles, so w_title = 0 leaves those pages out
+    for query in QUERIES + ["jam taxi jam", "hawk quest puzzle"]:
+        tokens = process_text(query, **PREPROCESSING)
+        prepared = prepare_query(tokens, fields, doc_numbers)
+
+        for k in (3, 10):
+            for (k1, b, w_title, w_body), top in sweep_query(prepared, GRID, "bm25f", k=k):
+                assert [(doc_ids[d], float(s)) for d, s in top] == rank_documents_bm25f(
+                    tokens, index, idf, field_lengths, avg_dl, {"title": w_title, "body": w_body},
+                    k1, b, k=k), (query, k1, b, w_title, w_body)
+
+
+def test_empty_field_at_full_length_normalisation():
+    # An empty title has length 0, so at b = 1.0 its normaliser is 0 as well
+    pages = PAGES + [{"doc_id": "g.html", "title": "", "body": "taxi jam game"}]
+    title, body = _field("title", pages), _field("body", pages)
+    fields, doc_ids, doc_numbers = prepare_fields(title, body)
+    grid = {"k1": [1.2], "b": [1.0], "w_title": [2.0], "w_body": [1.0]}
+
+    for query in QUERIES:
+        tokens = process_text(query, **PREPROCESSING)
+        for (k1, b, w_title, w_body), top in sweep_query(prepare_query(tokens, fields, doc_numbers), grid, k=10):
+            assert [(doc_ids[d], float(s)) for d, s in top] == rank_documents_bm25_field_weighted(
+                tokens, title["index"], title["idf"], title["doc_lengths"], title["avg_dl"],
+                body["index"], body["idf"], body["doc_lengths"], body["avg_dl"],
+                w_title=w_title, w_body=w_body, k1=k1, b=b, k=10), query
+
+    assert "g.html" in [doc_ids[d] for d, _ in sweep_query(
+        prepare_query(process_text("taxi", **PREPROCESSING), fields, doc_numbers), grid, k=10)[0][1]]
+
+
+def test_sweep_reports_every_combination():
+    title, body = _field("title"), _field("body")
+    queries = {q: process_text(q, **PREPROCESSING) for q in QUERIES[:2]}
+    relevance = {"taxi jam game": {"b.html", "f.html"}, "arcade game": {"c.html"}}
+
+    table = sweep(queries, title, body, relevance, GRID, k=2)
+    assert len(table) == 3 * 3 * 3 * 2
+    assert list(table.columns) == ["k1", "b", "w_title", "w_body", "P@2", "R@2", "MRR@2", "nDCG@2"]
+    assert table["P@2"].is_monotonic_decreasing
+    assert table["P@2"].max() <= 1.0 and table["R@2"].min() >= 0.0
+
+    assert len(sweep(queries, title, body, relevance, GRID, model="bm25", k=2)) == 3 * 3
+    assert list(sweep(queries, title, body, relevance, GRID, model="bm25f", k=2).columns) == list(table.columns)
+
+
+if __name__ == "__main__":
+    test_sweep_matches_rankers()
+    test_bm25f_sweep_matches_ranker()
+    test_empty_field_at_full_length_normalisation()
+    test_sweep_reports_every_combination()
+    print("Tuning tests passed")
@@ -0,0 +1,169 @@
+import numpy as np
+
+# -------------------------------
+# VECTORISED BATCH SCORING
+# -------------------------------
+#
+# The inverted index becomes a CSR term-document matrix: row t holds the doc numbers of
+# term t in docs[indptr[t]:indptr[t + 1]] and its term frequencies in the same slice of
+# tfs. BM25 (or TF-IDF) weights depend only on (term, doc, k1, b), so they are computed
+# once per parameter setting; scoring a batch of queries is then a sparse product of the
+# query-term matrix with the weight matrix, done with one np.bincount per batch over only
+# the (query, doc) pairs the batch's postings reach.
+#
+# Scores are accumulated in query-term order, exactly as rank_documents_bm25 adds them,
+# and ties break the same way (earliest matching query term, then doc order), so each
+# query's top k equals rank_documents_bm25(..., k=k) / rank_documents(..., k=k).
+
+MODELS = ("bm25", "tfidf")
+
+
+# Builds the CSR matrix from a dict index (doc order = doc_lengths order) or, given
+# doc_names, from a compact index (indexer.build_compact_index_bm25)
+def build_term_doc_matrix(index, doc_lengths, doc_names=None):
+    if doc_names is None:
+        doc_names = list(doc_lengths)
+        numbers = {doc_id: i for i, doc_id in enumerate(doc_names)}
+        lengths = np.array([doc_lengths[doc_id] for doc_id in doc_names], dtype=np.float64)
+    else:
+        numbers = None
+        lengths = np.asarray(doc_lengths, dtype=np.float64)
+
+    terms = list(index)
+    indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+    docs_parts, tfs_parts = [], []
+
+    for row, term in enumerate(terms):
+        postings = index[term]
+        if numbers is None:
+            docs, tfs = postings.decode()
+            docs = np.asarray(docs, dtype=np.int64)
+            tfs = np.asarray(tfs, dtype=np.int64)
+        else:
+            docs = np.fromiter((numbers[doc_id] for doc_id in postings), dtype=np.int64, count=len(postings))
+            tfs = np.fromiter(postings.values(), dtype=np.int64, count=len(postings))
+            order = np.argsort(docs, kind="stable")
+            docs, tfs = docs[order], tfs[order]
+
+        docs_parts.append(docs)
+        tfs_parts.append(tfs)
+        indptr[row + 1] = indptr[row] + len(docs)
+
+    return {
+        "terms": {term: row for row, term in enumerate(terms)},
+        "indptr": indptr,
+        "docs": np.concatenate(docs_parts) if docs_parts else np.zeros(0, dtype=np.int64),
+        "tfs": np.concatenate(tfs_parts) if tfs_parts else np.zeros(0, dtype=np.int64),
+        "doc_lengths": lengths,
+        "doc_ids": doc_names
+    }
+
+
+# Per-posting weights for one model and parameter setting (same expressions as ranker.py)
+def compute_weights(matrix, idf, avg_doc_length, model="bm25", k1=1.5, b=0.75):
+    if model not in MODELS:
+        raise ValueError(f"Unknown model: {model!r} (expected one of {MODELS})")
+
+    row_idf = np.array([idf[term] for term in matrix["terms"]], dtype=np.float64)
+    posting_idf = np.repeat(row_idf, np.diff(matrix["indptr"]))
+    tf = matrix["tfs"]
+
+    if model == "tfidf":
+        return tf * posting_idf
+
+    dl = matrix["doc_lengths"][matrix["docs"]]
+    numerator = tf * (k1 + 1)
+    denominator = tf + k1 * (1 - b + b * (dl / avg_doc_length))
+    return posting_idf * (numerator / denominator)
+
+
+# Matrix plus precomputed weights, ready for rank_batch
+def build_engine(index, idf, doc_lengths, avg_doc_length, model="bm25", k1=1.5, b=0.75, doc_names=None):
+    engine = build_term_doc_matrix(index, doc_lengths, doc_names)
+    set_weights(engine, idf, avg_doc_length, model, k1, b)
+    return engine
+
+
+# Re-weights an engine in place, e.g. for another k1/b in a parameter sweep
+def set_weights(engine, idf, avg_doc_length, model="bm25", k1=1.5, b=0.75):
+    engine["weights"] = compute_weights(engine, idf, avg_doc_length, model, k1, b)
+    engine["params"] = {"model": model, "k1": k1, "b": b}
+    return engine
+
+
+# Top k (doc_id, score) per query for a list of token lists; k=None returns every match.
+# Queries are scored together in chunks of up to batch_size queries and max_postings
+# gathered postings (a single larger query gets a chunk of its own), which bounds memory.
+def rank_batch(engine, queries, k=10, batch_size=256, max_postings=2**21):
+    terms, indptr = engine["terms"], engine["indptr"]
+    results = []
+    chunk = []
+    gathered = 0
+    for query_tokens in queries:
+        size = sum(int(indptr[terms[t] + 1] - indptr[terms[t]]) for t in query_tokens if t in terms)
+        if chunk and (len(chunk) == batch_size or gathered + size > max_postings):
+            results.extend(_rank_chunk(engine, chunk, k))
+            chunk, gathered = [], 0
+        chunk.append(query_tokens)
+        gathered += size
+    if chunk:
+        results.extend(_rank_chunk(engine, chunk, k))
+    return results
+
+
+def rank_query(engine, query_tokens, k=10):
+    return rank_batch(engine, [query_tokens], k)[0]
+
+
+def _rank_chunk(engine, queries, k):
+    terms, indptr = engine["terms"], engine["indptr"]
+    docs, weights = engine["docs"], engine["weights"]
+    num_docs = len(engine["doc_ids"])
+
+    # Gather each query's postings slices in query order, offset into its own row
+    cells, values, positions = [], [], []
+    for q, query_tokens in enumerate(queries):
+        for position, term in enumerate(query_tokens):
+            row = terms.get(term)
+            if row is None:
+                continue
+            start, end = indptr[row], indptr[row + 1]
+            cells.append(docs[start:end] + q * num_docs)
+            values.append(weights[start:end])
+            positions.append(np.full(end - start, position, dtype=np.int32))
+
+    doc_ids = engine["doc_ids"]
+    if not cells:
+        return [[] for _ in queries]
+
+    # Only the (query, doc) cells the chunk touches get an accumulator: np.unique maps them
+    # to compact indices, and bincount adds the weights in postings order, as rank_documents_bm25 does.
+    # Memory grows with the postings gathered, not with len(queries) * num_docs.
+    cells, inverse = np.unique(np.concatenate(cells), return_inverse=True)
+    scores = np.bincount(inverse, weights=np.concatenate(values), minlength=len(cells))
+    first = np.full(len(cells), np.iinfo(np.int32).max, dtype=np.int32)
+    np.minimum.at(first, inverse, np.concatenate(positions))
+    del inverse, values, positions
+
+    # Cells are sorted, so each query's documents form one contiguous run
+    bounds = np.searchsorted(cells, np.arange(len(queries) + 1) * num_docs)
+    cell_docs = cells % num_docs
+
+    results = []
+    for q in range(len(queries)):
+        lo, hi = bounds[q], bounds[q + 1]
+        matched, row_scores, row_first = cell_docs[lo:hi], scores[lo:hi], first[lo:hi]
+
+        # Partial selection: keep only documents scoring at least the k-th best (ties included)
+        if k is not None and len(matched) > k:
+            if k <= 0:
+                results.append([])
+                continue
+            kth = np.partition(row_scores, len(row_scores) - k)[len(row_scores) - k]
+            keep = row_scores >= kth
+            matched, row_scores, row_first = matched[keep], row_scores[keep], row_first[keep]
+
+        order = np.lexsort((matched, row_first, -row_scores))[:k]
+        results.append([(doc_ids[d], float(s)) for d, s in zip(matched[order], row_scores[order])])
+
+    return results